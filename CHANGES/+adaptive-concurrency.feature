@@ -0,0 +1 @@
+Add ``max_bandwidth`` to the RPM remote, and adapt the number of concurrent downloads to the responses of the server.
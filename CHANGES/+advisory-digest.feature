@@ -0,0 +1 @@
+Calculate the digests of advisories from their data instead of an XML dump, which makes syncing advisories faster. Existing digests are recalculated by a migration.
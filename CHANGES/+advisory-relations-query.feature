@@ -0,0 +1 @@
+Check whether the collections and references of synced advisories are saved with one query per batch instead of two queries per advisory.
@@ -0,0 +1 @@
+Request repomd.xml conditionally with the ETag and Last-Modified of the last sync, and skip the sync if the server reports it unchanged.
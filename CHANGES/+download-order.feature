@@ -0,0 +1 @@
+Add ``download_order`` to the RPM remote to download some packages before the others. The order is coarse: new packages are split into four rounds by the order, and the repository metadata is parsed once per round.
@@ -0,0 +1 @@
+Link the packages of ``file://`` remotes into Pulp's storage instead of copying them where possible.
@@ -0,0 +1 @@
+Allow the ``url`` of an RPM remote to be a metalink or a mirrorlist.
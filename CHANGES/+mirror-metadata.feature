@@ -0,0 +1 @@
+Add the ``mirror_metadata`` sync option, which keeps the repodata of the remote and publishes it unchanged. Copying or uploading packages into such a repository drops the mirrored repodata, so that the next publication generates it. A publication also generates the repodata if the packages of the repository version differ from those of the mirrored repodata. Mirrored repodata files cannot be created through the API.
@@ -0,0 +1 @@
+Add ``mirror_urls`` to the RPM remote to spread downloads over equivalent mirrors of a repository.
@@ -0,0 +1 @@
+Find packages replaced by synced packages with the same NEVRA with an index of the repository version instead of a database query per batch.
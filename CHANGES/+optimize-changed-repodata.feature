@@ -0,0 +1 @@
+With the ``optimize`` sync option, only the repodata types which changed since the last sync from the same remote are downloaded and parsed.
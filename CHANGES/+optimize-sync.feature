@@ -0,0 +1 @@
+Add the ``optimize`` sync option, which skips a sync if the repodata of the remote did not change since the last sync from the same remote.
@@ -0,0 +1 @@
+Add ``include_arches``, ``include_names``, ``exclude_names`` and ``exclude_source_rpms`` to the RPM remote to sync only some of the packages of a repository.
@@ -0,0 +1 @@
+Cache downloaded repodata on the worker by its checksum and reuse it in later syncs instead of downloading it again. The size of the cache is set by ``RPM_REPODATA_CACHE_SIZE``.
@@ -0,0 +1 @@
+Resume interrupted HTTP downloads with range requests, and download large files in several ranges in parallel when the server supports it.
@@ -0,0 +1 @@
+Resume an interrupted sync of a repository from where it stopped.
@@ -0,0 +1 @@
+Add ``retain_package_versions`` to the RPM remote to sync only the newest versions of each package.
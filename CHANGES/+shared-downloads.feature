@@ -0,0 +1 @@
+Download an artifact needed by several concurrent syncs only once.
@@ -0,0 +1 @@
+Do not parse the file lists and changelogs of packages which are already in Pulp when syncing.
@@ -0,0 +1 @@
+Parse primary.xml, filelists.xml and other.xml together during sync and pass each package on as soon as it is parsed, so the memory used by a sync no longer grows with the size of the repository.
@@ -0,0 +1 @@
+Add the ``dry_run`` sync option, which creates an estimate of the cost of a sync at ``rpm/sync_estimates/`` instead of syncing.
@@ -0,0 +1 @@
+Parse repodata in worker threads during sync, so downloads continue while packages and advisories are parsed.
@@ -0,0 +1 @@
+Save the parsing progress of a sync at most once per second instead of once per package or advisory.
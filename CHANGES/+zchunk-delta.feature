@@ -0,0 +1 @@
+Sync zchunk repodata, downloading only the chunks which changed since the last sync.
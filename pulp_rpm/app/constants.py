@@ -72,9 +72,35 @@ CR_PACKAGE_ATTRS = SimpleNamespace(
     VERSION='version'
 )
 
+# Orders in which a sync downloads new packages
+DOWNLOAD_ORDERS = SimpleNamespace(
+    REPODATA='repodata',
+    NEWEST_FIRST='newest_first',
+    SMALLEST_FIRST='smallest_first',
+    ADVISORIES_FIRST='advisories_first'
+)
+
+# The same as above, but in a format that choice fields can use
+DOWNLOAD_ORDER_CHOICES = (
+    (DOWNLOAD_ORDERS.REPODATA, DOWNLOAD_ORDERS.REPODATA),
+    (DOWNLOAD_ORDERS.NEWEST_FIRST, DOWNLOAD_ORDERS.NEWEST_FIRST),
+    (DOWNLOAD_ORDERS.SMALLEST_FIRST, DOWNLOAD_ORDERS.SMALLEST_FIRST),
+    (DOWNLOAD_ORDERS.ADVISORIES_FIRST, DOWNLOAD_ORDERS.ADVISORIES_FIRST)
+)
+
+# Arches of packages which contain sources
+SOURCE_RPM_ARCHES = ('src', 'nosrc')
+
 PACKAGE_REPODATA = ['primary', 'filelists', 'other']
 UPDATE_REPODATA = ['updateinfo']
 
+# data type of repomd.xml among the repodata files of a mirrored repository
+REPOMD_DATA_TYPE = 'repomd'
+
+# Version of the scheme used to calculate UpdateRecord digests. Any change to the scheme needs
+# a new version and a data migration of the existing digests.
+UPDATE_RECORD_DIGEST_VERSION = 2
+
 CR_UPDATE_RECORD_ATTRS = SimpleNamespace(
     ID='id',
     UPDATED_DATE='updated_date',
@@ -0,0 +1,948 @@
+import asyncio
+import collections
+import fcntl
+import logging
+import os
+import tempfile
+import time
+
+from gettext import gettext as _
+from urllib.parse import urlparse
+
+import aiohttp
+import backoff
+
+from pulpcore.plugin.download import (
+    DownloaderFactory,
+    DownloadResult,
+    FileDownloader,
+    HttpDownloader,
+    http_giveup,
+)
+
+from pulp_rpm.app.mirrors import MIRROR_ERRORS
+
+log = logging.getLogger(__name__)
+
+# weight of the latest download in the throughput estimate of a mirror
+THROUGHPUT_SMOOTHING = 0.3
+
+# factor the throughput estimate of a mirror is cut by when a download from it fails
+FAILURE_PENALTY = 0.5
+
+# how many bytes are read from a response at once
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# how many times an interrupted download is attempted, including the first attempt
+RANGE_RESUME_ATTEMPTS = 5
+
+# errors after which a download is resumed
+RESUMABLE_ERRORS = (
+    aiohttp.ClientConnectionError,
+    aiohttp.ClientPayloadError,
+    asyncio.TimeoutError,
+)
+
+# files of at least this size are downloaded in parallel ranges
+PARALLEL_RANGE_MIN_SIZE = 256 * 1024 * 1024
+
+# into how many ranges large files are split
+PARALLEL_RANGE_COUNT = 4
+
+# HTTP statuses with which a server asks to slow down
+THROTTLING_STATUSES = (429, 503)
+
+# concurrency a remote starts its downloads with
+INITIAL_DOWNLOAD_CONCURRENCY = 4
+
+# factory the concurrency is cut by when a server slows down
+CONCURRENCY_DECREASE = 0.5
+
+# how many times the lowest observed response latency the smoothed latency may rise to before
+# the concurrency is cut
+LATENCY_TOLERANCE = 2.0
+
+# weight of the latest response in the smoothed latency
+LATENCY_SMOOTHING = 0.1
+
+# weight of the latest response in the lowest observed latency, which slowly follows the latency
+# so a lasting change of the network is not taken for congestion forever
+BASE_LATENCY_DRIFT = 0.01
+
+# ioctl request to clone a file on filesystems with copy-on-write, from linux/fs.h
+FICLONE = 0x40049409
+
+
+class MirrorStats:
+    """
+    Observed performance of a mirror.
+
+    Attributes:
+        in_flight (int): number of downloads from the mirror which are running
+        throughput (float): smoothed throughput of the mirror in bytes per second, None until
+            the first download from the mirror finishes
+
+    """
+
+    def __init__(self):
+        """
+        Start without any observations.
+        """
+        self.in_flight = 0
+        self.throughput = None
+
+
+class MirrorBalancer:
+    """
+    Spread downloads over equivalent mirrors of a repository according to their throughput.
+
+    Each download goes to the mirror which is expected to finish it first, given the observed
+    throughput of the mirror and the number of downloads already running on it.
+    """
+
+    def __init__(self, base_urls):
+        """
+        Start balancing over mirrors.
+
+        Args:
+            base_urls (list): base URLs of equivalent mirrors
+
+        """
+        self.base_urls = base_urls
+        self.stats = {base_url: MirrorStats() for base_url in base_urls}
+
+    def relative_path(self, url):
+        """
+        The path of a URL relative to the mirror it belongs to.
+
+        Args:
+            url (str): a URL of a file of the repository
+
+        Returns:
+            str: the path relative to the base URL, None if the URL is not under any mirror
+
+        """
+        for base_url in self.base_urls:
+            if url.startswith(base_url):
+                return url[len(base_url):]
+        return None
+
+    def choose(self, exclude=()):
+        """
+        Choose the mirror for the next download.
+
+        Mirrors without observed throughput are estimated at the average throughput of the
+        others, so every mirror gets probed early on.
+
+        Args:
+            exclude (iterable): base URLs of mirrors not to choose
+
+        Returns:
+            str: the base URL of the chosen mirror, None if all mirrors are excluded
+
+        """
+        candidates = [base_url for base_url in self.base_urls if base_url not in exclude]
+        if not candidates:
+            return None
+
+        known = [stats.throughput for stats in self.stats.values() if stats.throughput]
+        default_throughput = sum(known) / len(known) if known else 1
+
+        def expected_time(base_url):
+            stats = self.stats[base_url]
+            return (stats.in_flight + 1) / (stats.throughput or default_throughput)
+
+        return min(candidates, key=expected_time)
+
+    def started(self, base_url):
+        """
+        Record the start of a download from a mirror.
+        """
+        self.stats[base_url].in_flight += 1
+
+    def stopped(self, base_url):
+        """
+        Record the end of a download from a mirror, whether it succeeded or not.
+        """
+        self.stats[base_url].in_flight -= 1
+
+    def finished(self, base_url, size, seconds):
+        """
+        Record a successful download from a mirror.
+
+        Args:
+            base_url (str): the base URL of the mirror
+            size (int): size of the downloaded file in bytes
+            seconds (float): duration of the download
+
+        """
+        stats = self.stats[base_url]
+        throughput = size / max(seconds, 0.001)
+        if stats.throughput is None:
+            stats.throughput = throughput
+        else:
+            stats.throughput += THROUGHPUT_SMOOTHING * (throughput - stats.throughput)
+
+    def failed(self, base_url):
+        """
+        Record a failed download from a mirror.
+        """
+        stats = self.stats[base_url]
+        if stats.throughput is not None:
+            stats.throughput *= FAILURE_PENALTY
+
+
+class MirrorFailover(MirrorBalancer):
+    """
+    Download from the first of several equivalent mirrors, failing over to the next ones.
+
+    Mirrors are chosen by how many downloads from them failed, in their order among mirrors with
+    as many failures, so a mirror which goes down during a sync is not tried first for every
+    download.
+    """
+
+    def __init__(self, base_urls):
+        """
+        Start with the first mirror.
+
+        Args:
+            base_urls (list): base URLs of equivalent mirrors, the preferred one first
+
+        """
+        super().__init__(base_urls)
+        self.failures = {base_url: 0 for base_url in base_urls}
+
+    def choose(self, exclude=()):
+        """
+        Choose the mirror for the next download.
+
+        Args:
+            exclude (iterable): base URLs of mirrors not to choose
+
+        Returns:
+            str: the base URL of the chosen mirror, None if all mirrors are excluded
+
+        """
+        candidates = [base_url for base_url in self.base_urls if base_url not in exclude]
+        if not candidates:
+            return None
+        return min(candidates, key=self.failures.get)
+
+    def failed(self, base_url):
+        """
+        Record a failed download from a mirror.
+        """
+        super().failed(base_url)
+        self.failures[base_url] += 1
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limit the number of concurrent downloads of a remote, adapting to how the server behaves.
+
+    It is passed to the downloaders as their semaphore and has the interface of
+    :class:`asyncio.Semaphore`, ``acquire()``, ``release()``, ``locked()`` and ``async with``.
+    The limit starts low and grows by one
+    with each successful download until the server shows congestion, and by one per round of
+    downloads after that. It is cut in half when the server responds with 429 or 503, or when the
+    latency of its responses rises well above the lowest observed latency, i.e. more concurrent
+    downloads queue on the server instead of increasing the throughput. The limit never exceeds
+    the download_concurrency of the remote.
+    """
+
+    def __init__(self, max_concurrency):
+        """
+        Start with a low limit.
+
+        Args:
+            max_concurrency (int): the maximum number of concurrent downloads
+
+        """
+        self.max_concurrency = max_concurrency
+        self.limit = min(INITIAL_DOWNLOAD_CONCURRENCY, max_concurrency)
+        self.in_flight = 0
+        self.congested = False
+        self._waiters = collections.deque()
+        self._completed = 0
+        self._recovered_at = 0
+        self._base_latency = None
+        self._latency = None
+
+    def locked(self):
+        """
+        Whether a download would have to wait to start.
+        """
+        return self.in_flight >= int(self.limit)
+
+    async def acquire(self):
+        """
+        Wait until another download may start.
+
+        Returns:
+            bool: True, like :meth:`asyncio.Semaphore.acquire`
+
+        """
+        while self.locked():
+            waiter = asyncio.get_event_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif not waiter.cancelled():
+                    # pass on the wake-up this download does not use
+                    self._wake_up()
+                raise
+        self.in_flight += 1
+        return True
+
+    def release(self, succeeded=True):
+        """
+        Record the end of a download and let the next ones start.
+
+        Args:
+            succeeded (bool): whether the download succeeded, which raises the limit
+
+        """
+        self._completed += 1
+        if succeeded:
+            self._increase()
+        self.in_flight -= 1
+        self._wake_up()
+
+    def _wake_up(self):
+        """
+        Wake up as many waiting downloads as may start now.
+
+        Woken downloads check the limit again, so waking too many of them is harmless.
+        """
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    async def __aenter__(self):
+        """
+        Wait until another download may start.
+        """
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        """
+        Record the end of a download, responses asking to slow down are reported separately.
+        """
+        self.release(succeeded=exc is None)
+
+    def _increase(self):
+        """
+        Raise the limit after a successful download.
+        """
+        if self.congested:
+            self.limit += 1 / self.limit
+        else:
+            self.limit += 1
+        self.limit = min(self.limit, self.max_concurrency)
+
+    def _decrease(self):
+        """
+        Cut the limit, at most once per round of downloads.
+
+        Downloads which were already running when the limit was cut do not cut it again.
+        """
+        self.congested = True
+        if self._completed < self._recovered_at:
+            return
+        self._recovered_at = self._completed + self.in_flight
+        self.limit = max(self.limit * CONCURRENCY_DECREASE, 1)
+        log.debug(_('Download concurrency reduced to {n}').format(n=int(self.limit)))
+
+    def throttled(self):
+        """
+        Record a response asking to slow down.
+        """
+        self._decrease()
+
+    def observed_latency(self, seconds):
+        """
+        Record the time it took the server to respond to a request.
+
+        Args:
+            seconds (float): the time until the response headers were received
+
+        """
+        if self._base_latency is None:
+            self._base_latency = self._latency = seconds
+        drifted = self._base_latency + BASE_LATENCY_DRIFT * (seconds - self._base_latency)
+        self._base_latency = min(seconds, drifted)
+        self._latency += LATENCY_SMOOTHING * (seconds - self._latency)
+        if self._latency > LATENCY_TOLERANCE * max(self._base_latency, 0.001):
+            self._decrease()
+
+
+class BandwidthLimiter:
+    """
+    Limit the total download bandwidth of a remote with a token bucket.
+
+    Downloads take as many tokens as they received bytes. The bucket holds at most a second worth
+    of bandwidth and may go into debt, which the next downloads wait to pay off.
+    """
+
+    def __init__(self, rate):
+        """
+        Start with a full bucket.
+
+        Args:
+            rate (int): the maximum bandwidth in bytes per second
+
+        """
+        self.rate = rate
+        self._available = rate
+        self._updated = time.monotonic()
+
+    async def consume(self, size):
+        """
+        Take tokens for received data and wait if the bandwidth is exceeded.
+
+        Args:
+            size (int): the number of received bytes
+
+        """
+        now = time.monotonic()
+        self._available = min(self.rate, self._available + (now - self._updated) * self.rate)
+        self._updated = now
+        self._available -= size
+        if self._available < 0:
+            await asyncio.sleep(-self._available / self.rate)
+
+
+class RpmDownloaderFactory(DownloaderFactory):
+    """
+    A DownloaderFactory whose downloaders share the adaptive limits of the remote.
+    """
+
+    def __init__(self, remote, *args, **kwargs):
+        """
+        Create the limits of the remote, see :class:`~pulpcore.plugin.download.DownloaderFactory`.
+
+        Args:
+            remote (RpmRemote): the remote to build downloaders for
+            args: additional arguments of DownloaderFactory
+            kwargs: additional arguments of DownloaderFactory
+
+        """
+        super().__init__(remote, *args, **kwargs)
+        # replaces the semaphore the factory would pass to its downloaders
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter(remote.download_concurrency)
+        self.bandwidth_limiter = None
+        if remote.max_bandwidth:
+            self.bandwidth_limiter = BandwidthLimiter(remote.max_bandwidth)
+
+    def build(self, url, **kwargs):
+        """
+        Build a downloader limited by the adaptive concurrency and the bandwidth of the remote.
+
+        Args:
+            url (str): the URL to download
+            kwargs: additional arguments for the downloader
+
+        Returns:
+            a downloader with a `run()` coroutine
+
+        """
+        kwargs.setdefault('semaphore', self.concurrency_limiter)
+        if self.bandwidth_limiter and urlparse(url).scheme.lower() in ('http', 'https'):
+            kwargs['bandwidth_limiter'] = self.bandwidth_limiter
+        return super().build(url, **kwargs)
+
+
+class MirrorShardingDownloader:
+    """
+    A downloader which downloads a file from one of several equivalent mirrors.
+
+    The mirror is chosen by a :class:`MirrorBalancer` or a :class:`MirrorFailover`. If a download
+    fails, it is retried on the other mirrors before the error is raised.
+    """
+
+    def __init__(self, remote, balancer, url, **kwargs):
+        """
+        Prepare the download of a file.
+
+        Args:
+            remote (RpmRemote): the remote to build the actual downloaders with
+            balancer (MirrorBalancer): the balancer of the mirrors of the remote, or a
+                :class:`MirrorFailover`
+            url (str): a URL of the file under any of the mirrors
+            kwargs: additional arguments for the actual downloaders, e.g. expected_digests
+
+        """
+        self.remote = remote
+        self.balancer = balancer
+        self.url = url
+        self.relative_path = balancer.relative_path(url)
+        self.kwargs = kwargs
+
+    async def run(self, extra_data=None):
+        """
+        Download the file from the mirror chosen by the balancer.
+
+        Args:
+            extra_data (dict): extra data passed on to the actual downloader
+
+        Returns:
+            DownloadResult: the result of the successful download
+
+        """
+        tried = set()
+        while True:
+            base_url = self.balancer.choose(exclude=tried)
+            tried.add(base_url)
+            downloader = self.remote.download_factory.build(base_url + self.relative_path,
+                                                            **self.kwargs)
+            self.balancer.started(base_url)
+            start = time.monotonic()
+            try:
+                result = await downloader.run(extra_data=extra_data)
+            except MIRROR_ERRORS as exc:
+                self.balancer.failed(base_url)
+                if len(tried) == len(self.balancer.base_urls):
+                    raise
+                log.warning(_('Download of {path} from {url} failed, retrying on another '
+                              'mirror: {e}').format(path=self.relative_path, url=base_url, e=exc))
+                continue
+            finally:
+                self.balancer.stopped(base_url)
+            self.balancer.finished(base_url, os.path.getsize(result.path),
+                                   time.monotonic() - start)
+            return result
+
+
+class NotModified(Exception):
+    """
+    Raised when a conditional request is answered with 304 Not Modified.
+    """
+
+    pass
+
+
+class RangeNotSupported(Exception):
+    """
+    Raised when a server answers a Range request with the whole file.
+    """
+
+    pass
+
+
+class RpmHttpDownloader(HttpDownloader):
+    """
+    An HTTP downloader which resumes interrupted downloads with Range requests.
+
+    Conditional requests are supported, a 304 Not Modified response raises :class:`NotModified`.
+
+    If the connection drops, the download continues from the last received byte instead of
+    starting over. Files of at least ``PARALLEL_RANGE_MIN_SIZE`` bytes, by their expected size,
+    are downloaded in several ranges in parallel if the server supports ranges. Either way the
+    whole file is validated against the expected digests, e.g. the pkgId of a package, in the end.
+    """
+
+    def __init__(self, *args, session=None, headers_ready_callback=None, request_headers=None,
+                 bandwidth_limiter=None, **kwargs):
+        """
+        Prepare the download, see :class:`~pulpcore.plugin.download.HttpDownloader`.
+
+        Args:
+            session (aiohttp.ClientSession): the session to download with, the downloader opens
+                one of its own and closes it afterwards if None
+            headers_ready_callback (callable): a coroutine function which is called with the
+                headers of the first successful response
+            request_headers (dict): additional headers of the requests, e.g. to make them
+                conditional
+            bandwidth_limiter (BandwidthLimiter): the limiter of the bandwidth of the remote
+
+        """
+        super().__init__(*args, session=session, **kwargs)
+        self.request_headers = request_headers or {}
+        self.bandwidth_limiter = bandwidth_limiter
+        self._owns_session = session is None
+        self._headers_ready_callback = headers_ready_callback
+        self._received = 0
+
+    def _get(self, headers):
+        """
+        Send a GET request for the URL with the configuration of the downloader.
+        """
+        return self.session.get(self.url, headers={**self.request_headers, **headers},
+                                proxy=self.proxy,
+                                proxy_auth=self.proxy_auth, auth=self.auth)
+
+    def _check_response(self, response, start):
+        """
+        Report a response to the concurrency limiter and raise on HTTP errors.
+
+        Args:
+            response (aiohttp.ClientResponse): the response to a request
+            start (float): the time.monotonic() when the request was sent
+
+        """
+        if isinstance(self.semaphore, AdaptiveConcurrencyLimiter):
+            if response.status in THROTTLING_STATUSES:
+                self.semaphore.throttled()
+            elif response.status < 400:
+                self.semaphore.observed_latency(time.monotonic() - start)
+        response.raise_for_status()
+
+    async def _headers_received(self, response):
+        """
+        Pass the headers of the first successful response to the ``headers_ready_callback``.
+        """
+        if self._headers_ready_callback:
+            callback, self._headers_ready_callback = self._headers_ready_callback, None
+            await callback(response.headers)
+
+    async def _read(self, response):
+        """
+        Read the next chunk of a response within the bandwidth of the remote.
+
+        Returns:
+            bytes: the chunk, empty at the end of the response
+
+        """
+        chunk = await response.content.read(DOWNLOAD_CHUNK_SIZE)
+        if chunk and self.bandwidth_limiter:
+            await self.bandwidth_limiter.consume(len(chunk))
+        return chunk
+
+    async def run(self, extra_data=None):
+        """
+        Run the download, see :meth:`~pulpcore.plugin.download.BaseDownloader.run`.
+
+        A session which the downloader opened itself is closed afterwards, also if the download
+        fails.
+
+        Args:
+            extra_data (dict): extra data passed by the caller, not used
+
+        Returns:
+            DownloadResult: the result of the download
+
+        """
+        try:
+            return await super().run(extra_data=extra_data)
+        finally:
+            if self._owns_session:
+                await self.session.close()
+
+    @backoff.on_exception(backoff.expo, aiohttp.ClientResponseError,
+                          max_tries=10, giveup=http_giveup)
+    async def _run(self, extra_data=None):
+        """
+        Download the file, in parallel ranges if it is large enough.
+
+        Like :class:`~pulpcore.plugin.download.HttpDownloader`, HTTP 429 and some 5XX errors are
+        retried with exponential backoff.
+
+        Args:
+            extra_data (dict): extra data passed by the caller, not used
+
+        Returns:
+            DownloadResult: the result of the download
+
+        """
+        if self.expected_size and self.expected_size >= PARALLEL_RANGE_MIN_SIZE:
+            try:
+                return await self._run_in_ranges()
+            except RangeNotSupported:
+                log.debug(_('{url} does not support ranges').format(url=self.url))
+        return await self._run_resumable()
+
+    async def _run_resumable(self):
+        """
+        Download the file, resuming with Range requests on connection errors.
+        """
+        for attempt in range(1, RANGE_RESUME_ATTEMPTS + 1):
+            headers = {'Range': 'bytes={}-'.format(self._received)} if self._received else {}
+            start = time.monotonic()
+            try:
+                async with self._get(headers) as response:
+                    self._check_response(response, start)
+                    if response.status == 304:
+                        raise NotModified()
+                    await self._headers_received(response)
+                    # a server which does not support ranges sends the whole file again
+                    skip = self._received if response.status != 206 else 0
+                    while True:
+                        chunk = await self._read(response)
+                        if not chunk:
+                            break
+                        if skip:
+                            skipped = min(skip, len(chunk))
+                            chunk, skip = chunk[skipped:], skip - skipped
+                        if chunk:
+                            await self.handle_data(chunk)
+                            self._received += len(chunk)
+                    await self.finalize()
+                    return DownloadResult(path=self.path, url=self.url,
+                                          artifact_attributes=self.artifact_attributes,
+                                          headers=response.headers)
+            except RESUMABLE_ERRORS as exc:
+                if attempt == RANGE_RESUME_ATTEMPTS:
+                    raise
+                log.warning(_('Download of {url} interrupted after {n} bytes, resuming: '
+                              '{e}').format(url=self.url, n=self._received, e=exc))
+
+    async def download_range(self, start, end):
+        """
+        Download a range of the file into a separate file, within the limits of the remote.
+
+        Args:
+            start (int): the first byte of the range
+            end (int): the last byte of the range
+
+        Returns:
+            str: a path to the file with the range
+
+        Raises:
+            RangeNotSupported: if the server does not support ranges
+
+        """
+        async with self.semaphore:
+            return await self._download_range(start, end)
+
+    async def _download_range(self, start, end):
+        """
+        Download a range of the file into a separate file, resuming on connection errors.
+
+        Args:
+            start (int): the first byte of the range
+            end (int): the last byte of the range
+
+        Returns:
+            str: a path to the file with the range
+
+        Raises:
+            RangeNotSupported: if the server does not support ranges
+
+        """
+        fd, path = tempfile.mkstemp(dir=os.getcwd(), prefix='range-')
+        try:
+            with os.fdopen(fd, 'wb') as range_file:
+                for attempt in range(1, RANGE_RESUME_ATTEMPTS + 1):
+                    offset = start + range_file.tell()
+                    headers = {'Range': 'bytes={}-{}'.format(offset, end)}
+                    start_time = time.monotonic()
+                    try:
+                        async with self._get(headers) as response:
+                            self._check_response(response, start_time)
+                            if response.status != 206:
+                                raise RangeNotSupported()
+                            while True:
+                                chunk = await self._read(response)
+                                if not chunk:
+                                    break
+                                range_file.write(chunk)
+                        return path
+                    except RESUMABLE_ERRORS as exc:
+                        if attempt == RANGE_RESUME_ATTEMPTS:
+                            raise
+                        log.warning(_('Download of bytes {start}-{end} of {url} interrupted, '
+                                      'resuming: {e}').format(start=offset, end=end,
+                                                              url=self.url, e=exc))
+        except BaseException:
+            os.remove(path)
+            raise
+
+    async def _run_in_ranges(self):
+        """
+        Download the file in parallel ranges and join them.
+
+        The download already holds a slot of the limiter of the remote, every range beyond the
+        first waits for a slot of its own. Ranges which did not get a slot by the time the others
+        are done are downloaded in the slots held already, one after the other, so a download
+        never waits for slots held by other large downloads.
+
+        Raises:
+            RangeNotSupported: if the server does not support ranges
+
+        """
+        size = self.expected_size
+        range_size = -(-size // PARALLEL_RANGE_COUNT)
+        pending = [(index, start, min(start + range_size, size) - 1)
+                   for index, start in enumerate(range(0, size, range_size))]
+        paths = [None] * len(pending)
+        started = set()
+
+        async def download_pending():
+            while pending:
+                index, start, end = pending.pop(0)
+                paths[index] = await self._download_range(start, end)
+
+        async def download_pending_in_slot(helper):
+            async with self.semaphore:
+                started.add(helper)
+                await download_pending()
+
+        helpers = [asyncio.ensure_future(download_pending_in_slot(helper))
+                   for helper in range(len(pending) - 1)]
+        try:
+            await download_pending()
+            for helper, future in enumerate(helpers):
+                if helper not in started:
+                    future.cancel()
+            await asyncio.gather(*(future for helper, future in enumerate(helpers)
+                                   if helper in started))
+        except BaseException:
+            for future in helpers:
+                future.cancel()
+            await asyncio.gather(*helpers, return_exceptions=True)
+            for path in paths:
+                if path:
+                    os.remove(path)
+            raise
+
+        try:
+            for path in paths:
+                with open(path, 'rb') as range_file:
+                    for chunk in iter(lambda: range_file.read(DOWNLOAD_CHUNK_SIZE), b''):
+                        await self.handle_data(chunk)
+        finally:
+            for path in paths:
+                os.remove(path)
+        await self.finalize()
+        return DownloadResult(path=self.path, url=self.url,
+                              artifact_attributes=self.artifact_attributes, headers=None)
+
+
+class _ImportedFile:
+    """
+    The file a :class:`RpmFileDownloader` writes to, which only exists if the source is copied.
+
+    Data written before the file is opened is discarded, the digests of the data are still
+    computed by the downloader.
+    """
+
+    def __init__(self):
+        """
+        Start without a file.
+        """
+        self._file = None
+
+    def open(self):
+        """
+        Create the file in the working directory.
+
+        Returns:
+            str: a path to the file
+
+        """
+        self._file = tempfile.NamedTemporaryFile(dir=os.getcwd(), delete=False)
+        return self._file.name
+
+    def write(self, data):
+        if self._file:
+            self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+class RpmFileDownloader(FileDownloader):
+    """
+    A downloader which imports files from the filesystem without copying their data if possible.
+
+    The file is cloned with a reflink on filesystems with copy-on-write, or hardlinked if it is on
+    the same filesystem as the working directory, and copied otherwise. Saving the artifact then
+    moves the clone or the link into the storage. Either way, the file is read once to validate
+    it against the expected digests, e.g. the pkgId of a package.
+
+    A hardlinked artifact shares its data with the source file, so the source must not be modified
+    in place afterwards. Tools like rsync replace files instead.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Prepare the import, see :class:`~pulpcore.plugin.download.FileDownloader`.
+        """
+        self._imported_file = _ImportedFile()
+        super().__init__(*args, custom_file_object=self._imported_file, **kwargs)
+        url = urlparse(self.url)
+        self.source_path = os.path.abspath(os.path.join(url.netloc, url.path))
+        self._linked = False
+
+    def _link(self):
+        """
+        Clone or hardlink the file into the working directory.
+
+        Returns:
+            str: a path to the clone or the link, None if the file has to be copied
+
+        """
+        fd, path = tempfile.mkstemp(dir=os.getcwd())
+        try:
+            with os.fdopen(fd, 'wb') as destination, open(self.source_path, 'rb') as source:
+                fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+            return path
+        except OSError:
+            os.remove(path)
+
+        try:
+            os.link(self.source_path, path)
+        except OSError:
+            return None
+        return path
+
+    async def finalize(self):
+        """
+        Validate the file, and close it unless it is linked.
+
+        Raises:
+            DigestValidationError: if the file does not match the expected digests
+            SizeValidationError: if the file does not match the expected size
+
+        """
+        if not self._linked:
+            await super().finalize()
+            return
+
+        try:
+            self.validate_digests()
+            self.validate_size()
+        except Exception:
+            os.remove(self.path)
+            raise
+
+    async def _run(self, extra_data=None):
+        """
+        Import the file and validate it.
+
+        Args:
+            extra_data (dict): extra data passed by the caller, not used
+
+        Returns:
+            DownloadResult: the result of the import
+
+        """
+        loop = asyncio.get_event_loop()
+        path = await loop.run_in_executor(None, self._link)
+        if path:
+            self.path, self._linked = path, True
+        else:
+            log.debug(_('{path} cannot be linked, copying it').format(path=self.source_path))
+            self.path = self._imported_file.open()
+
+        with open(path or self.source_path, 'rb') as source:
+            while True:
+                chunk = await loop.run_in_executor(None, source.read, DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await self.handle_data(chunk)
+        await self.finalize()
+        return DownloadResult(path=self.path, url=self.url,
+                              artifact_attributes=self.artifact_attributes, headers=None)
@@ -1,3 +1,5 @@
+import json
+
 from rest_framework import serializers
 from pulp_rpm.app.models import UpdateCollection, UpdateReference
 
@@ -69,3 +71,35 @@ class UpdateReferenceField(serializers.ListField):
                 'type': reference.ref_type
             })
         return ret
+
+
+class JSONListField(serializers.ListField):
+    """
+    A serializer field for a list which is stored JSON-encoded in a text field.
+    """
+
+    def to_internal_value(self, data):
+        """
+        Validate the list and encode it as JSON.
+
+        Args:
+            data (list): list to validate
+
+        Returns:
+            str: JSON-encoded list
+
+        """
+        return json.dumps(super().to_internal_value(data))
+
+    def to_representation(self, value):
+        """
+        Decode the JSON-encoded list.
+
+        Args:
+            value (str): JSON-encoded list
+
+        Returns:
+            list: the decoded list
+
+        """
+        return super().to_representation(json.loads(value))
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.3 on 2026-10-16 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('rpm', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RpmSyncState',
+            fields=[
+                ('_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('_created', models.DateTimeField(auto_now_add=True)),
+                ('_last_updated', models.DateTimeField(auto_now=True, null=True)),
+                ('revision', models.TextField()),
+                ('repomd_checksums', models.TextField(default='{}')),
+                ('remote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_states', to='rpm.RpmRemote')),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Repository')),
+                ('repository_version', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.RepositoryVersion')),
+            ],
+            options={
+                'unique_together': {('remote', 'repository')},
+            },
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 2.2.3 on 2026-10-16 11:40
+
+import hashlib
+import json
+import logging
+
+from django.db import migrations
+
+log = logging.getLogger(__name__)
+
+# The digest scheme is frozen here as it was at version 2, so this migration keeps producing
+# version 2 digests whatever later versions of the scheme look like.
+DIGEST_VERSION = 2
+
+# the fields covered by version 2 digests
+UPDATE_RECORD_FIELDS = (
+    'id', 'updated_date', 'description', 'issued_date', 'fromstr', 'status', 'title', 'summary',
+    'version', 'type', 'severity', 'solution', 'release', 'rights', 'pushcount',
+)
+UPDATE_COLLECTION_FIELDS = ('name', 'shortname')
+UPDATE_COLLECTION_PACKAGE_FIELDS = (
+    'arch', 'epoch', 'filename', 'name', 'reboot_suggested', 'release', 'src', 'sum',
+    'sum_type', 'version',
+)
+UPDATE_REFERENCE_FIELDS = ('href', 'ref_id', 'title', 'ref_type')
+
+# how many update records are loaded and updated at once
+BATCH_SIZE = 500
+
+
+def canonical(obj, fields):
+    return sorted((name, '' if getattr(obj, name) is None else str(getattr(obj, name)))
+                  for name in fields)
+
+
+def update_record_digest_v2(update_record):
+    """
+    Calculate the version 2 digest of a saved update record.
+    """
+    canonical_form = [
+        DIGEST_VERSION,
+        canonical(update_record, UPDATE_RECORD_FIELDS),
+        sorted(
+            [canonical(collection, UPDATE_COLLECTION_FIELDS),
+             sorted(canonical(package, UPDATE_COLLECTION_PACKAGE_FIELDS)
+                    for package in collection.packages.all())]
+            for collection in update_record.collections.all()
+        ),
+        sorted(canonical(reference, UPDATE_REFERENCE_FIELDS)
+               for reference in update_record.references.all()),
+    ]
+    data = json.dumps(canonical_form, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def recalculate_update_record_digests(apps, schema_editor):
+    """
+    Replace digests of the XML based scheme with digests of the canonical data scheme.
+    """
+    UpdateRecord = apps.get_model('rpm', 'UpdateRecord')
+    update_records = UpdateRecord.objects.order_by('pk').prefetch_related(
+        'collections__packages', 'references'
+    )
+
+    digests = {}
+    for start in range(0, update_records.count(), BATCH_SIZE):
+        changed = []
+        for update_record in update_records[start:start + BATCH_SIZE]:
+            digest = update_record_digest_v2(update_record)
+            if digest in digests:
+                # The XML based digest covered some data which is not stored, so this record only
+                # differs from another one in that data. Keep the old digest, it stays unique.
+                log.warning('Update record %s (%s) keeps its previous digest, its stored data '
+                            'is the same as that of update record %s', update_record.id,
+                            update_record.pk, digests[digest])
+                continue
+            digests[digest] = update_record.pk
+            update_record.digest = digest
+            changed.append(update_record)
+        UpdateRecord.objects.bulk_update(changed, ['digest'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpm', '0002_rpmsyncstate'),
+    ]
+
+    operations = [
+        migrations.RunPython(recalculate_update_record_digests,
+                             reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.3 on 2026-10-16 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpm', '0003_update_record_digest_v2'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rpmremote',
+            name='exclude_names',
+            field=models.TextField(default='[]'),
+        ),
+        migrations.AddField(
+            model_name='rpmremote',
+            name='exclude_source_rpms',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='rpmremote',
+            name='include_arches',
+            field=models.TextField(default='[]'),
+        ),
+        migrations.AddField(
+            model_name='rpmremote',
+            name='include_names',
+            field=models.TextField(default='[]'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.3 on 2026-10-16 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpm', '0004_rpmremote_package_filters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rpmremote',
+            name='retain_package_versions',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.3 on 2026-10-16 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpm', '0005_rpmremote_retain_package_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rpmremote',
+            name='mirror_urls',
+            field=models.TextField(default='[]'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.3 on 2026-10-16 15:50
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpm', '0006_rpmremote_mirror_urls'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InFlightDownload',
+            fields=[
+                ('_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('_created', models.DateTimeField(auto_now_add=True)),
+                ('_last_updated', models.DateTimeField(auto_now=True, null=True)),
+                ('digest', models.CharField(max_length=255, unique=True)),
+                ('owner', models.CharField(db_index=True, max_length=36)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
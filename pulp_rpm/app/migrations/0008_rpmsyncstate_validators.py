@@ -0,0 +1,23 @@
+# Generated by Django 2.2.3 on 2026-10-16 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpm', '0007_inflightdownload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rpmsyncstate',
+            name='etag',
+            field=models.TextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='rpmsyncstate',
+            name='last_modified',
+            field=models.TextField(default=''),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.3 on 2026-10-16 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpm', '0008_rpmsyncstate_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rpmremote',
+            name='max_bandwidth',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.3 on 2026-10-16 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpm', '0009_rpmremote_max_bandwidth'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rpmremote',
+            name='download_order',
+            field=models.CharField(choices=[('repodata', 'repodata'), ('newest_first', 'newest_first'), ('smallest_first', 'smallest_first'), ('advisories_first', 'advisories_first')], default='repodata', max_length=32),
+        ),
+    ]
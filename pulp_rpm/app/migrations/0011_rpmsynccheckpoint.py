@@ -0,0 +1,44 @@
+# Generated by Django 2.2.3 on 2026-10-16 18:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('rpm', '0010_rpmremote_download_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RpmSyncCheckpoint',
+            fields=[
+                ('_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('_created', models.DateTimeField(auto_now_add=True)),
+                ('_last_updated', models.DateTimeField(auto_now=True, null=True)),
+                ('repomd_checksums', models.TextField(default='{}')),
+                ('remote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_checkpoints', to='rpm.RpmRemote')),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Repository')),
+            ],
+            options={
+                'unique_together': {('remote', 'repository')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RpmSyncCheckpointPackage',
+            fields=[
+                ('_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('_created', models.DateTimeField(auto_now_add=True)),
+                ('_last_updated', models.DateTimeField(auto_now=True, null=True)),
+                ('pkgId', models.TextField()),
+                ('checkpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='packages', to='rpm.RpmSyncCheckpoint')),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rpm.Package')),
+            ],
+            options={
+                'unique_together': {('checkpoint', 'pkgId')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.3 on 2026-10-16 19:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('rpm', '0011_rpmsynccheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepoMetadataFile',
+            fields=[
+                ('content_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='core.Content')),
+                ('data_type', models.CharField(max_length=255)),
+                ('checksum_type', models.CharField(choices=[('unknown', 'unknown'), ('md5', 'md5'), ('sha1', 'sha1'), ('sha1', 'sha1'), ('sha224', 'sha224'), ('sha256', 'sha256'), ('sha384', 'sha384'), ('sha512', 'sha512')], max_length=10)),
+                ('checksum', models.CharField(max_length=128)),
+                ('relative_path', models.TextField()),
+            ],
+            options={
+                'unique_together': {('data_type', 'checksum_type', 'checksum', 'relative_path')},
+            },
+            bases=('core.content',),
+        ),
+    ]
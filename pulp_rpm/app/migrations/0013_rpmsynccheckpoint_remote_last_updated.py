@@ -0,0 +1,18 @@
+# Generated by Django 2.2.3 on 2026-10-16 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpm', '0012_repometadatafile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rpmsynccheckpoint',
+            name='remote_last_updated',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
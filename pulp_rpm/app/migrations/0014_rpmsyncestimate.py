@@ -0,0 +1,34 @@
+# Generated by Django 2.2.3 on 2026-10-16 21:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('rpm', '0013_rpmsynccheckpoint_remote_last_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RpmSyncEstimate',
+            fields=[
+                ('_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('_created', models.DateTimeField(auto_now_add=True)),
+                ('_last_updated', models.DateTimeField(auto_now=True, null=True)),
+                ('packages_added', models.PositiveIntegerField()),
+                ('packages_removed', models.PositiveIntegerField()),
+                ('advisories_added', models.PositiveIntegerField()),
+                ('advisories_removed', models.PositiveIntegerField()),
+                ('download_size', models.BigIntegerField()),
+                ('remote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_estimates', to='rpm.RpmRemote')),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Repository')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import logging
+import os
+
+from collections import namedtuple
+from gettext import gettext as _
+from urllib.parse import urljoin, urlparse
+from xml.etree import ElementTree
+
+import aiohttp
+
+from pulpcore.plugin.exceptions import DigestValidationError, SizeValidationError
+
+log = logging.getLogger(__name__)
+
+REPOMD_PATH = 'repodata/repomd.xml'
+
+# how many mirrors are probed for repomd.xml at once
+MIRROR_PROBE_COUNT = 5
+
+# errors of a download which another mirror may not run into
+MIRROR_ERRORS = (
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    DigestValidationError,
+    SizeValidationError,
+)
+
+# hash types of metalink verifications, the strongest first
+METALINK_HASH_TYPES = ('sha512', 'sha256', 'sha1', 'md5')
+
+# Base URLs of the mirrors of a repository and the size and hashes of repomd.xml the metalink
+# allows, each verification is a dict with 'size' and hash types as keys. There are no
+# verifications for a mirrorlist.
+MirrorList = namedtuple('MirrorList', ['base_urls', 'verifications'])
+
+
+class MirrorError(Exception):
+    """
+    Raised when none of the mirrors of a repository can be used.
+    """
+
+    pass
+
+
+def _local_name(element):
+    """
+    The tag of an XML element without its namespace.
+    """
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def _metalink_verification(element):
+    """
+    Collect the size and the hashes of a file or an alternate file in a metalink.
+
+    Args:
+        element (xml.etree.ElementTree.Element): a <file> or an <alternate> element
+
+    Returns:
+        dict: 'size' and hash types mapped to their values
+
+    """
+    verification = {}
+    for child in element:
+        if _local_name(child) == 'size':
+            verification['size'] = int(child.text)
+        elif _local_name(child) == 'verification':
+            for hash_element in child:
+                if _local_name(hash_element) == 'hash' and hash_element.text:
+                    verification[hash_element.get('type')] = hash_element.text.strip()
+    return verification
+
+
+def _is_http_url(url):
+    """
+    Whether a URL can be downloaded from with HTTP.
+    """
+    return urlparse(url).scheme in ('http', 'https')
+
+
+def parse_metalink(root):
+    """
+    Parse a metalink of repomd.xml.
+
+    The current repomd.xml and its alternates are allowed, mirrors which are a sync behind are
+    still consistent.
+
+    Args:
+        root (xml.etree.ElementTree.Element): the root element of a metalink
+
+    Returns:
+        MirrorList: mirrors ordered by their preference
+
+    """
+    verifications = []
+    urls = []
+    for file_element in root.iter():
+        if _local_name(file_element) != 'file' or file_element.get('name') != 'repomd.xml':
+            continue
+        verifications.append(_metalink_verification(file_element))
+        for element in file_element.iter():
+            if _local_name(element) == 'alternate':
+                verifications.append(_metalink_verification(element))
+            elif _local_name(element) == 'url' and element.text:
+                urls.append((int(element.get('preference', 0)), element.text.strip()))
+
+    urls.sort(key=lambda preference_url: preference_url[0], reverse=True)
+    base_urls = [url[:-len(REPOMD_PATH)] for _preference, url in urls
+                 if url.endswith(REPOMD_PATH) and _is_http_url(url)]
+    return MirrorList(base_urls=base_urls, verifications=verifications)
+
+
+def parse_mirrorlist(text):
+    """
+    Parse a mirrorlist, a list of base URLs of a repository one per line.
+
+    Args:
+        text (str): content of a mirrorlist
+
+    Returns:
+        MirrorList: mirrors in the order of the mirrorlist
+
+    """
+    base_urls = []
+    for line in text.splitlines():
+        url = line.strip()
+        if url.startswith('#') or not _is_http_url(url):
+            continue
+        base_urls.append(url if url.endswith('/') else url + '/')
+    return MirrorList(base_urls=base_urls, verifications=[])
+
+
+def parse_mirror_list(path):
+    """
+    Parse a downloaded metalink or mirrorlist.
+
+    Args:
+        path (str): a path to the downloaded file
+
+    Returns:
+        MirrorList: the mirrors, None if the file is neither a metalink nor a mirrorlist
+
+    """
+    try:
+        root = ElementTree.parse(path).getroot()
+    except ElementTree.ParseError:
+        with open(path, encoding='utf-8', errors='replace') as mirrorlist:
+            mirror_list = parse_mirrorlist(mirrorlist.read())
+    else:
+        if _local_name(root) != 'metalink':
+            return None
+        mirror_list = parse_metalink(root)
+    return mirror_list if mirror_list.base_urls else None
+
+
+def verify_repomd(path, verifications):
+    """
+    Check that a downloaded repomd.xml is one of those allowed by a metalink.
+
+    Args:
+        path (str): a path to the downloaded repomd.xml
+        verifications (list): allowed sizes and hashes of repomd.xml, see :class:`MirrorList`
+
+    Returns:
+        bool: True if repomd.xml matches any of the verifications or if there are none
+
+    """
+    if not verifications:
+        return True
+
+    size = os.path.getsize(path)
+    digests = {}
+    for verification in verifications:
+        if verification.get('size', size) != size:
+            continue
+        hash_type = next((t for t in METALINK_HASH_TYPES if t in verification), None)
+        if hash_type is None:
+            continue
+        if hash_type not in digests:
+            hasher = hashlib.new(hash_type)
+            with open(path, 'rb') as repomd:
+                for chunk in iter(lambda: repomd.read(1024 * 1024), b''):
+                    hasher.update(chunk)
+            digests[hash_type] = hasher.hexdigest()
+        if digests[hash_type] == verification[hash_type]:
+            return True
+    return False
+
+
+async def fetch_mirror_list(remote):
+    """
+    Download the url of a remote as a metalink or a mirrorlist.
+
+    Args:
+        remote (RpmRemote): the remote to fetch the mirror list of
+
+    Returns:
+        MirrorList: the mirrors, None if the url is not a metalink or a mirrorlist
+
+    """
+    try:
+        result = await remote.get_downloader(url=remote.url).run()
+    except MIRROR_ERRORS:
+        return None
+    return parse_mirror_list(result.path)
+
+
+async def _probe_mirror(remote, base_url, verifications):
+    """
+    Download repomd.xml from a mirror and verify it.
+
+    Returns:
+        tuple: the base URL of the mirror and the DownloadResult of repomd.xml
+
+    Raises:
+        MirrorError: if repomd.xml is not consistent with the metalink
+
+    """
+    result = await remote.get_downloader(url=urljoin(base_url, REPOMD_PATH)).run()
+    if not verify_repomd(result.path, verifications):
+        raise MirrorError(_('repomd.xml of {url} does not match the metalink').format(
+            url=base_url))
+    return base_url, result
+
+
+async def find_fastest_mirror(remote, mirror_list):
+    """
+    Race mirrors for repomd.xml and pick the fastest consistent one.
+
+    Mirrors are probed a few at a time in the order of the mirror list. The first one to return
+    a repomd.xml which matches the metalink wins, the next ones are only probed if all mirrors
+    of a round fail.
+
+    Args:
+        remote (RpmRemote): the remote to download with
+        mirror_list (MirrorList): the mirrors to probe
+
+    Returns:
+        tuple: the base URLs of the mirrors with the fastest one first, and the DownloadResult of
+            its repomd.xml
+
+    Raises:
+        MirrorError: if no mirror returned a consistent repomd.xml
+
+    """
+    base_urls = mirror_list.base_urls
+    for i in range(0, len(base_urls), MIRROR_PROBE_COUNT):
+        probes = [
+            asyncio.ensure_future(_probe_mirror(remote, base_url, mirror_list.verifications))
+            for base_url in base_urls[i:i + MIRROR_PROBE_COUNT]
+        ]
+        try:
+            for probe in asyncio.as_completed(probes):
+                try:
+                    fastest_url, result = await probe
+                except (MirrorError,) + MIRROR_ERRORS as exc:
+                    log.warning(_('Mirror skipped: {e}').format(e=exc))
+                    continue
+                log.info(_('Using mirror {url}').format(url=fastest_url))
+                ordered_urls = [fastest_url] + [url for url in base_urls if url != fastest_url]
+                return ordered_urls, result
+        finally:
+            for probe in probes:
+                probe.cancel()
+    raise MirrorError(_('None of the {n} mirrors of {url} could be used.').format(
+        n=len(base_urls), url=remote.url))
@@ -1,22 +1,43 @@
 import json
+from fnmatch import fnmatchcase
 from logging import getLogger
 
 import createrepo_c as cr
 
 from django.db import models
-from pulpcore.plugin.models import Content, Model, Remote, Publication, PublicationDistribution
+from pulpcore.plugin.models import (
+    Content,
+    Model,
+    Remote,
+    Publication,
+    PublicationDistribution,
+    Repository,
+    RepositoryVersion
+)
 
 from pulp_rpm.app.constants import (CHECKSUM_CHOICES, CR_PACKAGE_ATTRS,
                                     CR_UPDATE_COLLECTION_ATTRS,
                                     CR_UPDATE_COLLECTION_PACKAGE_ATTRS,
                                     CR_UPDATE_RECORD_ATTRS,
                                     CR_UPDATE_REFERENCE_ATTRS,
+                                    DOWNLOAD_ORDER_CHOICES,
+                                    DOWNLOAD_ORDERS,
                                     PULP_PACKAGE_ATTRS,
                                     PULP_UPDATE_COLLECTION_ATTRS,
                                     PULP_UPDATE_COLLECTION_PACKAGE_ATTRS,
                                     PULP_UPDATE_RECORD_ATTRS,
-                                    PULP_UPDATE_REFERENCE_ATTRS
+                                    PULP_UPDATE_REFERENCE_ATTRS,
+                                    REPOMD_DATA_TYPE,
+                                    SOURCE_RPM_ARCHES
                                     )
+from pulp_rpm.app.downloaders import (
+    MirrorBalancer,
+    MirrorFailover,
+    MirrorShardingDownloader,
+    RpmDownloaderFactory,
+    RpmFileDownloader,
+    RpmHttpDownloader,
+)
 
 log = getLogger(__name__)
 
@@ -239,7 +260,7 @@ class Package(Content):
             PULP_PACKAGE_ATTRS.DESCRIPTION: getattr(package, CR_PACKAGE_ATTRS.DESCRIPTION) or '',
             PULP_PACKAGE_ATTRS.ENHANCES: json.dumps(
                 getattr(package, CR_PACKAGE_ATTRS.ENHANCES) or []),
-            PULP_PACKAGE_ATTRS.EPOCH: getattr(package, CR_PACKAGE_ATTRS.EPOCH) or '',
+            PULP_PACKAGE_ATTRS.EPOCH: getattr(package, CR_PACKAGE_ATTRS.EPOCH) or '0',
             PULP_PACKAGE_ATTRS.FILES: json.dumps(getattr(package, CR_PACKAGE_ATTRS.FILES) or []),
             PULP_PACKAGE_ATTRS.LOCATION_BASE: getattr(
                 package, CR_PACKAGE_ATTRS.LOCATION_BASE) or '',
@@ -663,10 +684,377 @@ class UpdateReference(Model):
 class RpmRemote(Remote):
     """
     Remote for "rpm" content.
+
+    Fields:
+
+        include_arches (Text):
+            A JSON-encoded list of arches to sync, all arches are synced if empty
+        include_names (Text):
+            A JSON-encoded list of glob patterns, only packages with a matching name are synced
+            if not empty
+        exclude_names (Text):
+            A JSON-encoded list of glob patterns, packages with a matching name are not synced
+        exclude_source_rpms (Bool):
+            Whether source packages are not synced
+        retain_package_versions (PositiveInteger):
+            The number of the newest versions of each package, by name and arch, to sync. All
+            versions are synced if 0.
+        mirror_urls (Text):
+            A JSON-encoded list of base URLs of mirrors equivalent to the url, downloads are
+            spread over the url and the mirrors
+        max_bandwidth (PositiveInteger):
+            The maximum total bandwidth of the downloads in bytes per second, unlimited if 0
+        download_order (Text):
+            The order in which new packages are downloaded, one of DOWNLOAD_ORDER_CHOICES
     """
 
     TYPE = 'rpm'
 
+    include_arches = models.TextField(default='[]')
+    include_names = models.TextField(default='[]')
+    exclude_names = models.TextField(default='[]')
+    exclude_source_rpms = models.BooleanField(default=False)
+    retain_package_versions = models.PositiveIntegerField(default=0)
+    mirror_urls = models.TextField(default='[]')
+    max_bandwidth = models.PositiveIntegerField(default=0)
+    download_order = models.CharField(max_length=32, choices=DOWNLOAD_ORDER_CHOICES,
+                                      default=DOWNLOAD_ORDERS.REPODATA)
+
+    @property
+    def download_factory(self):
+        """
+        The DownloaderFactory of the remote.
+
+        HTTP downloads are resumed when interrupted, local files are linked instead of copied.
+        All downloads share the adaptive concurrency limit and the bandwidth limit of the remote.
+
+        Returns:
+            DownloaderFactory: the factory, created once per remote instance
+
+        """
+        try:
+            return self._download_factory
+        except AttributeError:
+            self._download_factory = RpmDownloaderFactory(self, downloader_overrides={
+                'http': RpmHttpDownloader,
+                'https': RpmHttpDownloader,
+                'file': RpmFileDownloader,
+            })
+            return self._download_factory
+
+    def get_downloader(self, remote_artifact=None, url=None, **kwargs):
+        """
+        Get a downloader for a URL, spread over the mirrors of the remote if there are any.
+
+        Downloads of URLs under the url of the remote or any of its mirrors go to the mirror with
+        the best observed throughput, and are retried on the other mirrors on errors. Downloads
+        from mirrors found in a metalink or a mirrorlist fail over to the next mirror, see
+        :meth:`fail_over_to_mirrors`.
+
+        Args:
+            remote_artifact (RemoteArtifact): the RemoteArtifact to download
+            url (str): the URL to download
+            kwargs: additional arguments for the downloader
+
+        Returns:
+            a downloader with a `run()` coroutine
+
+        """
+        if remote_artifact is None and url:
+            balancer = self.get_mirror_balancer()
+            if balancer and balancer.relative_path(url):
+                return MirrorShardingDownloader(self, balancer, url, **kwargs)
+        return super().get_downloader(remote_artifact=remote_artifact, url=url, **kwargs)
+
+    def get_mirror_balancer(self):
+        """
+        The balancer of downloads over the url and the mirrors of the remote.
+
+        It is created once per remote instance, so its observations last for a whole sync.
+
+        Returns:
+            MirrorBalancer: the balancer, None if the remote has no mirrors
+
+        """
+        if not hasattr(self, '_mirror_balancer'):
+            mirror_urls = json.loads(self.mirror_urls)
+            self._mirror_balancer = (
+                MirrorBalancer([self.url] + mirror_urls) if mirror_urls and self.url else None
+            )
+        return self._mirror_balancer
+
+    def fail_over_to_mirrors(self, base_urls):
+        """
+        Retry downloads from the first of several equivalent mirrors on the others.
+
+        It is used for the mirrors of a metalink or a mirrorlist, which replace the mirror_urls
+        of the remote for the rest of the sync. Downloads of URLs under any of the mirrors are
+        retried on the next mirror on errors.
+
+        Args:
+            base_urls (list): base URLs of the mirrors, the preferred one first
+
+        """
+        if len(base_urls) > 1:
+            self._mirror_balancer = MirrorFailover(base_urls)
+
+    def get_package_filter(self):
+        """
+        Build a filter for the packages to sync from this remote.
+
+        Returns:
+            callable: a function which takes a package name and arch and returns True if the
+                package should be synced
+
+        """
+        include_arches = set(json.loads(self.include_arches))
+        include_names = json.loads(self.include_names)
+        exclude_names = json.loads(self.exclude_names)
+        exclude_source_rpms = self.exclude_source_rpms
+
+        def package_filter(name, arch):
+            """
+            Check a package against the include and exclude rules of the remote.
+
+            Args:
+                name(str): name of a package
+                arch(str): arch of a package
+
+            Returns:
+                bool: True if the package should be synced
+
+            """
+            if include_arches and arch not in include_arches:
+                return False
+            if exclude_source_rpms and arch in SOURCE_RPM_ARCHES:
+                return False
+            if include_names and not any(fnmatchcase(name, pattern) for pattern in include_names):
+                return False
+            if any(fnmatchcase(name, pattern) for pattern in exclude_names):
+                return False
+            return True
+
+        return package_filter
+
+    def filters_packages(self):
+        """
+        Whether only some of the packages of the remote repository are synced.
+
+        Returns:
+            bool: True if any include or exclude rule or a number of versions to retain is set
+
+        """
+        return any((json.loads(self.include_arches), json.loads(self.include_names),
+                    json.loads(self.exclude_names), self.exclude_source_rpms,
+                    self.retain_package_versions))
+
+
+class RpmSyncState(Model):
+    """
+    Details of the last successful sync of a repository from a remote.
+
+    Fields:
+
+        revision (Text):
+            Revision of the synced repomd.xml
+        repomd_checksums (Text):
+            A JSON-encoded dict of the checksums of the synced repomd records, by record type
+        etag (Text):
+            The ETag of the synced repomd.xml
+        last_modified (Text):
+            The Last-Modified date of the synced repomd.xml
+
+    Relations:
+
+        remote (models.ForeignKey): The remote which was synced from
+        repository (models.ForeignKey): The repository which was synced into
+        repository_version (models.ForeignKey): The repository version created by the sync
+    """
+
+    revision = models.TextField()
+    repomd_checksums = models.TextField(default='{}')
+    etag = models.TextField(default='')
+    last_modified = models.TextField(default='')
+
+    remote = models.ForeignKey(RpmRemote, related_name='sync_states', on_delete=models.CASCADE)
+    repository = models.ForeignKey(Repository, on_delete=models.CASCADE)
+    repository_version = models.ForeignKey(RepositoryVersion, null=True,
+                                           on_delete=models.SET_NULL)
+
+    class Meta:
+        unique_together = ('remote', 'repository')
+
+    @property
+    def checksums(self):
+        """
+        Checksums of the synced repomd records, by record type.
+        """
+        return json.loads(self.repomd_checksums)
+
+    @property
+    def validators(self):
+        """
+        The validators of the synced repomd.xml, for conditional requests.
+        """
+        return {'etag': self.etag, 'last_modified': self.last_modified}
+
+    def is_current(self):
+        """
+        Whether the repository and the remote are unchanged since the sync.
+
+        Only then the result of the recorded sync can be relied on by the next one.
+
+        Returns:
+            bool: True if the recorded repository version is still the latest one and the remote
+                has not been modified since the sync
+
+        """
+        latest_version = RepositoryVersion.latest(self.repository)
+        if latest_version is None or latest_version.pk != self.repository_version_id:
+            return False
+        return self.remote._last_updated <= self._last_updated
+
+
+class RpmSyncCheckpoint(Model):
+    """
+    Progress of an unfinished sync of a repository from a remote.
+
+    A sync which is interrupted, e.g. by a restart of its worker, is resumed from the checkpoint:
+    packages which it already saved are added to the new version without being parsed or looked
+    up again. The repodata is still fetched again, from the repodata cache if it is enabled, and
+    primary.xml is scanned again to find the packages to sync. The checkpoint is deleted when the
+    sync finishes.
+
+    Fields:
+
+        repomd_checksums (Text):
+            A JSON-encoded dict of the checksums of the repomd records being synced, by record type
+        remote_last_updated (DateTime):
+            When the remote was last modified before the sync started, e.g. its filters
+
+    Relations:
+
+        remote (models.ForeignKey): The remote which is synced from
+        repository (models.ForeignKey): The repository which is synced into
+    """
+
+    repomd_checksums = models.TextField(default='{}')
+    remote_last_updated = models.DateTimeField(null=True)
+
+    remote = models.ForeignKey(RpmRemote, related_name='sync_checkpoints',
+                               on_delete=models.CASCADE)
+    repository = models.ForeignKey(Repository, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('remote', 'repository')
+
+    @property
+    def checksums(self):
+        """
+        Checksums of the repomd records being synced, by record type.
+        """
+        return json.loads(self.repomd_checksums)
+
+    def saved_packages(self):
+        """
+        The packages saved by the sync so far.
+
+        Returns:
+            dict: pks of the packages by their pkgIds
+
+        """
+        return dict(self.packages.values_list('pkgId', 'package_id'))
+
+    def add_packages(self, packages):
+        """
+        Record saved packages.
+
+        Args:
+            packages (list): saved Packages
+
+        """
+        RpmSyncCheckpointPackage.objects.bulk_create([
+            RpmSyncCheckpointPackage(checkpoint=self, pkgId=package.pkgId, package=package)
+            for package in packages
+        ], ignore_conflicts=True)
+
+
+class RpmSyncCheckpointPackage(Model):
+    """
+    A package saved by an unfinished sync.
+
+    Fields:
+
+        pkgId (Text):
+            The pkgId of the package in the synced repodata
+
+    Relations:
+
+        checkpoint (models.ForeignKey): The checkpoint of the sync
+        package (models.ForeignKey): The saved package
+    """
+
+    pkgId = models.TextField()
+
+    checkpoint = models.ForeignKey(RpmSyncCheckpoint, related_name='packages',
+                                   on_delete=models.CASCADE)
+    package = models.ForeignKey(Package, related_name='+', on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('checkpoint', 'pkgId')
+
+
+class RpmSyncEstimate(Model):
+    """
+    The estimate of a dry run of a sync, what the sync would change and download.
+
+    Fields:
+
+        packages_added (PositiveInteger):
+            The number of packages the sync would add to the latest repository version
+        packages_removed (PositiveInteger):
+            The number of packages the sync would remove from the latest repository version
+        advisories_added (PositiveInteger):
+            The number of advisories the sync would add to the latest repository version
+        advisories_removed (PositiveInteger):
+            The number of advisories the sync would remove from the latest repository version
+        download_size (BigInteger):
+            The number of bytes of packages the sync would download
+
+    Relations:
+
+        remote (models.ForeignKey): The remote which would be synced from
+        repository (models.ForeignKey): The repository which would be synced into
+    """
+
+    packages_added = models.PositiveIntegerField()
+    packages_removed = models.PositiveIntegerField()
+    advisories_added = models.PositiveIntegerField()
+    advisories_removed = models.PositiveIntegerField()
+    download_size = models.BigIntegerField()
+
+    remote = models.ForeignKey(RpmRemote, related_name='sync_estimates', on_delete=models.CASCADE)
+    repository = models.ForeignKey(Repository, on_delete=models.CASCADE)
+
+
+class InFlightDownload(Model):
+    """
+    A claim of a sync on the download of an artifact.
+
+    Concurrent syncs which need the same artifact wait for the sync which claimed its download
+    and reuse the saved artifact, instead of downloading it again.
+
+    Fields:
+
+        digest (Text):
+            The digest of the artifact, as '<algorithm>:<hex digest>'
+        owner (Text):
+            An identifier of the sync which downloads the artifact
+    """
+
+    digest = models.CharField(max_length=255, unique=True)
+    owner = models.CharField(max_length=36, db_index=True)
+
 
 class RpmPublication(Publication):
     """
@@ -721,3 +1109,44 @@ class Modulemd(Content):
     dependencies = models.TextField(default='[]')
     artifacts = models.TextField(default='[]')
     packages = models.ManyToManyField(Package)
+
+
+class RepoMetadataFile(Content):
+    """
+    A repodata file of a mirrored repository, kept as it is to be published verbatim.
+
+    Fields:
+        data_type (Text):
+            The type of the file in repomd.xml, e.g. "primary", or "repomd" for repomd.xml itself
+        checksum_type (Text):
+            The type of the checksum of the file
+        checksum (Text):
+            The checksum of the file
+        relative_path (Text):
+            The path of the file relative to the root of the repository
+    """
+
+    TYPE = 'repo_metadata_file'
+
+    data_type = models.CharField(max_length=255)
+    checksum_type = models.CharField(choices=CHECKSUM_CHOICES, max_length=10)
+    checksum = models.CharField(max_length=128)
+    relative_path = models.TextField()
+
+    class Meta:
+        unique_together = ('data_type', 'checksum_type', 'checksum', 'relative_path')
+
+    @classmethod
+    def repomd_in(cls, repository_version):
+        """
+        Find repomd.xml of a repository version whose repodata is mirrored.
+
+        Args:
+            repository_version (RepositoryVersion): the repository version
+
+        Returns:
+            RepoMetadataFile: repomd.xml, None if the repodata of the version is not mirrored
+
+        """
+        return cls.objects.filter(pk__in=repository_version.content,
+                                  data_type=REPOMD_DATA_TYPE).first()
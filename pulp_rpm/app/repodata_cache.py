@@ -0,0 +1,148 @@
+import logging
+import os
+import shutil
+import tempfile
+
+from gettext import gettext as _
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+# default maximum size of the repodata cache in bytes
+DEFAULT_REPODATA_CACHE_SIZE = 2 * 1024 ** 3
+
+
+class RepodataCache:
+    """
+    A worker-local cache of downloaded repodata files, keyed by their checksums.
+
+    Repodata files are immutable for a given checksum, so a file listed with the same checksum in
+    any repomd.xml can be taken from the cache instead of being downloaded again. The least
+    recently used files are evicted when the cache grows beyond its maximum size.
+
+    The cache is configured with the settings ``RPM_REPODATA_CACHE_DIR``, which defaults to a
+    directory next to the working directories of the workers, and ``RPM_REPODATA_CACHE_SIZE`` in
+    bytes. A size of 0 disables the cache.
+    """
+
+    def __init__(self, path, max_size):
+        """
+        Use a directory as the cache.
+
+        Args:
+            path (str): the directory of the cache, created if it does not exist
+            max_size (int): the maximum total size of the cached files in bytes
+
+        """
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(path, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls):
+        """
+        Create the cache configured in the settings.
+
+        Returns:
+            RepodataCache: the cache, None if it is disabled
+
+        """
+        max_size = getattr(settings, 'RPM_REPODATA_CACHE_SIZE', DEFAULT_REPODATA_CACHE_SIZE)
+        if not max_size:
+            return None
+        path = getattr(settings, 'RPM_REPODATA_CACHE_DIR', None) or os.path.join(
+            settings.WORKING_DIRECTORY, 'rpm-repodata-cache')
+        return cls(path, max_size)
+
+    @staticmethod
+    def _key(checksum_type, checksum):
+        return '{}-{}'.format(checksum_type, checksum)
+
+    def get(self, checksum_type, checksum, size=None, destination_dir='.'):
+        """
+        Take a repodata file from the cache.
+
+        The file is linked into the destination directory, so it stays available even if it is
+        evicted from the cache while it is used.
+
+        Args:
+            checksum_type (str): the checksum type of the file, as in repomd.xml
+            checksum (str): the checksum of the file
+            size (int): the expected size of the file, if known
+            destination_dir (str): the directory to place the file into
+
+        Returns:
+            str: a path to the file in the destination directory, None if it is not cached
+
+        """
+        cached_path = os.path.join(self.path, self._key(checksum_type, checksum))
+        try:
+            if size and os.path.getsize(cached_path) != size:
+                return None
+            fd, path = tempfile.mkstemp(dir=destination_dir,
+                                        prefix=self._key(checksum_type, checksum))
+            os.close(fd)
+            os.remove(path)
+            try:
+                os.link(cached_path, path)
+            except OSError:
+                shutil.copyfile(cached_path, path)
+            # mark the file as recently used
+            os.utime(cached_path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, checksum_type, checksum, path):
+        """
+        Add a downloaded repodata file to the cache and evict old files if needed.
+
+        The file has to be validated against its checksum already.
+
+        Args:
+            checksum_type (str): the checksum type of the file, as in repomd.xml
+            checksum (str): the checksum of the file
+            path (str): a path to the downloaded file
+
+        """
+        cached_path = os.path.join(self.path, self._key(checksum_type, checksum))
+        fd, temp_path = tempfile.mkstemp(dir=self.path, prefix='.')
+        os.close(fd)
+        os.remove(temp_path)
+        try:
+            try:
+                os.link(path, temp_path)
+            except OSError:
+                shutil.copyfile(path, temp_path)
+            os.replace(temp_path, cached_path)
+        except OSError as exc:
+            log.warning(_('Repodata could not be cached: {e}').format(e=exc))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used files until the cache fits into its maximum size.
+        """
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.startswith('.'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _mtime, size, _path in entries)
+        for _mtime, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
@@ -8,9 +8,13 @@ from pulpcore.plugin.models import (
     RepositoryVersion
 )
 from pulpcore.plugin.serializers import (
+    DetailRelatedField,
+    IdentityField,
+    ModelSerializer,
     NoArtifactContentSerializer,
     SingleArtifactContentSerializer,
     RemoteSerializer,
+    RepositorySyncURLSerializer,
     PublicationSerializer,
     PublicationDistributionSerializer,
     NestedRelatedField,
@@ -20,16 +24,22 @@ from pulpcore.plugin.serializers import (
 from pulp_rpm.app.models import (
     Modulemd,
     Package,
+    RepoMetadataFile,
     RpmDistribution,
     RpmRemote,
     RpmPublication,
+    RpmSyncEstimate,
     UpdateRecord,
 )
 
-from pulp_rpm.app.fields import UpdateCollectionField, UpdateReferenceField
+from pulp_rpm.app.fields import JSONListField, UpdateCollectionField, UpdateReferenceField
 
 
-from pulp_rpm.app.constants import RPM_PLUGIN_TYPE_CHOICE_MAP
+from pulp_rpm.app.constants import (
+    DOWNLOAD_ORDER_CHOICES,
+    DOWNLOAD_ORDERS,
+    RPM_PLUGIN_TYPE_CHOICE_MAP,
+)
 
 
 class PackageSerializer(SingleArtifactContentSerializer):
@@ -243,12 +253,89 @@ class RpmRemoteSerializer(RemoteSerializer):
         choices=Remote.POLICY_CHOICES,
         default=Remote.IMMEDIATE
     )
+    include_arches = JSONListField(
+        child=serializers.CharField(),
+        help_text=_("List of arches to sync, e.g. ['x86_64', 'noarch']. "
+                    "All arches are synced if empty."),
+        required=False
+    )
+    include_names = JSONListField(
+        child=serializers.CharField(),
+        help_text=_("List of glob patterns, e.g. ['python3-*']. If not empty, only packages "
+                    "with a matching name are synced."),
+        required=False
+    )
+    exclude_names = JSONListField(
+        child=serializers.CharField(),
+        help_text=_("List of glob patterns, e.g. ['*-debuginfo', '*-debugsource']. Packages "
+                    "with a matching name are not synced."),
+        required=False
+    )
+    exclude_source_rpms = serializers.BooleanField(
+        help_text=_("Whether source packages should not be synced."),
+        required=False, default=False
+    )
+    retain_package_versions = serializers.IntegerField(
+        help_text=_("The number of the newest versions of each package, by name and arch, "
+                    "to sync. All versions are synced if 0, which is the default."),
+        min_value=0, required=False, default=0
+    )
+    mirror_urls = JSONListField(
+        child=serializers.URLField(),
+        help_text=_("List of base URLs of mirrors which are equivalent to the url. Downloads are "
+                    "spread over the url and the mirrors according to their throughput, and "
+                    "retried on another mirror if they fail."),
+        required=False
+    )
+    max_bandwidth = serializers.IntegerField(
+        help_text=_("The maximum total bandwidth of the downloads of the remote in bytes per "
+                    "second. Unlimited if 0, which is the default."),
+        min_value=0, required=False, default=0
+    )
+    download_order = serializers.ChoiceField(
+        help_text=_("The order in which new packages are downloaded: 'repodata' (the default) "
+                    "in the order of primary.xml, 'newest_first' by build time, "
+                    "'smallest_first' by size, or 'advisories_first' for packages referenced by "
+                    "advisories before the others."),
+        choices=DOWNLOAD_ORDER_CHOICES, required=False, default=DOWNLOAD_ORDERS.REPODATA
+    )
 
     class Meta:
-        fields = RemoteSerializer.Meta.fields
+        fields = RemoteSerializer.Meta.fields + (
+            'include_arches', 'include_names', 'exclude_names', 'exclude_source_rpms',
+            'retain_package_versions', 'mirror_urls', 'max_bandwidth', 'download_order'
+        )
         model = RpmRemote
 
 
+class RpmRepositorySyncURLSerializer(RepositorySyncURLSerializer):
+    """
+    Serializer for RPM Sync.
+    """
+
+    optimize = serializers.BooleanField(
+        help_text=_("Whether to skip the sync if the repository metadata of the remote and the "
+                    "repository are unchanged since the last sync. Set it to False to force "
+                    "a full sync."),
+        required=False,
+        default=True
+    )
+    mirror_metadata = serializers.BooleanField(
+        help_text=_("Whether to keep the repodata files of the remote, including types which are "
+                    "not parsed, so they are published verbatim instead of being generated. "
+                    "Package filters of the remote cannot be used then."),
+        required=False,
+        default=False
+    )
+    dry_run = serializers.BooleanField(
+        help_text=_("Whether to only estimate how many packages and advisories the sync would add "
+                    "and remove and how many bytes it would download, without changing the "
+                    "repository. The estimate is a created resource of the task."),
+        required=False,
+        default=False
+    )
+
+
 class RpmPublicationSerializer(PublicationSerializer):
     """
     A Serializer for RpmPublication.
@@ -505,3 +592,92 @@ class ModulemdSerializer(SingleArtifactContentSerializer):
             'artifacts', 'dependencies', 'packages'
         )
         model = Modulemd
+
+
+class RepoMetadataFileSerializer(SingleArtifactContentSerializer):
+    """
+    A serializer for repodata files of mirrored repositories.
+    """
+
+    data_type = serializers.CharField(
+        help_text=_("The type of the file in repomd.xml, or 'repomd' for repomd.xml itself."),
+    )
+    checksum_type = serializers.CharField(
+        help_text=_("The type of the checksum of the file."),
+    )
+    checksum = serializers.CharField(
+        help_text=_("The checksum of the file."),
+    )
+    relative_path = serializers.CharField(
+        help_text=_("The path of the file relative to the root of the repository."),
+    )
+
+    def validate(self, data):
+        """
+        Validate the repodata file data.
+
+        Args:
+            data (dict): Data to be validated
+
+        Returns:
+            dict: Data that has been validated
+
+        """
+        data = super().validate(data)
+
+        data['_relative_path'] = data['relative_path']
+
+        return data
+
+    class Meta:
+        fields = tuple(set(SingleArtifactContentSerializer.Meta.fields) - {'_relative_path'}) + (
+            'data_type', 'checksum_type', 'checksum', 'relative_path'
+        )
+        model = RepoMetadataFile
+
+
+class RpmSyncEstimateSerializer(ModelSerializer):
+    """
+    A serializer for the estimates of dry runs of syncs.
+    """
+
+    _href = IdentityField(
+        view_name='rpm/sync_estimates-detail',
+    )
+    remote = DetailRelatedField(
+        help_text=_('The remote which would be synced from.'),
+        read_only=True,
+    )
+    repository = serializers.HyperlinkedRelatedField(
+        help_text=_('The repository which would be synced into.'),
+        read_only=True,
+        view_name='repositories-detail',
+    )
+    packages_added = serializers.IntegerField(
+        help_text=_('The number of packages the sync would add.'),
+        read_only=True,
+    )
+    packages_removed = serializers.IntegerField(
+        help_text=_('The number of packages the sync would remove.'),
+        read_only=True,
+    )
+    advisories_added = serializers.IntegerField(
+        help_text=_('The number of advisories the sync would add.'),
+        read_only=True,
+    )
+    advisories_removed = serializers.IntegerField(
+        help_text=_('The number of advisories the sync would remove.'),
+        read_only=True,
+    )
+    download_size = serializers.IntegerField(
+        help_text=_('The number of bytes of packages the sync would download, given the '
+                    'artifacts which are already in Pulp.'),
+        read_only=True,
+    )
+
+    class Meta:
+        fields = ModelSerializer.Meta.fields + (
+            'remote', 'repository', 'packages_added', 'packages_removed', 'advisories_added',
+            'advisories_removed', 'download_size'
+        )
+        model = RpmSyncEstimate
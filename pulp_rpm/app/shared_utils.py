@@ -1,11 +1,18 @@
 import createrepo_c
+import hashlib
 import json
 import os
+import re
 import tempfile
 import shutil
 
+from pulp_rpm.app.constants import UPDATE_RECORD_DIGEST_VERSION
 from pulp_rpm.app.models import Package
 
+# Segments of a version string compared by rpm: '~' and '^' are significant separators, other
+# characters which are not ASCII letters or digits just separate segments.
+VERSION_SEGMENT_RE = re.compile(r'[0-9]+|[a-zA-Z]+|[~^]')
+
 
 def _prepare_package(artifact, filename):
     """
@@ -40,3 +47,133 @@ def _prepare_package(artifact, filename):
             new_pkg[key] = value
 
     return new_pkg
+
+
+def update_record_digest(update_record, collections, references):
+    """
+    Calculate the digest of an update record from a canonical form of its data.
+
+    Every value is converted to a string and the fields, collections, packages and references
+    are sorted, so the digest does not depend on where the data came from. The same digest is
+    calculated for parsed updateinfo and for the UpdateRecord saved from it.
+
+    Args:
+        update_record (dict): UpdateRecord fields, as created by UpdateRecord.createrepo_to_dict
+        collections (list): a tuple for each collection, with a dict of the UpdateCollection
+            fields and a list of dicts of the UpdateCollectionPackage fields of its packages
+        references (list): dicts of UpdateReference fields
+
+    Returns:
+        str: a hex digest representing the update record
+
+    """
+    def canonical(fields):
+        return sorted((name, '' if value is None else str(value)) for name, value in fields.items())
+
+    canonical_form = [
+        UPDATE_RECORD_DIGEST_VERSION,
+        canonical(update_record),
+        sorted(
+            [canonical(collection), sorted(canonical(package) for package in packages)]
+            for collection, packages in collections
+        ),
+        sorted(canonical(reference) for reference in references),
+    ]
+    data = json.dumps(canonical_form, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def _version_segments(version):
+    """
+    Split a version string into the segments compared by rpm.
+
+    Args:
+        version (str): a version or a release of a package
+
+    Yields:
+        str: alphabetic or numeric segments and the '~' and '^' separators
+
+    """
+    for match in VERSION_SEGMENT_RE.finditer(version):
+        yield match.group()
+
+
+def rpmvercmp(first, second):
+    """
+    Compare two version or release strings the way rpm does.
+
+    Args:
+        first (str): a version or a release
+        second (str): a version or a release
+
+    Returns:
+        int: -1, 0 or 1 if the first string is older, equal or newer than the second one
+
+    """
+    if first == second:
+        return 0
+
+    first_segments = list(_version_segments(first))
+    second_segments = list(_version_segments(second))
+    for i in range(max(len(first_segments), len(second_segments))):
+        one = first_segments[i] if i < len(first_segments) else None
+        two = second_segments[i] if i < len(second_segments) else None
+
+        # '~' sorts before anything, even the end of the string
+        if one == '~' or two == '~':
+            if one != '~':
+                return 1
+            if two != '~':
+                return -1
+            continue
+
+        # '^' sorts after the end of the string, but before anything else
+        if one == '^' or two == '^':
+            if one is None:
+                return -1
+            if two is None:
+                return 1
+            if one != '^':
+                return 1
+            if two != '^':
+                return -1
+            continue
+
+        if one is None or two is None:
+            break
+
+        # numeric segments are always newer than alphabetic ones
+        if one.isdigit() != two.isdigit():
+            return 1 if one.isdigit() else -1
+
+        if one.isdigit():
+            one, two = one.lstrip('0'), two.lstrip('0')
+            if len(one) != len(two):
+                return 1 if len(one) > len(two) else -1
+
+        if one != two:
+            return 1 if one > two else -1
+
+    if len(first_segments) == len(second_segments):
+        return 0
+    return 1 if len(first_segments) > len(second_segments) else -1
+
+
+def compare_evr(first, second):
+    """
+    Compare the epoch, version and release of two packages the way rpm does.
+
+    Args:
+        first (tuple): epoch, version and release of a package
+        second (tuple): epoch, version and release of a package
+
+    Returns:
+        int: -1, 0 or 1 if the first package is older, equal or newer than the second one
+
+    """
+    first_epoch, first_version, first_release = first
+    second_epoch, second_version, second_release = second
+    first_epoch, second_epoch = int(first_epoch or 0), int(second_epoch or 0)
+    if first_epoch != second_epoch:
+        return 1 if first_epoch > second_epoch else -1
+    return rpmvercmp(first_version, second_version) or rpmvercmp(first_release, second_release)
@@ -2,6 +2,8 @@ from django.db.models import Q
 
 from pulpcore.plugin.models import Repository, RepositoryVersion
 
+from pulp_rpm.app.models import RepoMetadataFile
+
 
 def copy_content(source_repo_version_pk, dest_repo_pk, types):
     """
@@ -25,3 +27,5 @@ def copy_content(source_repo_version_pk, dest_repo_pk, types):
     content_to_copy = source_repo_version.content.filter(query)
     with RepositoryVersion.create(dest_repo) as new_version:
         new_version.add_content(content_to_copy)
+        # mirrored repodata does not list the copied content
+        new_version.remove_content(RepoMetadataFile.objects.filter(pk__in=new_version.content))
@@ -15,7 +15,8 @@ from pulpcore.plugin.models import (
 
 from pulpcore.plugin.tasking import WorkingDirectory
 
-from pulp_rpm.app.models import Package, RpmPublication, UpdateRecord
+from pulp_rpm.app.models import Package, RepoMetadataFile, RpmPublication, UpdateRecord
+from pulp_rpm.app.tasks.synchronizing import RpmFirstStage
 
 log = logging.getLogger(__name__)
 
@@ -84,6 +85,10 @@ def publish(repository_version_pk):
     """
     Create a Publication based on a RepositoryVersion.
 
+    The repodata of a repository version whose repodata is mirrored is published as it is, as
+    long as it lists exactly the packages of the version. Otherwise it is generated from the
+    content.
+
     Args:
         repository_version_pk (str): Create a publication from this repository version.
     """
@@ -96,6 +101,15 @@ def publish(repository_version_pk):
 
     with WorkingDirectory():
         with RpmPublication.create(repository_version) as publication:
+            if RepoMetadataFile.repomd_in(repository_version):
+                if mirrored_repodata_matches(repository_version):
+                    log.info(_('Publishing the mirrored repodata as it is.'))
+                    populate(publication, mirrored=True)
+                    populate_repodata_files(publication)
+                    return
+                log.info(_('The mirrored repodata does not list the packages of the repository '
+                           'version, generating the repodata.'))
+
             packages = populate(publication)
 
             # Prepare metadata files
@@ -186,7 +200,40 @@ def publish(repository_version_pk):
             metadata.save()
 
 
-def populate(publication):
+def mirrored_repodata_matches(repository_version):
+    """
+    Check that the mirrored repodata of a repository version lists exactly its packages.
+
+    Content can be removed from or added to a repository version without its mirrored repodata
+    being dropped, e.g. by a generic modification of the repository. Such repodata must not be
+    published as it is.
+
+    Args:
+        repository_version (RepositoryVersion): a repository version with mirrored repodata
+
+    Returns:
+        bool: True if the mirrored primary.xml lists the same packages as the version
+
+    """
+    primary_files = RepoMetadataFile.objects.filter(
+        pk__in=repository_version.content, data_type='primary'
+    )
+    if primary_files.count() != 1:
+        return False
+
+    content_artifact = primary_files.get().contentartifact_set.first()
+    if not content_artifact or not content_artifact.artifact:
+        return False
+
+    pkgids = set(Package.objects.filter(pk__in=repository_version.content).
+                 values_list('pkgId', flat=True))
+    entries = RpmFirstStage.scan_primary(content_artifact.artifact.file.path)
+    if len(entries) != len(pkgids):
+        return False
+    return set(entry.pkgId for entry in entries) == pkgids
+
+
+def populate(publication, mirrored=False):
     """
     Populate a publication.
 
@@ -194,6 +241,8 @@ def populate(publication):
 
     Args:
         publication (pulpcore.plugin.models.Publication): A Publication to populate.
+        mirrored (bool): Publish the packages at their location in the mirrored repodata instead
+            of the location of their artifacts.
 
     Returns:
         packages (pulp_rpm.models.Package): A list of published packages.
@@ -206,7 +255,8 @@ def populate(publication):
     for package in packages:
         for content_artifact in package.contentartifact_set.all():
             published_artifacts.append(PublishedArtifact(
-                relative_path=content_artifact.relative_path,
+                relative_path=(package.location_href if mirrored
+                               else content_artifact.relative_path),
                 publication=publication,
                 content_artifact=content_artifact)
             )
@@ -214,3 +264,27 @@ def populate(publication):
     PublishedArtifact.objects.bulk_create(published_artifacts)
 
     return packages
+
+
+def populate_repodata_files(publication):
+    """
+    Create published artifacts for the mirrored repodata files of a publication.
+
+    Args:
+        publication (pulpcore.plugin.models.Publication): A Publication to populate.
+
+    """
+    repodata_files = RepoMetadataFile.objects.filter(
+        pk__in=publication.repository_version.content
+    ).prefetch_related('contentartifact_set')
+    published_artifacts = []
+
+    for repodata_file in repodata_files:
+        for content_artifact in repodata_file.contentartifact_set.all():
+            published_artifacts.append(PublishedArtifact(
+                relative_path=content_artifact.relative_path,
+                publication=publication,
+                content_artifact=content_artifact)
+            )
+
+    PublishedArtifact.objects.bulk_create(published_artifacts)
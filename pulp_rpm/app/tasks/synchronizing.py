@@ -1,15 +1,33 @@
 import asyncio
+import concurrent.futures
 import hashlib
+import json
 import logging
 import os
-
-from collections import defaultdict
+import tempfile
+import threading
+import time
+import uuid
+
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from functools import cmp_to_key, partial
 from gettext import gettext as _  # noqa:F401
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 
 import createrepo_c as cr
 
-from pulpcore.plugin.models import Artifact, ProgressBar, Remote, Repository
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from pulpcore.plugin.models import (
+    Artifact,
+    CreatedResource,
+    ProgressBar,
+    Remote,
+    Repository,
+    RepositoryVersion
+)
 
 from pulpcore.plugin.stages import (
     ArtifactDownloader,
@@ -19,53 +37,635 @@ from pulpcore.plugin.stages import (
     DeclarativeContent,
     DeclarativeVersion,
     RemoteArtifactSaver,
-    RemoveDuplicates,
     Stage,
     QueryExistingArtifacts,
     QueryExistingContents
 )
+from pulpcore.plugin.tasking import WorkingDirectory
 
 
-from pulp_rpm.app.constants import CHECKSUM_TYPES, PACKAGE_REPODATA, UPDATE_REPODATA
+from pulp_rpm.app.constants import (
+    CHECKSUM_TYPES,
+    DOWNLOAD_ORDERS,
+    PACKAGE_REPODATA,
+    REPOMD_DATA_TYPE,
+    UPDATE_REPODATA,
+)
+from pulp_rpm.app.downloaders import NotModified
+from pulp_rpm.app.mirrors import (
+    MIRROR_ERRORS,
+    REPOMD_PATH,
+    fetch_mirror_list,
+    find_fastest_mirror,
+)
+from pulp_rpm.app.repodata_cache import RepodataCache
+from pulp_rpm.app.shared_utils import compare_evr, update_record_digest
+from pulp_rpm.app.zchunk import DELTA_ERRORS, ZCK_SUFFIX, download_delta
 from pulp_rpm.app.models import (
-    Package, RpmRemote, UpdateCollection, UpdateCollectionPackage, UpdateRecord, UpdateReference
+    InFlightDownload,
+    Package,
+    RepoMetadataFile,
+    RpmRemote,
+    RpmSyncCheckpoint,
+    RpmSyncEstimate,
+    RpmSyncState,
+    UpdateCollection,
+    UpdateCollectionPackage,
+    UpdateRecord,
+    UpdateReference
 )
 
 log = logging.getLogger(__name__)
 
+# how many parsed items a parser thread may get ahead of the pipeline
+PARSER_QUEUE_SIZE = 100
+
+# how many seconds a parser thread waits for its consumer before it checks whether to stop
+PARSER_STOP_POLL_INTERVAL = 0.1
+
+# how many pkgIds are looked up in the database at once
+PKGID_QUERY_BATCH_SIZE = 1000
+
+# in how many rounds new packages are parsed if they are downloaded in another order than their
+# order in primary.xml, each round takes a pass over the repodata
+DOWNLOAD_ORDER_ROUNDS = 4
+
+# the minimum number of seconds between saves of the progress of parsing
+PROGRESS_SAVE_INTERVAL = 1
+
+# digest types which identify artifacts in download claims, the strongest first
+DOWNLOAD_DIGEST_TYPES = ('sha512', 'sha384', 'sha256', 'sha224', 'sha1', 'md5')
+
+# how many seconds to wait between checks for artifacts downloaded by other syncs, and between
+# heartbeats of the claims of a sync
+IN_FLIGHT_DOWNLOAD_POLL_INTERVAL = 5
+
+# after how many seconds without a heartbeat a claim of a download is considered abandoned
+IN_FLIGHT_DOWNLOAD_TIMEOUT = 60
+
+# the data of a primary.xml package entry which is needed to identify the package and its artifact
+PrimaryEntry = namedtuple('PrimaryEntry', [
+    'name', 'epoch', 'version', 'release', 'arch', 'pkgId', 'checksum_type', 'location_href',
+    'size_package', 'time_build'
+])
+
+# content models created from each group of repodata types
+REPODATA_CONTENT_MODELS = (
+    (PACKAGE_REPODATA, Package),
+    (UPDATE_REPODATA, UpdateRecord),
+)
+
 
-def synchronize(remote_pk, repository_pk):
+def synchronize(remote_pk, repository_pk, optimize=True, mirror_metadata=False, dry_run=False):
     """
     Sync content from the remote repository.
 
     Create a new version of the repository that is synchronized with the remote.
 
+    If optimization is enabled and neither the repomd.xml of the remote nor the repository have
+    changed since the last sync from this remote, the sync is skipped and no new repository
+    version is created. If only some of the repodata changed, e.g. just updateinfo, only that
+    repodata is downloaded and processed, and content of the unchanged types is carried forward
+    from the previous repository version.
+
+    If the repodata is mirrored, all repodata files of the remote and repomd.xml are added to the
+    repository version as they are, so a publication serves them verbatim.
+
     Args:
         remote_pk (str): The remote PK.
         repository_pk (str): The repository PK.
+        optimize (bool): Whether to skip the sync when nothing has changed since the last one.
+        mirror_metadata (bool): Whether to keep the repodata files of the remote.
+        dry_run (bool): Whether to only estimate what the sync would change and download, see
+            :func:`estimate_sync`.
 
     Raises:
-        ValueError: If the remote does not specify a url to sync.
+        ValueError: If the remote does not specify a url to sync, or it filters packages while
+            the repodata is mirrored.
 
     """
     remote = RpmRemote.objects.get(pk=remote_pk)
     repository = Repository.objects.get(pk=repository_pk)
 
-    package_dupe_criteria = {'model': Package,
-                             'field_names': ['name', 'epoch', 'version', 'release', 'arch']}
-
     if not remote.url:
         raise ValueError(_('A remote must have a url specified to synchronize.'))
+    if mirror_metadata and remote.filters_packages():
+        raise ValueError(_('The repodata of a remote which filters packages cannot be mirrored.'))
+
+    if dry_run:
+        return estimate_sync(remote, repository)
 
     log.info(_('Synchronizing: repository={r} remote={p}').format(
         r=repository.name, p=remote.name))
 
+    sync_state = RpmSyncState.objects.filter(remote=remote, repository=repository).first()
+    sync_state_is_current = optimize and sync_state is not None and sync_state.is_current()
+    if sync_state_is_current and mirror_metadata:
+        # the last sync cannot be relied on if it did not mirror the repodata
+        repomd_file = RepoMetadataFile.repomd_in(sync_state.repository_version)
+        sync_state_is_current = repomd_file is not None
+
+    with WorkingDirectory():
+        fetched_repomd = asyncio.get_event_loop().run_until_complete(
+            fetch_repomd(remote, sync_state.validators if sync_state_is_current else None)
+        )
+    if fetched_repomd is None:
+        log.info(_('repomd.xml has not been modified since the last sync. '
+                   'Skipping: repository={r} remote={p}').format(r=repository.name, p=remote.name))
+        return
+    repomd, base_urls, validators, repomd_xml = fetched_repomd
+
+    revision = repomd.revision or ''
+    repomd_checksums = {record.type: record.checksum for record in repomd.records}
+
+    skip_types = []
+    if sync_state_is_current:
+        if sync_state.revision == revision and sync_state.checksums == repomd_checksums:
+            log.info(_('Repository metadata has not changed since the last sync. '
+                       'Skipping: repository={r} remote={p}').format(r=repository.name,
+                                                                     p=remote.name))
+            if validators != sync_state.validators:
+                sync_state.etag = validators['etag']
+                sync_state.last_modified = validators['last_modified']
+                sync_state.save()
+            return
+
+        previous_checksums = sync_state.checksums
+        for repodata_types, _model in REPODATA_CONTENT_MODELS:
+            for repodata_type in repodata_types:
+                if previous_checksums.get(repodata_type) != repomd_checksums.get(repodata_type):
+                    break
+            else:
+                skip_types.extend(repodata_types)
+
+    checkpoint = start_checkpoint(remote, repository, repomd_checksums)
+
     deferred_download = (remote.policy != Remote.IMMEDIATE)  # Interpret download policy
-    first_stage = RpmFirstStage(remote, deferred_download)
-    dv = RpmDeclarativeVersion(first_stage=first_stage,
-                               repository=repository,
-                               remove_duplicates=[package_dupe_criteria])
+    first_stage = RpmFirstStage(remote, repomd, deferred_download, skip_types=skip_types,
+                                base_urls=base_urls, checkpoint=checkpoint,
+                                previous_checksums=sync_state.checksums if sync_state else None,
+                                repomd_xml=repomd_xml if mirror_metadata else None)
+    if skip_types:
+        log.info(_('Repodata unchanged since the last sync: {t}. Skipped.').format(
+            t=', '.join(skip_types)))
+        # repodata files are only kept if they are mirrored again
+        resynced_models = [model for repodata_types, model in REPODATA_CONTENT_MODELS
+                           if repodata_types[0] not in skip_types] + [RepoMetadataFile]
+        dv = RpmDeclarativeVersion(first_stage=first_stage,
+                                   repository=repository,
+                                   mirror=False,
+                                   resynced_models=resynced_models,
+                                   checkpoint=checkpoint)
+    else:
+        dv = RpmDeclarativeVersion(first_stage=first_stage,
+                                   repository=repository,
+                                   checkpoint=checkpoint)
     dv.create()
+    checkpoint.delete()
+
+    RpmSyncState.objects.update_or_create(
+        remote=remote,
+        repository=repository,
+        defaults={
+            'revision': revision,
+            'repomd_checksums': json.dumps(repomd_checksums),
+            'etag': validators['etag'],
+            'last_modified': validators['last_modified'],
+            'repository_version': RepositoryVersion.latest(repository),
+        }
+    )
+
+
+def estimate_sync(remote, repository):
+    """
+    Estimate what a sync would change in a repository and how much it would download.
+
+    Only repomd.xml, primary.xml and updateinfo.xml are downloaded and parsed, and they are not
+    put into the repodata cache. Nothing is written but the estimate, which is a created resource
+    of the task.
+
+    Args:
+        remote (RpmRemote): The remote which would be synced from
+        repository (Repository): The repository which would be synced into
+
+    Returns:
+        dict: the number of packages and advisories which would be added to and removed from
+            the latest repository version, and the number of bytes of packages which would be
+            downloaded, by the fields of RpmSyncEstimate
+
+    """
+    log.info(_('Estimating sync: repository={r} remote={p}').format(
+        r=repository.name, p=remote.name))
+    loop = asyncio.get_event_loop()
+
+    with WorkingDirectory():
+        repomd, base_urls, _validators, _repomd_xml = loop.run_until_complete(
+            fetch_repomd(remote)
+        )
+        deferred_download = (remote.policy != Remote.IMMEDIATE)
+        first_stage = RpmFirstStage(remote, repomd, deferred_download, base_urls=base_urls,
+                                    cache_downloads=False)
+        records = {record.type: record for record in repomd.records}
+
+        async def download(repodata_type):
+            if repodata_type not in records:
+                return None
+            return await first_stage.download_repodata(records[repodata_type])
+
+        primary_xml_path, updateinfo_xml_path = loop.run_until_complete(
+            asyncio.gather(download('primary'), download('updateinfo'))
+        )
+        entries = RpmFirstStage.scan_primary(primary_xml_path) if primary_xml_path else []
+        updates = (RpmFirstStage.parse_updateinfo(updateinfo_xml_path)
+                   if updateinfo_xml_path else [])
+
+    package_filter = remote.get_package_filter()
+    entries = [entry for entry in entries if package_filter(entry.name, entry.arch)]
+    if remote.retain_package_versions:
+        entries = RpmFirstStage.newest_entries(entries, remote.retain_package_versions)
+
+    repository_version = RepositoryVersion.latest(repository)
+    estimate = estimate_packages(entries, repository_version, deferred_download)
+    estimate.update(estimate_advisories(updates, repository_version))
+
+    CreatedResource(content_object=RpmSyncEstimate.objects.create(
+        remote=remote, repository=repository, **estimate
+    )).save()
+    log.info(_('Sync estimate: repository={r} remote={p} {e}').format(
+        r=repository.name, p=remote.name, e=estimate))
+    return estimate
+
+
+def estimate_packages(entries, repository_version, deferred_download):
+    """
+    Estimate what a sync of packages would change in a repository version and download.
+
+    Args:
+        entries (list): :class:`PrimaryEntry` of the packages which would be synced
+        repository_version (RepositoryVersion): the version the sync would start from, if any
+        deferred_download (bool): whether packages would be downloaded later, if at all
+
+    Returns:
+        dict: 'packages_added', 'packages_removed' and 'download_size'
+
+    """
+    version_pkgids = set()
+    if repository_version:
+        version_pkgids.update(Package.objects.filter(
+            pk__in=repository_version.content
+        ).values_list('pkgId', flat=True))
+    remote_pkgids = {entry.pkgId for entry in entries}
+
+    download_size = 0
+    if not deferred_download:
+        existing_digests = find_existing_digests(entries)
+        download_size = sum(entry.size_package or 0 for entry in entries
+                            if entry_digest(entry) not in existing_digests)
+
+    return {
+        'packages_added': len(remote_pkgids - version_pkgids),
+        'packages_removed': len(version_pkgids - remote_pkgids),
+        'download_size': download_size,
+    }
+
+
+def entry_digest(entry):
+    """
+    The digest of the package of a primary.xml entry, as stored on its artifact.
+
+    Args:
+        entry (PrimaryEntry): the entry of a package
+
+    Returns:
+        tuple: the name of the digest field of artifacts and the digest, None if artifacts do not
+            store digests of this type
+
+    """
+    digest_type = getattr(CHECKSUM_TYPES, entry.checksum_type.upper(), None)
+    if digest_type not in Artifact.DIGEST_FIELDS:
+        return None
+    return digest_type, entry.pkgId
+
+
+def find_existing_digests(entries):
+    """
+    Find which packages of primary.xml entries have artifacts already.
+
+    Args:
+        entries (list): :class:`PrimaryEntry` of packages
+
+    Returns:
+        set: :func:`entry_digest` of the packages which have artifacts
+
+    """
+    digests = defaultdict(list)
+    for entry in entries:
+        digest = entry_digest(entry)
+        if digest:
+            digests[digest[0]].append(digest[1])
+
+    existing_digests = set()
+    for digest_type, values in digests.items():
+        for i in range(0, len(values), PKGID_QUERY_BATCH_SIZE):
+            batch = values[i:i + PKGID_QUERY_BATCH_SIZE]
+            existing_digests.update(
+                (digest_type, value) for value in Artifact.objects.filter(
+                    **{'{}__in'.format(digest_type): batch}
+                ).values_list(digest_type, flat=True)
+            )
+    return existing_digests
+
+
+def estimate_advisories(updates, repository_version):
+    """
+    Estimate what a sync of advisories would change in a repository version.
+
+    Args:
+        updates (list): parsed :obj:`createrepo_c.UpdateRecord` of updateinfo.xml
+        repository_version (RepositoryVersion): the version the sync would start from, if any
+
+    Returns:
+        dict: 'advisories_added' and 'advisories_removed'
+
+    """
+    version_digests = set()
+    if repository_version:
+        version_digests.update(UpdateRecord.objects.filter(
+            pk__in=repository_version.content
+        ).values_list('digest', flat=True))
+
+    remote_digests = set()
+    for update in updates:
+        collection_dicts = [
+            (UpdateCollection.createrepo_to_dict(collection),
+             [UpdateCollectionPackage.createrepo_to_dict(package)
+              for package in collection.packages])
+            for collection in update.collections
+        ]
+        reference_dicts = [UpdateReference.createrepo_to_dict(reference)
+                           for reference in update.references]
+        remote_digests.add(update_record_digest(
+            UpdateRecord.createrepo_to_dict(update), collection_dicts, reference_dicts
+        ))
+
+    return {
+        'advisories_added': len(remote_digests - version_digests),
+        'advisories_removed': len(version_digests - remote_digests),
+    }
+
+
+def start_checkpoint(remote, repository, repomd_checksums):
+    """
+    Resume the checkpoint of an interrupted sync, or start a new one.
+
+    A checkpoint is only resumed if the repository metadata is the same as when it was started,
+    and the remote has not been modified since, e.g. its filters or its policy.
+
+    Args:
+        remote (RpmRemote): The remote which is synced from
+        repository (Repository): The repository which is synced into
+        repomd_checksums (dict): checksums of the repomd records, by record type
+
+    Returns:
+        RpmSyncCheckpoint: the checkpoint of the sync
+
+    """
+    checkpoint, created = RpmSyncCheckpoint.objects.get_or_create(
+        remote=remote, repository=repository,
+        defaults={'repomd_checksums': json.dumps(repomd_checksums),
+                  'remote_last_updated': remote._last_updated}
+    )
+    if created:
+        return checkpoint
+
+    unchanged = checkpoint.remote_last_updated == remote._last_updated
+    if unchanged and checkpoint.checksums == repomd_checksums:
+        log.info(_('Resuming an interrupted sync: repository={r} remote={p}').format(
+            r=repository.name, p=remote.name))
+        return checkpoint
+
+    checkpoint.delete()
+    return RpmSyncCheckpoint.objects.create(remote=remote, repository=repository,
+                                            repomd_checksums=json.dumps(repomd_checksums),
+                                            remote_last_updated=remote._last_updated)
+
+
+async def fetch_repomd(remote, validators=None):
+    """
+    Download and parse repomd.xml of the remote repository.
+
+    The url of the remote is either the base URL of the repository, or a metalink or a mirrorlist
+    of it. It is only treated as the latter if there is no repomd.xml under it.
+
+    If validators of repomd.xml from the last sync are given, repomd.xml under the url is
+    requested conditionally and is not downloaded again if it has not been modified.
+
+    Args:
+        remote (RpmRemote): The remote to fetch repomd.xml from.
+        validators (dict): 'etag' and 'last_modified' of repomd.xml from the last sync
+
+    Returns:
+        tuple: parsed repomd.xml, the base URLs of the repository, the one repomd.xml was
+            downloaded from first, followed by the mirrors to fail over to, the validators of
+            repomd.xml, and repomd.xml as it was downloaded. None if repomd.xml has not been
+            modified.
+
+    """
+    url = urljoin(remote.url, REPOMD_PATH)
+    downloader_kwargs = {}
+    if validators and urlparse(url).scheme in ('http', 'https'):
+        downloader_kwargs['request_headers'] = conditional_request_headers(validators)
+
+    try:
+        result = await remote.get_downloader(url=url, **downloader_kwargs).run()
+    except NotModified:
+        return None
+    except MIRROR_ERRORS:
+        mirror_list = await fetch_mirror_list(remote)
+        if mirror_list is None:
+            raise
+        base_urls, result = await find_fastest_mirror(remote, mirror_list)
+        # validators of a mirror cannot be used with the next fastest mirror
+        validators = {'etag': '', 'last_modified': ''}
+    else:
+        base_urls = [remote.url]
+        headers = result.headers or {}
+        validators = {
+            'etag': headers.get('ETag', ''),
+            'last_modified': headers.get('Last-Modified', ''),
+        }
+    with open(result.path, 'rb') as repomd_file:
+        repomd_xml = repomd_file.read()
+    return cr.Repomd(result.path), base_urls, validators, repomd_xml
+
+
+def conditional_request_headers(validators):
+    """
+    Build the headers of a conditional request.
+
+    Args:
+        validators (dict): 'etag' and 'last_modified' of the last response
+
+    Returns:
+        dict: If-None-Match and If-Modified-Since headers for the validators which are known
+
+    """
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+def log_parser_warning(repodata, warning_type, message):
+    """
+    Log a warning of createrepo_c about repodata which is parsed, parsing carries on.
+
+    Args:
+        repodata (str): a description of the parsed repodata
+        warning_type (int): one of the createrepo_c XML_WARNING_* types
+        message (str): the warning
+
+    """
+    log.warning(_('Warning while parsing {repodata}: {message}').format(
+        repodata=repodata, message=message))
+
+
+async def iterate_in_executor(iterable_factory, *args):
+    """
+    Consume a blocking iterable in a worker thread and yield its items on the event loop.
+
+    Items are handed over through a bounded queue, so the worker thread pauses whenever the
+    consumer falls behind and the event loop is never blocked by the iteration itself.
+
+    Each iteration has a thread of its own, so iterations which wait for their consumers cannot
+    use up the default executor which other blocking calls of the sync are run in. The thread
+    stops as soon as the consumer stops early, e.g. when it is cancelled, and an exception raised
+    by the iterable is raised to the consumer after the items which were yielded before it.
+
+    Args:
+        iterable_factory (callable): a callable which returns the iterable to consume
+        args: positional arguments for ``iterable_factory``
+
+    Yields:
+        items of the iterable, in order
+
+    """
+    loop = asyncio.get_event_loop()
+    queue = asyncio.Queue(maxsize=PARSER_QUEUE_SIZE)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        """
+        Put an item into the queue, unless the consumer stops meanwhile.
+
+        Returns:
+            bool: whether the item was put into the queue
+
+        """
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=PARSER_STOP_POLL_INTERVAL)
+                return True
+            except concurrent.futures.TimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    return False
+
+    def produce():
+        try:
+            for item in iterable_factory(*args):
+                if stop.is_set() or not put(item):
+                    return
+        finally:
+            if not stop.is_set():
+                put(done)
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    producer = loop.run_in_executor(executor, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            yield item
+        # raises an exception of the iterable
+        await producer
+    finally:
+        # lets the worker thread finish if the consumer stopped early
+        stop.set()
+        executor.shutdown(wait=False)
+
+
+async def run_in_db_executor(func, *args):
+    """
+    Run a function which queries the database in the default executor.
+
+    Django opens a database connection per thread, and the threads of the default executor
+    outlive the sync. The connection of the thread is closed when the function returns, so it is
+    not left open.
+
+    Args:
+        func (callable): the function to run
+        args: positional arguments for ``func``
+
+    Returns:
+        the return value of ``func``
+
+    """
+    def run():
+        try:
+            return func(*args)
+        finally:
+            connection.close()
+
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, run)
+
+
+class ThrottledProgressBar:
+    """
+    Count progress on a ProgressBar, but save it at most once per interval.
+
+    Progress of parsed units is counted per unit, saving the ProgressBar every time would cost
+    a database write per unit. The ProgressBar itself always holds the accurate count, saving it
+    when the work is done makes the final count visible.
+    """
+
+    def __init__(self, progress_bar, interval=PROGRESS_SAVE_INTERVAL):
+        """
+        Wrap a ProgressBar.
+
+        Args:
+            progress_bar (ProgressBar): the ProgressBar to count progress on
+            interval (float): the minimum number of seconds between saves
+
+        """
+        self.progress_bar = progress_bar
+        self.interval = interval
+        self.last_save = time.monotonic()
+
+    def increment(self, count=1):
+        """
+        Count done units and save the ProgressBar if the interval has passed.
+
+        Args:
+            count (int): the number of done units
+
+        """
+        self.progress_bar.done += count
+        if time.monotonic() - self.last_save >= self.interval:
+            self.save()
+
+    def save(self):
+        """
+        Save the ProgressBar.
+        """
+        self.progress_bar.save()
+        self.last_save = time.monotonic()
 
 
 class RpmDeclarativeVersion(DeclarativeVersion):
@@ -73,6 +673,31 @@ class RpmDeclarativeVersion(DeclarativeVersion):
     Subclassed Declarative version creates a custom pipeline for RPM sync.
     """
 
+    def __init__(self, *args, resynced_models=None, checkpoint=None, **kwargs):
+        """
+        Configure the RPM sync pipeline.
+
+        Args:
+            resynced_models (list): Content models which are synced in full when the version is
+                not mirrored. Content of these models which is not in the stream is removed from
+                the new version, content of any other model is carried forward unchanged.
+            checkpoint (RpmSyncCheckpoint): the checkpoint to record saved packages in
+
+        """
+        super().__init__(*args, **kwargs)
+        self.resynced_models = resynced_models or []
+        self.checkpoint = checkpoint
+        self.download_claims = DownloadClaims()
+
+    def create(self):
+        """
+        Perform the work, and release the download claims of the sync whatever the outcome.
+        """
+        try:
+            return super().create()
+        finally:
+            self.download_claims.release_all()
+
     def pipeline_stages(self, new_version):
         """
         Build a list of stages feeding into the ContentUnitAssociation stage.
@@ -90,14 +715,19 @@ class RpmDeclarativeVersion(DeclarativeVersion):
         pipeline = [
             self.first_stage,
             QueryExistingArtifacts(),
+            RpmDownloadClaimer(self.download_claims),
             ArtifactDownloader(),
             ArtifactSaver(),
+            RpmDownloadReleaser(self.download_claims),
             QueryExistingContents(),
             RpmContentSaver(),
             RemoteArtifactSaver(),
         ]
-        for dupe_query_dict in self.remove_duplicates:
-            pipeline.append(RemoveDuplicates(new_version, **dupe_query_dict))
+        if self.checkpoint:
+            pipeline.append(RpmCheckpointRecorder(self.checkpoint))
+        pipeline.append(RpmRemoveDuplicates(new_version))
+        if self.resynced_models:
+            pipeline.append(RpmContentUnassociation(new_version, self.resynced_models))
 
         return pipeline
 
@@ -110,22 +740,48 @@ class RpmFirstStage(Stage):
     that should exist in the new :class:`~pulpcore.plugin.models.RepositoryVersion`.
     """
 
-    def __init__(self, remote, deferred_download):
+    def __init__(self, remote, repomd, deferred_download, skip_types=None, base_urls=None,
+                 checkpoint=None, previous_checksums=None, repomd_xml=None,
+                 cache_downloads=True):
         """
         The first stage of a pulp_rpm sync pipeline.
 
         Args:
             remote (RpmRemote): The remote data to be used when syncing
+            repomd (createrepo_c.Repomd): The repomd.xml of the remote repository
             deferred_download (bool): if True the downloading will not happen now. If False, it will
                 happen immediately.
+            skip_types (list): repodata types which should be neither downloaded nor processed
+            base_urls (list): base URLs of the mirrors of the repository, content is downloaded
+                from the first one and all downloads fail over to the next ones. Defaults to the
+                url of the remote.
+            checkpoint (RpmSyncCheckpoint): the checkpoint of the sync, packages saved before an
+                interruption are taken from it
+            previous_checksums (dict): checksums of the repodata of the previous sync by type,
+                zchunk repodata of the previous sync is the base of delta downloads
+            repomd_xml (bytes): repomd.xml as it was downloaded if the repodata is mirrored, then
+                all repodata files are kept as content, in addition to the parsed content
+            cache_downloads (bool): whether downloaded repodata is put into the repodata cache
 
         """
         super().__init__()
         self.remote = remote
+        self.base_urls = base_urls or [remote.url]
+        remote.fail_over_to_mirrors(self.base_urls)
+        self.repodata_cache = RepodataCache.from_settings()
+        self.package_filter = remote.get_package_filter()
+        self.repomd = repomd
         self.deferred_download = deferred_download
+        self.skip_types = skip_types or []
+        self.checkpoint = checkpoint
+        self.previous_checksums = previous_checksums or {}
+        self.repomd_xml = repomd_xml
+        self.cache_downloads = cache_downloads
+        self.repodata_paths = {}
+        self.advisory_packages = set()
 
     @staticmethod
-    async def parse_updateinfo(updateinfo_xml_path):
+    def parse_updateinfo(updateinfo_xml_path):
         """
         Parse updateinfo.xml to extact update info.
 
@@ -138,63 +794,81 @@ class RpmFirstStage(Stage):
         """
         uinfo = cr.UpdateInfo()
 
-        # TODO: handle parsing errors/warnings, warningcb callback can be used
-        cr.xml_parse_updateinfo(updateinfo_xml_path, uinfo)
+        cr.xml_parse_updateinfo(updateinfo_xml_path, uinfo,
+                                warningcb=partial(log_parser_warning, 'updateinfo.xml'))
         return uinfo.updates
 
     @staticmethod
-    def hash_update_record(update):
+    def scan_primary(primary_xml_path):
         """
-        Find the hex digest for an update record xml from creatrepo_c.
+        Collect the data identifying each package listed in primary.xml.
+
+        Only a few attributes of each package are kept, so the result is small even for
+        large repositories.
 
         Args:
-            update(createrepo_c.UpdateRecord): update record
+            primary_xml_path(str): a path to a downloaded primary.xml
 
         Returns:
-            str: a hex digest representing the update record
+            list: :class:`PrimaryEntry` of each package in primary.xml
 
         """
-        uinfo = cr.UpdateInfo()
-        uinfo.append(update)
-        return hashlib.sha256(uinfo.xml_dump().encode('utf-8')).hexdigest()
+        entries = []
+
+        def pkgcb(pkg):
+            """
+            Keep the identifying data of a parsed package.
+
+            Args:
+                pkg(createrepo_c.Package): a parsed metadata for a package
+
+            """
+            entries.append(PrimaryEntry(
+                name=pkg.name,
+                # createrepo_c writes a missing epoch as 0
+                epoch=pkg.epoch or '0',
+                version=pkg.version,
+                release=pkg.release,
+                arch=pkg.arch,
+                pkgId=pkg.pkgId,
+                checksum_type=pkg.checksum_type,
+                location_href=pkg.location_href,
+                size_package=pkg.size_package,
+                time_build=pkg.time_build
+            ))
+
+        cr.xml_parse_primary(primary_xml_path, pkgcb=pkgcb, do_files=False,
+                             warningcb=partial(log_parser_warning, 'primary.xml'))
+        return entries
 
     @staticmethod
-    async def parse_repodata(primary_xml_path, filelists_xml_path, other_xml_path):
+    def parse_packages(primary_xml_path, filelists_xml_path, other_xml_path, pkgids):
         """
-        Parse repodata to extract package info.
+        Parse repodata to extract package info, one package at a time.
+
+        primary.xml, filelists.xml and other.xml are walked in lockstep, so only the package
+        which is currently being processed is kept in memory.
+
+        Packages are selected by the pkgId of the parsed package. newpkgcb is not told the pkgId
+        of a package in primary.xml by every version of createrepo_c, it only skips further
+        parsing of packages whose pkgId is known to it.
 
         Args:
             primary_xml_path(str): a path to a downloaded primary.xml
             filelists_xml_path(str): a path to a downloaded filelists.xml
             other_xml_path(str): a path to a downloaded other.xml
+            pkgids(set): pkgIds of packages which should be parsed, others are skipped
 
-        Returns:
-            dict: createrepo_c package objects with the pkgId as a key
+        Yields:
+            createrepo_c.Package: a package with metadata from all three files
 
         """
-        def pkgcb(pkg):
-            """
-            A callback which is used when a whole package entry in xml is parsed.
-
-            Args:
-                pkg(preaterepo_c.Package): a parsed metadata for a package
-
-            """
-            packages[pkg.pkgId] = pkg
-
         def newpkgcb(pkgId, name, arch):
             """
             A callback which is used when a new package entry is encountered.
 
-            Only opening <package> element is parsed at that moment.
-            This function has to return a package which parsed data will be added to
-            or None if a package should be skipped.
-
-            pkgId, name and arch of a package can be used to skip further parsing. Available
-            only for filelists.xml and other.xml.
-
             Args:
-                pkgId(str): pkgId of a package
+                pkgId(str): pkgId of a package, None if it is not known yet
                 name(str): name of a package
                 arch(str): arch of a package
 
@@ -204,20 +878,361 @@ class RpmFirstStage(Stage):
                 If None is returned, further parsing of a package will be skipped.
 
             """
-            return packages.get(pkgId, None)
+            if pkgId is not None and pkgId not in pkgids:
+                return None
+            return cr.Package()
+
+        warningcb = partial(log_parser_warning, 'primary.xml, filelists.xml or other.xml')
+        package_iterator = cr.PackageIterator(primary_xml_path, filelists_xml_path, other_xml_path,
+                                              newpkgcb=newpkgcb, warningcb=warningcb)
+        for pkg in package_iterator:
+            if pkg.pkgId in pkgids:
+                yield pkg
+
+    async def download_repodata(self, record):
+        """
+        Download a repodata file, failing over to the next mirror on errors.
+
+        The file is taken from the repodata cache instead if it has been downloaded with the same
+        checksum before, and a downloaded file is put into the cache unless caching is disabled.
+        A zchunk file is downloaded as a delta to its version of the previous sync if possible.
+
+        Args:
+            record(createrepo_c.RepomdRecord): the repomd.xml record of the repodata file
+
+        Returns:
+            str: a path to the file, validated against the record checksum
+
+        """
+        loop = asyncio.get_event_loop()
+        checksum_type = getattr(CHECKSUM_TYPES, record.checksum_type.upper())
+        if self.repodata_cache:
+            path = await loop.run_in_executor(None, self.repodata_cache.get, checksum_type,
+                                              record.checksum, record.size)
+            if path:
+                log.debug(_('Repodata taken from the cache: {href}').format(
+                    href=record.location_href))
+                self.repodata_paths[record.type] = path
+                return path
+
+        result = None
+        if record.type.endswith(ZCK_SUFFIX):
+            result = await self.download_zchunk_delta(record, checksum_type)
+        if result is None:
+            downloader = self.remote.get_downloader(
+                url=urljoin(self.base_urls[0], record.location_href),
+                expected_digests={checksum_type: record.checksum}
+            )
+            result = await downloader.run()
+        if self.repodata_cache and self.cache_downloads:
+            await loop.run_in_executor(None, self.repodata_cache.put, checksum_type,
+                                       record.checksum, result.path)
+        self.repodata_paths[record.type] = result.path
+        return result.path
+
+    async def download_zchunk_delta(self, record, checksum_type):
+        """
+        Download a zchunk repodata file as a delta to its version of the previous sync.
+
+        Only the chunks which are not in the version of the previous sync, taken from the repodata
+        cache, are downloaded from the first mirror.
+
+        Args:
+            record(createrepo_c.RepomdRecord): the repomd.xml record of the zchunk file
+            checksum_type(str): the checksum type of the record
+
+        Returns:
+            DownloadResult: the result of the download, None if the file has to be downloaded in
+                full
+
+        """
+        previous_checksum = self.previous_checksums.get(record.type)
+        if not self.repodata_cache or not previous_checksum or (record.size_header or 0) <= 0:
+            return None
+        loop = asyncio.get_event_loop()
+        previous_path = await loop.run_in_executor(None, self.repodata_cache.get, checksum_type,
+                                                   previous_checksum)
+        if not previous_path:
+            return None
+
+        # ranges of one file have to come from one server, so the download is not spread over
+        # the mirrors of the remote
+        downloader = self.remote.download_factory.build(
+            urljoin(self.base_urls[0], record.location_href),
+            expected_digests={checksum_type: record.checksum}
+        )
+        try:
+            return await download_delta(downloader, record.size_header, previous_path)
+        except DELTA_ERRORS as exc:
+            log.info(_('Delta download of {href} failed, downloading it in full: {e}').format(
+                href=record.location_href, e=exc))
+            return None
+        finally:
+            os.remove(previous_path)
+
+    async def put_repodata_files(self):
+        """
+        Create `DeclarativeContent` for repomd.xml and each repodata file, to keep them as they are.
+
+        The repodata files have to be downloaded and processed already, their artifacts are saved
+        here, so they are not downloaded again by the later stages, wherever they came from.
+        """
+        loop = asyncio.get_event_loop()
+        fd, repomd_path = tempfile.mkstemp(dir=os.getcwd(), prefix='repomd-')
+        with os.fdopen(fd, 'wb') as repomd_file:
+            repomd_file.write(self.repomd_xml)
+        files = [(REPOMD_DATA_TYPE, CHECKSUM_TYPES.SHA256,
+                  hashlib.sha256(self.repomd_xml).hexdigest(), REPOMD_PATH, repomd_path)]
+        for record in self.repomd.records:
+            files.append((record.type, getattr(CHECKSUM_TYPES, record.checksum_type.upper()),
+                          record.checksum, record.location_href,
+                          self.repodata_paths[record.type]))
+
+        for data_type, checksum_type, checksum, relative_path, path in files:
+            artifact = await loop.run_in_executor(None, RpmFirstStage.save_repodata_artifact,
+                                                  path, {checksum_type: checksum})
+            repodata_file = RepoMetadataFile(data_type=data_type, checksum_type=checksum_type,
+                                             checksum=checksum, relative_path=relative_path)
+            da = DeclarativeArtifact(
+                artifact=artifact,
+                url=urljoin(self.base_urls[0], relative_path),
+                relative_path=relative_path,
+                remote=self.remote,
+            )
+            await self.put(DeclarativeContent(content=repodata_file, d_artifacts=[da]))
+
+    @staticmethod
+    def save_repodata_artifact(path, expected_digests):
+        """
+        Save the artifact of a downloaded repodata file, or find the saved one.
+
+        Args:
+            path(str): a path to the file, which is moved into the artifact storage
+            expected_digests(dict): the digest of the file from repomd.xml, by its type
+
+        Returns:
+            Artifact: the saved artifact of the file
+
+        Raises:
+            DigestValidationError: if the file does not match the expected digest
+
+        """
+        artifact = Artifact.init_and_validate(path, expected_digests)
+        existing = Artifact.objects.filter(sha256=artifact.sha256).first()
+        if existing:
+            return existing
+        try:
+            with transaction.atomic():
+                artifact.save()
+        except IntegrityError:
+            # saved meanwhile by a concurrent sync
+            return Artifact.objects.get(sha256=artifact.sha256)
+        return artifact
+
+    @staticmethod
+    def newest_entries(entries, count):
+        """
+        Select the newest versions of each package, by name and arch.
+
+        Args:
+            entries(list): :class:`PrimaryEntry` of packages
+            count(int): number of the newest versions of each package to select
+
+        Returns:
+            list: :class:`PrimaryEntry` of the selected packages, in the original order
+
+        """
+        entries_by_name_arch = defaultdict(list)
+        for entry in entries:
+            entries_by_name_arch[(entry.name, entry.arch)].append(entry)
+
+        evr_key = cmp_to_key(compare_evr)
+        selected_pkgids = set()
+        for same_name_arch in entries_by_name_arch.values():
+            same_name_arch.sort(
+                key=lambda entry: evr_key((entry.epoch, entry.version, entry.release)),
+                reverse=True
+            )
+            selected_pkgids.update(entry.pkgId for entry in same_name_arch[:count])
+        return [entry for entry in entries if entry.pkgId in selected_pkgids]
+
+    @staticmethod
+    def find_existing_packages(pkgids):
+        """
+        Find the packages already saved in the database among the given pkgIds.
+
+        Args:
+            pkgids(list): pkgIds to look up
+
+        Returns:
+            dict: pks of the saved packages by their pkgId
+
+        """
+        existing_packages = {}
+        for i in range(0, len(pkgids), PKGID_QUERY_BATCH_SIZE):
+            batch = pkgids[i:i + PKGID_QUERY_BATCH_SIZE]
+            existing_packages.update(
+                Package.objects.filter(pkgId__in=batch).values_list('pkgId', 'pk')
+            )
+        return existing_packages
+
+    def package_to_declarative_content(self, package):
+        """
+        Create `DeclarativeContent` for a package and its artifact.
+
+        Args:
+            package(Package): a package to create content for
 
-        packages = {}
+        Returns:
+            :class:`~pulpcore.plugin.stages.DeclarativeContent`: content for the package
+
+        """
+        artifact = Artifact(size=package.size_package)
+        checksum_type = getattr(CHECKSUM_TYPES, package.checksum_type.upper())
+        setattr(artifact, checksum_type, package.pkgId)
+        url = urljoin(self.base_urls[0], package.location_href)
+        filename = os.path.basename(package.location_href)
+        da = DeclarativeArtifact(
+            artifact=artifact,
+            url=url,
+            relative_path=filename,
+            remote=self.remote,
+            deferred_download=self.deferred_download
+        )
+        return DeclarativeContent(content=package, d_artifacts=[da])
+
+    async def process_packages(self, primary_xml_path, filelists_xml_path, other_xml_path,
+                               packages_pb):
+        """
+        Create `DeclarativeContent` for all packages in the repodata.
+
+        Packages are filtered according to the remote from primary.xml alone. Filtered packages
+        and packages which are already in the database are not parsed any further, the latter are
+        passed on as the saved rows with the same pkgId.
+
+        Args:
+            primary_xml_path(str): a path to a downloaded primary.xml
+            filelists_xml_path(str): a path to a downloaded filelists.xml
+            other_xml_path(str): a path to a downloaded other.xml
+            packages_pb(ProgressBar): progress bar for parsed packages
+
+        """
+        loop = asyncio.get_event_loop()
+        entries = await loop.run_in_executor(None, RpmFirstStage.scan_primary, primary_xml_path)
+        entries = [entry for entry in entries if self.package_filter(entry.name, entry.arch)]
+        if self.remote.retain_package_versions:
+            entries = RpmFirstStage.newest_entries(entries, self.remote.retain_package_versions)
+        packages_pb.total = len(entries)
+        packages_pb.state = 'running'
+        packages_pb.save()
+        packages_progress = ThrottledProgressBar(packages_pb)
+
+        saved_packages = self.checkpoint.saved_packages() if self.checkpoint else {}
+        saved_pks = [saved_packages[entry.pkgId] for entry in entries
+                     if entry.pkgId in saved_packages]
+        entries = [entry for entry in entries if entry.pkgId not in saved_packages]
+        for i in range(0, len(saved_pks), PKGID_QUERY_BATCH_SIZE):
+            # saved with their artifacts before the sync was interrupted, so they are added as
+            # they are, without being parsed, looked up or downloaded again
+            for package in Package.objects.filter(pk__in=saved_pks[i:i + PKGID_QUERY_BATCH_SIZE]):
+                packages_progress.increment()
+                await self.put(DeclarativeContent(content=package))
+        del saved_packages, saved_pks
+
+        existing_packages = RpmFirstStage.find_existing_packages(
+            [entry.pkgId for entry in entries]
+        )
+        existing_pks = [existing_packages[entry.pkgId] for entry in entries
+                        if entry.pkgId in existing_packages]
+        entries = [entry for entry in entries if entry.pkgId not in existing_packages]
+        for i in range(0, len(existing_pks), PKGID_QUERY_BATCH_SIZE):
+            # the saved rows are passed on themselves, a package is identified by its pkgId here
+            # while the natural key of a row may differ from what primary.xml says now
+            batch = existing_pks[i:i + PKGID_QUERY_BATCH_SIZE]
+            for package in Package.objects.filter(pk__in=batch):
+                packages_progress.increment()
+                await self.put(self.package_to_declarative_content(package))
+        del existing_packages, existing_pks
+
+        rounds = self.download_rounds(entries)
+        del entries
+
+        for pkgids in rounds:
+            packages = iterate_in_executor(RpmFirstStage.parse_packages,
+                                           primary_xml_path,
+                                           filelists_xml_path,
+                                           other_xml_path,
+                                           pkgids)
+            try:
+                async for pkg in packages:
+                    package = Package(**Package.createrepo_to_dict(pkg))
+                    packages_progress.increment()
+                    await self.put(self.package_to_declarative_content(package))
+            finally:
+                await packages.aclose()
+
+    def download_rounds(self, entries):
+        """
+        Split new packages into the rounds they are parsed and downloaded in.
+
+        Packages are parsed in the order of primary.xml, so they are downloaded in that order
+        within a round. Only the download order of the remote decides which packages go into
+        earlier rounds, the packages themselves are not kept in memory to sort them.
+
+        Args:
+            entries(list): :class:`PrimaryEntry` of the new packages, in the order of primary.xml
+
+        Returns:
+            list: sets of the pkgIds of the packages of each round, the first round first
+
+        """
+        if not entries:
+            return []
+        if self.deferred_download or self.remote.download_order == DOWNLOAD_ORDERS.REPODATA:
+            return [{entry.pkgId for entry in entries}]
+
+        keys = sorted((self.download_priority(entry), entry.pkgId) for entry in entries)
+        round_size = -(-len(keys) // DOWNLOAD_ORDER_ROUNDS)
+        return [{pkgId for _priority, pkgId in keys[start:start + round_size]}
+                for start in range(0, len(keys), round_size)]
+
+    @staticmethod
+    def package_key(name, epoch, version, release, arch):
+        """
+        The NEVRA of a package, with the epoch defaulting to '0'.
+        """
+        return name, epoch or '0', version, release, arch
+
+    def download_priority(self, package):
+        """
+        Sort key of a package by the download order of the remote, lower keys are downloaded first.
 
-        # TODO: handle parsing errors/warnings, warningcb callback can be used below
-        cr.xml_parse_primary(primary_xml_path, pkgcb=pkgcb, do_files=False)
-        cr.xml_parse_filelists(filelists_xml_path, newpkgcb=newpkgcb)
-        cr.xml_parse_other(other_xml_path, newpkgcb=newpkgcb)
-        return packages
+        Args:
+            package(PrimaryEntry): a new package
+
+        Returns:
+            a key to sort packages with
+
+        """
+        download_order = self.remote.download_order
+        if download_order == DOWNLOAD_ORDERS.NEWEST_FIRST:
+            return -(package.time_build or 0)
+        elif download_order == DOWNLOAD_ORDERS.SMALLEST_FIRST:
+            return package.size_package or 0
+        elif download_order == DOWNLOAD_ORDERS.ADVISORIES_FIRST:
+            key = RpmFirstStage.package_key(package.name, package.epoch, package.version,
+                                            package.release, package.arch)
+            return key not in self.advisory_packages
+        return 0
 
     async def run(self):
         """
         Build `DeclarativeContent` from the repodata.
+
+        Metadata is parsed in worker threads, so downloads and saves in the later stages keep
+        running while large XML files are being processed.
         """
+        loop = asyncio.get_event_loop()
         packages_pb = ProgressBar(message='Parsed Packages')
         erratum_pb = ProgressBar(message='Parsed Erratum')
 
@@ -225,117 +1240,602 @@ class RpmFirstStage(Stage):
         erratum_pb.save()
 
         with ProgressBar(message='Downloading Metadata Files') as metadata_pb:
-            downloader = self.remote.get_downloader(
-                url=urljoin(self.remote.url, 'repodata/repomd.xml')
-            )
-            # TODO: decide how to distinguish between a mirror list and a normal repo
-            result = await downloader.run()
+            # repomd.xml is downloaded before the pipeline starts
             metadata_pb.increment()
 
-            repomd_path = result.path
-            repomd = cr.Repomd(repomd_path)
-            package_repodata_urls = {}
+            package_repodata_records = {}
             downloaders = []
 
-            for record in repomd.records:
-                if record.type in PACKAGE_REPODATA:
-                    package_repodata_urls[record.type] = urljoin(self.remote.url,
-                                                                 record.location_href)
-                elif record.type in UPDATE_REPODATA:
-                    updateinfo_url = urljoin(self.remote.url, record.location_href)
-                    downloader = self.remote.get_downloader(url=updateinfo_url)
-                    downloaders.append([downloader.run()])
-                else:
+            # zchunk repodata replaces the other version of the same type if it can be parsed
+            use_zchunk = getattr(cr, 'HAS_ZCK', False)
+            zchunk_types = {record.type for record in self.repomd.records
+                            if record.type.endswith(ZCK_SUFFIX)}
+
+            # repodata which is not parsed is only downloaded if it is mirrored
+            mirrored_downloaders = []
+
+            for record in self.repomd.records:
+                repodata_type = record.type
+                if use_zchunk and repodata_type in zchunk_types:
+                    repodata_type = repodata_type[:-len(ZCK_SUFFIX)]
+                elif use_zchunk and repodata_type + ZCK_SUFFIX in zchunk_types:
+                    repodata_type = None
+
+                if repodata_type is None or repodata_type in self.skip_types:
+                    pass
+                elif repodata_type in PACKAGE_REPODATA:
+                    package_repodata_records[repodata_type] = record
+                    continue
+                elif repodata_type in UPDATE_REPODATA:
+                    downloaders.append(('updateinfo', [self.download_repodata(record)]))
+                    continue
+                elif not self.repomd_xml:
                     log.info(_('Unknown repodata type: {t}. Skipped.').format(t=record.type))
-                    # TODO: skip databases, save unknown types to publish them as-is
 
-            # to preserve order, downloaders are created after all repodata urls are identified
-            package_repodata_downloaders = []
-            for repodata_type in PACKAGE_REPODATA:
-                downloader = self.remote.get_downloader(url=package_repodata_urls[repodata_type])
-                package_repodata_downloaders.append(downloader.run())
+                if self.repomd_xml:
+                    mirrored_downloaders.append(self.download_repodata(record))
 
-            downloaders.append(package_repodata_downloaders)
+            if mirrored_downloaders:
+                downloaders.append(('mirrored', mirrored_downloaders))
+
+            # to preserve order, downloaders are created after all repodata records are identified
+            if package_repodata_records:
+                package_repodata_downloaders = [
+                    self.download_repodata(package_repodata_records[repodata_type])
+                    for repodata_type in PACKAGE_REPODATA
+                ]
+                downloaders.append(('packages', package_repodata_downloaders))
 
             # asyncio.gather is used to preserve the order of results for package repodata
-            pending = [asyncio.gather(*downloaders_group) for downloaders_group in downloaders]
+            pending = {
+                asyncio.ensure_future(asyncio.gather(*downloaders_group)): repodata_kind
+                for repodata_kind, downloaders_group in downloaders
+            }
 
+            postponed_packages = None
             while pending:
-                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                done, _still_pending = await asyncio.wait(list(pending),
+                                                          return_when=asyncio.FIRST_COMPLETED)
                 for downloader in done:
+                    repodata_kind = pending.pop(downloader)
                     results = downloader.result()
-                    if results[0].url == package_repodata_urls['primary']:
-                        primary_xml_path = results[0].path
-                        filelists_xml_path = results[1].path
-                        other_xml_path = results[2].path
+                    if repodata_kind == 'packages':
+                        primary_xml_path, filelists_xml_path, other_xml_path = results
                         metadata_pb.done += 3
                         metadata_pb.save()
 
-                        packages = await RpmFirstStage.parse_repodata(primary_xml_path,
-                                                                      filelists_xml_path,
-                                                                      other_xml_path)
-                        packages_pb.total = len(packages)
-                        packages_pb.state = 'running'
-                        packages_pb.save()
-
-                        for pkg in packages.values():
-                            package = Package(**Package.createrepo_to_dict(pkg))
-                            artifact = Artifact(size=package.size_package)
-                            checksum_type = getattr(CHECKSUM_TYPES, package.checksum_type.upper())
-                            setattr(artifact, checksum_type, package.pkgId)
-                            url = urljoin(self.remote.url, package.location_href)
-                            filename = os.path.basename(package.location_href)
-                            da = DeclarativeArtifact(
-                                artifact=artifact,
-                                url=url,
-                                relative_path=filename,
-                                remote=self.remote,
-                                deferred_download=self.deferred_download
-                            )
-                            dc = DeclarativeContent(content=package, d_artifacts=[da])
-                            packages_pb.increment()
-                            await self.put(dc)
+                        # packages referenced by advisories are only known from updateinfo
+                        advisories_first = (
+                            self.remote.download_order == DOWNLOAD_ORDERS.ADVISORIES_FIRST
+                        )
+                        if advisories_first and 'updateinfo' in pending.values():
+                            postponed_packages = results
+                            continue
+
+                        await self.process_packages(primary_xml_path, filelists_xml_path,
+                                                    other_xml_path, packages_pb)
+
+                    elif repodata_kind == 'mirrored':
+                        metadata_pb.done += len(results)
+                        metadata_pb.save()
 
-                    elif results[0].url == updateinfo_url:
-                        updateinfo_xml_path = results[0].path
+                    elif repodata_kind == 'updateinfo':
+                        updateinfo_xml_path = results[0]
                         metadata_pb.increment()
 
-                        updates = await RpmFirstStage.parse_updateinfo(updateinfo_xml_path)
+                        updates = await loop.run_in_executor(
+                            None, RpmFirstStage.parse_updateinfo, updateinfo_xml_path
+                        )
 
                         erratum_pb.total = len(updates)
                         erratum_pb.state = 'running'
                         erratum_pb.save()
+                        erratum_progress = ThrottledProgressBar(erratum_pb)
 
                         for update in updates:
-                            update_record = UpdateRecord(**UpdateRecord.createrepo_to_dict(update))
-                            update_record.digest = RpmFirstStage.hash_update_record(update)
+                            update_record_dict = UpdateRecord.createrepo_to_dict(update)
+                            update_record = UpdateRecord(**update_record_dict)
                             future_relations = {'collections': defaultdict(list), 'references': []}
+                            collection_dicts = []
+                            reference_dicts = []
 
                             for collection in update.collections:
                                 coll_dict = UpdateCollection.createrepo_to_dict(collection)
                                 coll = UpdateCollection(**coll_dict)
+                                pkg_dicts = []
 
                                 for package in collection.packages:
                                     pkg_dict = UpdateCollectionPackage.createrepo_to_dict(package)
                                     pkg = UpdateCollectionPackage(**pkg_dict)
+                                    self.advisory_packages.add(RpmFirstStage.package_key(
+                                        pkg.name, pkg.epoch, pkg.version, pkg.release, pkg.arch
+                                    ))
                                     future_relations['collections'][coll].append(pkg)
+                                    pkg_dicts.append(pkg_dict)
+
+                                collection_dicts.append((coll_dict, pkg_dicts))
 
                             for reference in update.references:
                                 reference_dict = UpdateReference.createrepo_to_dict(reference)
                                 ref = UpdateReference(**reference_dict)
                                 future_relations['references'].append(ref)
+                                reference_dicts.append(reference_dict)
+
+                            update_record.digest = update_record_digest(
+                                update_record_dict, collection_dicts, reference_dicts
+                            )
 
-                            erratum_pb.increment()
+                            erratum_progress.increment()
                             dc = DeclarativeContent(content=update_record)
                             dc.extra_data = future_relations
                             await self.put(dc)
 
-        packages_pb.state = 'completed'
-        erratum_pb.state = 'completed'
+            if postponed_packages:
+                await self.process_packages(*postponed_packages, packages_pb)
+
+            if self.repomd_xml:
+                await self.put_repodata_files()
+
+        packages_pb.state = 'skipped' if 'primary' in self.skip_types else 'completed'
+        erratum_pb.state = 'skipped' if 'updateinfo' in self.skip_types else 'completed'
         packages_pb.save()
         erratum_pb.save()
 
 
+def download_key(artifact):
+    """
+    The key of an artifact in the claims of downloads.
+
+    Args:
+        artifact (Artifact): an artifact with at least one digest
+
+    Returns:
+        str: '<algorithm>:<hex digest>' of the strongest digest of the artifact, None if it has no
+            digest
+
+    """
+    for digest_type in DOWNLOAD_DIGEST_TYPES:
+        digest = getattr(artifact, digest_type)
+        if digest:
+            return '{}:{}'.format(digest_type, digest)
+    return None
+
+
+class DownloadClaims:
+    """
+    Claims of a sync on downloads of artifacts, shared by syncs through the database.
+
+    The sync keeps its claims alive with a heartbeat, which updates their ``_last_updated``.
+    Claims of a sync which stopped without releasing them, e.g. because its worker crashed, are
+    abandoned once their heartbeat is older than the timeout.
+
+    The claims are used from several executor threads at once, the keys of the claims of the sync
+    are only accessed with a lock held.
+
+    Attributes:
+        owner (str): a unique identifier of the sync
+
+    """
+
+    def __init__(self):
+        """
+        Start without any claims.
+        """
+        self.owner = str(uuid.uuid4())
+        self._owned = set()
+        self._lock = threading.Lock()
+
+    def owned(self, keys):
+        """
+        Find the downloads which are claimed by this sync.
+
+        Args:
+            keys (iterable): keys of downloads, see :func:`download_key`
+
+        Returns:
+            set: the keys of the downloads which are claimed by this sync
+
+        """
+        with self._lock:
+            return self._owned.intersection(keys)
+
+    def claim(self, keys):
+        """
+        Claim the downloads which are not claimed by anybody.
+
+        Abandoned claims are taken over.
+
+        Args:
+            keys (iterable): keys of the downloads to claim
+
+        Returns:
+            set: keys of the downloads which are newly claimed by this sync
+
+        """
+        with self._lock:
+            keys = set(keys) - self._owned
+        if not keys:
+            return set()
+
+        stale = timezone.now() - timedelta(seconds=IN_FLIGHT_DOWNLOAD_TIMEOUT)
+        InFlightDownload.objects.filter(digest__in=keys, _last_updated__lt=stale).delete()
+        InFlightDownload.objects.bulk_create(
+            [InFlightDownload(digest=key, owner=self.owner) for key in keys],
+            ignore_conflicts=True
+        )
+        claimed = set(InFlightDownload.objects.filter(
+            digest__in=keys, owner=self.owner
+        ).values_list('digest', flat=True))
+        with self._lock:
+            self._owned |= claimed
+        return claimed
+
+    def release(self, keys):
+        """
+        Release the claims on finished downloads.
+
+        Args:
+            keys (iterable): keys of the downloads
+
+        """
+        with self._lock:
+            keys = self._owned.intersection(keys)
+            self._owned -= keys
+        if keys:
+            InFlightDownload.objects.filter(digest__in=keys, owner=self.owner).delete()
+
+    def released(self, keys):
+        """
+        Whether any claim of another sync on the downloads has been released.
+
+        Abandoned claims count as released, they can be taken over.
+
+        Args:
+            keys (set): keys of downloads which were claimed by other syncs
+
+        Returns:
+            bool: True if any of the downloads is not claimed by another sync anymore
+
+        """
+        stale = timezone.now() - timedelta(seconds=IN_FLIGHT_DOWNLOAD_TIMEOUT)
+        claimed = InFlightDownload.objects.filter(
+            digest__in=keys, _last_updated__gte=stale
+        ).exclude(owner=self.owner)
+        return claimed.count() < len(keys)
+
+    def heartbeat(self):
+        """
+        Mark the claims of the sync as alive.
+        """
+        with self._lock:
+            if not self._owned:
+                return
+        InFlightDownload.objects.filter(owner=self.owner).update(_last_updated=timezone.now())
+
+    async def keep_alive(self):
+        """
+        Send a heartbeat for the claims of the sync at every poll interval, until cancelled.
+        """
+        while True:
+            await asyncio.sleep(IN_FLIGHT_DOWNLOAD_POLL_INTERVAL)
+            await run_in_db_executor(self.heartbeat)
+
+    def release_all(self):
+        """
+        Release all claims of the sync.
+        """
+        with self._lock:
+            self._owned.clear()
+        InFlightDownload.objects.filter(owner=self.owner).delete()
+
+
+class RpmDownloadClaimer(Stage):
+    """
+    Claim the downloads of new artifacts, so concurrent syncs do not download them again.
+
+    Content with an artifact whose download is claimed by another sync is held back. Once the
+    claim is released and the artifact is saved, the content continues with the saved artifact.
+    If the other sync does not save it, the download is claimed again.
+    """
+
+    def __init__(self, download_claims):
+        """
+        Initialize the stage.
+
+        Args:
+            download_claims (DownloadClaims): the claims of the sync
+
+        """
+        super().__init__()
+        self.download_claims = download_claims
+        self.waiting = []
+
+    @staticmethod
+    def downloads(declarative_content):
+        """
+        The artifacts of content which are to be downloaded, by their download keys.
+
+        Artifacts without any digest cannot be claimed and are not included.
+        """
+        downloads = {}
+        for d_artifact in declarative_content.d_artifacts:
+            if d_artifact.artifact._state.adding and not d_artifact.deferred_download:
+                key = download_key(d_artifact.artifact)
+                if key:
+                    downloads[key] = d_artifact
+        return downloads
+
+    @staticmethod
+    def find_artifacts(keys):
+        """
+        Find saved artifacts by their download keys.
+
+        Args:
+            keys (iterable): download keys of artifacts
+
+        Returns:
+            dict: saved artifacts by their download keys
+
+        """
+        digests_by_type = defaultdict(list)
+        for key in keys:
+            digest_type, digest = key.split(':', 1)
+            digests_by_type[digest_type].append(digest)
+
+        artifacts = {}
+        for digest_type, digests in digests_by_type.items():
+            filters = {'{}__in'.format(digest_type): digests}
+            for artifact in Artifact.objects.filter(**filters):
+                artifacts[download_key(artifact)] = artifact
+        return artifacts
+
+    def resolve(self, waiting):
+        """
+        Find out which of the held back content can continue.
+
+        Args:
+            waiting (list): held back :class:`~pulpcore.plugin.stages.DeclarativeContent`
+
+        Returns:
+            tuple: content which can continue, content which is still held back
+
+        """
+        keys = {key for dc in waiting for key in self.downloads(dc)}
+        owned = self.download_claims.owned(keys)
+        artifacts = self.find_artifacts(keys - owned)
+        owned |= self.download_claims.claim(keys - owned - set(artifacts))
+
+        ready, still_waiting = [], []
+        for declarative_content in waiting:
+            downloads = self.downloads(declarative_content)
+            for key, d_artifact in downloads.items():
+                if key in artifacts:
+                    d_artifact.artifact = artifacts[key]
+            if all(key in artifacts or key in owned for key in downloads):
+                ready.append(declarative_content)
+            else:
+                still_waiting.append(declarative_content)
+        return ready, still_waiting
+
+    async def release_waiting(self, stream_ended):
+        """
+        Pass on held back content once claims of other syncs on its downloads are released.
+
+        Claims are checked while new content is still arriving, and after that until no content
+        is held back anymore. The database is queried in the default executor, so the event loop
+        keeps running meanwhile.
+
+        Args:
+            stream_ended (asyncio.Event): set when all content has arrived at the stage
+
+        """
+        while self.waiting or not stream_ended.is_set():
+            if stream_ended.is_set():
+                await asyncio.sleep(IN_FLIGHT_DOWNLOAD_POLL_INTERVAL)
+            else:
+                try:
+                    await asyncio.wait_for(stream_ended.wait(), IN_FLIGHT_DOWNLOAD_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            if not self.waiting:
+                continue
+            keys = {key for dc in self.waiting for key in self.downloads(dc)}
+            keys -= self.download_claims.owned(keys)
+            if not keys or await run_in_db_executor(self.download_claims.released, keys):
+                ready, self.waiting = await run_in_db_executor(self.resolve, self.waiting)
+                for declarative_content in ready:
+                    await self.put(declarative_content)
+
+    async def run(self):
+        """
+        Pass content through, holding back content with downloads claimed by other syncs.
+        """
+        stream_ended = asyncio.Event()
+        releaser = asyncio.ensure_future(self.release_waiting(stream_ended))
+        try:
+            async for batch in self.batches():
+                keys = {key for dc in batch for key in self.downloads(dc)}
+                owned = self.download_claims.owned(keys)
+                owned |= await run_in_db_executor(self.download_claims.claim, keys - owned)
+                for declarative_content in batch:
+                    if owned.issuperset(self.downloads(declarative_content)):
+                        await self.put(declarative_content)
+                    else:
+                        self.waiting.append(declarative_content)
+            stream_ended.set()
+            await releaser
+        finally:
+            releaser.cancel()
+
+
+class RpmDownloadReleaser(Stage):
+    """
+    Release the claims on downloads of artifacts which are saved.
+    """
+
+    def __init__(self, download_claims):
+        """
+        Initialize the stage.
+
+        Args:
+            download_claims (DownloadClaims): the claims of the sync
+
+        """
+        super().__init__()
+        self.download_claims = download_claims
+
+    async def run(self):
+        """
+        Pass content through and release the claims on its artifacts.
+
+        Content only passes this stage once its downloads are done, so the stage keeps the claims
+        of the sync alive until then.
+        """
+        keep_alive = asyncio.ensure_future(self.download_claims.keep_alive())
+        try:
+            async for batch in self.batches():
+                keys = [download_key(d_artifact.artifact)
+                        for declarative_content in batch
+                        for d_artifact in declarative_content.d_artifacts]
+                await run_in_db_executor(self.download_claims.release, keys)
+                for declarative_content in batch:
+                    await self.put(declarative_content)
+        finally:
+            keep_alive.cancel()
+
+
+class RpmCheckpointRecorder(Stage):
+    """
+    Record saved packages in the checkpoint of the sync.
+
+    The stage follows the stages which save content and its artifacts, so an interrupted sync can
+    rely on every recorded package being complete.
+    """
+
+    def __init__(self, checkpoint):
+        """
+        Initialize the stage.
+
+        Args:
+            checkpoint (RpmSyncCheckpoint): the checkpoint of the sync
+
+        """
+        super().__init__()
+        self.checkpoint = checkpoint
+
+    async def run(self):
+        """
+        Pass content through and record the packages of each batch.
+        """
+        async for batch in self.batches():
+            self.checkpoint.add_packages([
+                declarative_content.content for declarative_content in batch
+                if isinstance(declarative_content.content, Package)
+            ])
+            for declarative_content in batch:
+                await self.put(declarative_content)
+
+
+class RpmRemoveDuplicates(Stage):
+    """
+    Remove packages from the new version which have the same NEVRA as a synced package.
+
+    The NEVRAs of the packages of the new version are loaded into memory once, so duplicates are
+    found by lookups instead of queries, and they are removed with a single query at the end. The
+    packages are loaded in the default executor, so the pipeline keeps running meanwhile.
+    """
+
+    def __init__(self, new_version):
+        """
+        Initialize the stage.
+
+        Args:
+            new_version (:class:`~pulpcore.plugin.models.RepositoryVersion`): The
+                new repository version that is going to be built.
+
+        """
+        super().__init__()
+        self.new_version = new_version
+
+    def nevra_index(self):
+        """
+        Index the packages of the new version by NEVRA.
+
+        Returns:
+            dict: pks of the packages by :meth:`RpmFirstStage.package_key`
+
+        """
+        index = defaultdict(list)
+        packages = Package.objects.filter(pk__in=self.new_version.content).values_list(
+            'pk', 'name', 'epoch', 'version', 'release', 'arch'
+        )
+        for pk, *nevra in packages.iterator():
+            index[RpmFirstStage.package_key(*nevra)].append(pk)
+        return index
+
+    async def run(self):
+        """
+        Pass content through and remove the duplicates of synced packages at the end.
+        """
+        index = await run_in_db_executor(self.nevra_index)
+        synced_pks = set()
+        duplicate_pks = set()
+        async for declarative_content in self.items():
+            package = declarative_content.content
+            if isinstance(package, Package):
+                synced_pks.add(package.pk)
+                duplicate_pks.update(index.get(RpmFirstStage.package_key(
+                    package.name, package.epoch, package.version, package.release, package.arch
+                ), ()))
+            await self.put(declarative_content)
+
+        # a synced package is never a duplicate, even if another one has the same NEVRA
+        duplicate_pks -= synced_pks
+        if duplicate_pks:
+            self.new_version.remove_content(Package.objects.filter(pk__in=duplicate_pks))
+
+
+class RpmContentUnassociation(Stage):
+    """
+    Remove content of the given models which is not in the stream from the new version.
+
+    Content of any other model is left untouched, so it is carried forward from the previous
+    repository version.
+    """
+
+    def __init__(self, new_version, models):
+        """
+        Initialize the stage.
+
+        Args:
+            new_version (:class:`~pulpcore.plugin.models.RepositoryVersion`): The
+                new repository version that is going to be built.
+            models (list): Content models whose content is synced in full.
+
+        """
+        super().__init__()
+        self.new_version = new_version
+        self.models = models
+
+    async def run(self):
+        """
+        Pass content through and remove stale content of the synced models at the end.
+        """
+        synced_pks = set()
+        async for declarative_content in self.items():
+            if isinstance(declarative_content.content, tuple(self.models)):
+                synced_pks.add(declarative_content.content.pk)
+            await self.put(declarative_content)
+
+        for model in self.models:
+            version_pks = model.objects.filter(
+                pk__in=self.new_version.content
+            ).values_list('pk', flat=True)
+            stale_pks = set(version_pks) - synced_pks
+            if stale_pks:
+                self.new_version.remove_content(model.objects.filter(pk__in=stale_pks))
+
+
 class RpmContentSaver(ContentSaver):
     """
     A modification of ContentSaver stage that additionally saves RPM plugin specific items.
@@ -357,6 +1857,22 @@ class RpmContentSaver(ContentSaver):
         update_references_to_save = []
         update_collection_packages_to_save = []
 
+        update_records = [
+            declarative_content.content for declarative_content in batch
+            if isinstance(getattr(declarative_content, 'content', None), UpdateRecord)
+        ]
+        if not update_records:
+            return
+
+        # existing content which was retrieved from the db at earlier stages already has relations
+        update_records_with_relations = set(
+            UpdateRecord.objects.filter(
+                pk__in=[update_record.pk for update_record in update_records]
+            ).filter(
+                Q(collections__isnull=False) | Q(references__isnull=False)
+            ).values_list('pk', flat=True).distinct()
+        )
+
         for declarative_content in batch:
             if declarative_content is None:
                 continue
@@ -364,9 +1880,7 @@ class RpmContentSaver(ContentSaver):
                 continue
             update_record = declarative_content.content
 
-            relations_exist = update_record.collections.count() or update_record.references.count()
-            if relations_exist:
-                # existing content which was retrieved from the db at earlier stages
+            if update_record.pk in update_records_with_relations:
                 continue
 
             future_relations = declarative_content.extra_data
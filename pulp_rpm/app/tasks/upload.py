@@ -7,7 +7,7 @@ from pulpcore.plugin.models import (
 )
 
 from pulp_rpm.app.shared_utils import _prepare_package
-from pulp_rpm.app.models import Package
+from pulp_rpm.app.models import Package, RepoMetadataFile
 
 
 def one_shot_upload(artifact_pk, filename, repository_pk=None):
@@ -48,3 +48,7 @@ def one_shot_upload(artifact_pk, filename, repository_pk=None):
         # create new repo version with uploaded package
         with RepositoryVersion.create(repository) as new_version:
             new_version.add_content(content_to_add)
+            # mirrored repodata does not list the uploaded package
+            new_version.remove_content(
+                RepoMetadataFile.objects.filter(pk__in=new_version.content)
+            )
@@ -3,21 +3,19 @@ from gettext import gettext as _
 from django.db import transaction
 from django.db.utils import IntegrityError
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import serializers, status, viewsets
+from rest_framework import mixins, serializers, status, viewsets
 from rest_framework.decorators import detail_route
 from rest_framework.response import Response
 from rest_framework.parsers import FormParser, MultiPartParser
 
 from pulpcore.plugin.models import Artifact
 from pulpcore.plugin.tasking import enqueue_with_reservation
-from pulpcore.plugin.serializers import (
-    AsyncOperationResponseSerializer,
-    RepositorySyncURLSerializer
-)
+from pulpcore.plugin.serializers import AsyncOperationResponseSerializer
 from pulpcore.plugin.viewsets import (
     BaseDistributionViewSet,
     ContentFilter,
     ContentViewSet,
+    NamedModelViewSet,
     RemoteViewSet,
     OperationPostponedResponse,
     PublicationViewSet
@@ -25,16 +23,27 @@ from pulpcore.plugin.viewsets import (
 
 from pulp_rpm.app import tasks
 from pulp_rpm.app.shared_utils import _prepare_package
-from pulp_rpm.app.models import Package, RpmDistribution, RpmRemote, RpmPublication, UpdateRecord
+from pulp_rpm.app.models import (
+    Package,
+    RepoMetadataFile,
+    RpmDistribution,
+    RpmRemote,
+    RpmPublication,
+    RpmSyncEstimate,
+    UpdateRecord,
+)
 from pulp_rpm.app.serializers import (
     CopySerializer,
     MinimalPackageSerializer,
     MinimalUpdateRecordSerializer,
     OneShotUploadSerializer,
     PackageSerializer,
+    RepoMetadataFileSerializer,
     RpmDistributionSerializer,
     RpmRemoteSerializer,
     RpmPublicationSerializer,
+    RpmRepositorySyncURLSerializer,
+    RpmSyncEstimateSerializer,
     UpdateRecordSerializer,
 )
 
@@ -119,30 +128,51 @@ class RpmRemoteViewSet(RemoteViewSet):
         operation_summary="Sync from remote",
         responses={202: AsyncOperationResponseSerializer}
     )
-    @detail_route(methods=('post',), serializer_class=RepositorySyncURLSerializer)
+    @detail_route(methods=('post',), serializer_class=RpmRepositorySyncURLSerializer)
     def sync(self, request, pk):
         """
         Dispatches a sync task.
         """
         remote = self.get_object()
-        serializer = RepositorySyncURLSerializer(
+        serializer = RpmRepositorySyncURLSerializer(
             data=request.data,
             context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
         repository = serializer.validated_data.get('repository')
+        optimize = serializer.validated_data.get('optimize')
+        mirror_metadata = serializer.validated_data.get('mirror_metadata')
+        dry_run = serializer.validated_data.get('dry_run')
 
         result = enqueue_with_reservation(
             tasks.synchronize,
             [repository, remote],
             kwargs={
                 'remote_pk': remote.pk,
-                'repository_pk': repository.pk
+                'repository_pk': repository.pk,
+                'optimize': optimize,
+                'mirror_metadata': mirror_metadata,
+                'dry_run': dry_run
             }
         )
         return OperationPostponedResponse(result, request)
 
 
+class RpmSyncEstimateViewSet(NamedModelViewSet,
+                             mixins.RetrieveModelMixin,
+                             mixins.ListModelMixin,
+                             mixins.DestroyModelMixin):
+    """
+    A ViewSet for the estimates of dry runs of syncs.
+
+    The task of a dry run lists its estimate in its created resources.
+    """
+
+    endpoint_name = 'rpm/sync_estimates'
+    queryset = RpmSyncEstimate.objects.all()
+    serializer_class = RpmSyncEstimateSerializer
+
+
 class UpdateRecordFilter(ContentFilter):
     """
     FilterSet for UpdateRecord.
@@ -176,6 +206,36 @@ class UpdateRecordViewSet(ContentViewSet):
     filterset_class = UpdateRecordFilter
 
 
+class RepoMetadataFileFilter(ContentFilter):
+    """
+    FilterSet for RepoMetadataFile.
+    """
+
+    class Meta:
+        model = RepoMetadataFile
+        fields = {
+            'data_type': ['exact', 'in'],
+        }
+
+
+class RepoMetadataFileViewSet(ContentViewSet):
+    """
+    A ViewSet for the repodata files of mirrored repositories.
+
+    The files are read-only, they are only created by syncs. A publication serves them verbatim.
+
+    Define endpoint name which will appear in the API endpoint for this content type.
+    For example::
+        http://pulp.example.com/pulp/api/v3/content/rpm/repo_metadata_files/
+    """
+
+    endpoint_name = 'repo_metadata_files'
+    queryset = RepoMetadataFile.objects.all()
+    serializer_class = RepoMetadataFileSerializer
+    filterset_class = RepoMetadataFileFilter
+    http_method_names = ['get', 'head', 'options']
+
+
 class OneShotUploadViewSet(viewsets.ViewSet):
     """
     ViewSet for One Shot RPM Upload.
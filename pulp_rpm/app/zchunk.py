@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import os
+
+from collections import namedtuple
+from gettext import gettext as _
+
+from pulpcore.plugin.download import DownloadResult
+
+from pulp_rpm.app.downloaders import RangeNotSupported, RpmHttpDownloader
+from pulp_rpm.app.mirrors import MIRROR_ERRORS
+
+log = logging.getLogger(__name__)
+
+# suffix of the repodata types of zchunk files, e.g. primary_zck
+ZCK_SUFFIX = '_zck'
+
+# magic bytes at the beginning of a zchunk file
+ZCK_MAGIC = b'\0ZCK1'
+
+# sizes of the checksums of a zchunk file by their type id
+ZCK_CHECKSUM_SIZES = {
+    0: 20,  # sha1
+    1: 32,  # sha256
+    2: 64,  # sha512
+    3: 16,  # sha512 truncated to 128 bits
+}
+
+# flags in the preface of a zchunk file
+ZCK_FLAG_STREAMS = 0x1
+ZCK_FLAG_OPTIONAL_ELEMENTS = 0x2
+ZCK_FLAG_UNCOMPRESSED_CHECKSUMS = 0x4
+
+# how many bytes are read from the beginning of a zchunk file to find the size of its header
+ZCK_LEAD_MAX_SIZE = 128
+
+# missing chunks which are at most this many bytes apart are fetched with one Range request
+ZCK_RANGE_MERGE_GAP = 64 * 1024
+
+# how many bytes are copied from a file at once
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# a chunk of a zchunk file, with its offset from the beginning of the file
+ZchunkChunk = namedtuple('ZchunkChunk', ['checksum', 'offset', 'length'])
+
+# the header of a zchunk file, size includes the lead
+ZchunkHeader = namedtuple('ZchunkHeader', ['size', 'chunk_checksum_type', 'chunks'])
+
+
+class ZchunkError(Exception):
+    """
+    Raised when a zchunk file cannot be parsed or is not worth a delta download.
+    """
+
+    pass
+
+
+# errors after which a delta download is replaced by a full download
+DELTA_ERRORS = MIRROR_ERRORS + (ZchunkError, RangeNotSupported)
+
+
+def _read_int(data, pos):
+    """
+    Read a compressed integer of a zchunk header.
+
+    Compressed integers are stored little-endian in 7 bits per byte, the last byte has its
+    highest bit set.
+
+    Args:
+        data (bytes): the header
+        pos (int): the offset of the integer in the header
+
+    Returns:
+        tuple: the integer and the offset right after it
+
+    Raises:
+        ZchunkError: if the header ends within the integer
+
+    """
+    value = shift = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            return value, pos
+        shift += 7
+    raise ZchunkError(_('The zchunk header is truncated'))
+
+
+def _checksum_size(checksum_type):
+    try:
+        return ZCK_CHECKSUM_SIZES[checksum_type]
+    except KeyError:
+        raise ZchunkError(_('Unknown zchunk checksum type: {t}').format(t=checksum_type))
+
+
+def header_size(data):
+    """
+    Find the size of the header of a zchunk file from its lead.
+
+    Args:
+        data (bytes): the beginning of the file, at least its lead
+
+    Returns:
+        int: the size of the lead and the header in bytes
+
+    Raises:
+        ZchunkError: if the data is not the beginning of a zchunk file
+
+    """
+    if not data.startswith(ZCK_MAGIC):
+        raise ZchunkError(_('Not a zchunk file'))
+    checksum_type, pos = _read_int(data, len(ZCK_MAGIC))
+    size, pos = _read_int(data, pos)
+    return pos + _checksum_size(checksum_type) + size
+
+
+def parse_header(data):
+    """
+    Parse the chunks out of the header of a zchunk file.
+
+    Args:
+        data (bytes): the beginning of the file, at least its lead and header
+
+    Returns:
+        ZchunkHeader: the header, the first chunk is the dictionary
+
+    Raises:
+        ZchunkError: if the data is not the beginning of a zchunk file or it is truncated
+
+    """
+    size = header_size(data)
+    if len(data) < size:
+        raise ZchunkError(_('The zchunk header is truncated'))
+
+    # lead, which header_size() has checked already
+    checksum_type, pos = _read_int(data, len(ZCK_MAGIC))
+    _size, pos = _read_int(data, pos)
+    pos += _checksum_size(checksum_type)
+
+    # preface
+    pos += _checksum_size(checksum_type)
+    flags, pos = _read_int(data, pos)
+    _compression_type, pos = _read_int(data, pos)
+    if flags & ZCK_FLAG_OPTIONAL_ELEMENTS:
+        count, pos = _read_int(data, pos)
+        for _i in range(count):
+            _element_id, pos = _read_int(data, pos)
+            element_size, pos = _read_int(data, pos)
+            pos += element_size
+
+    # index
+    _index_size, pos = _read_int(data, pos)
+    chunk_checksum_type, pos = _read_int(data, pos)
+    chunk_checksum_size = _checksum_size(chunk_checksum_type)
+    count, pos = _read_int(data, pos)
+    chunks = []
+    offset = size
+    for _i in range(count):
+        if flags & ZCK_FLAG_STREAMS:
+            _stream, pos = _read_int(data, pos)
+        checksum = data[pos:pos + chunk_checksum_size]
+        pos += chunk_checksum_size
+        length, pos = _read_int(data, pos)
+        _uncompressed_length, pos = _read_int(data, pos)
+        if flags & ZCK_FLAG_UNCOMPRESSED_CHECKSUMS:
+            pos += chunk_checksum_size
+        if pos > size:
+            raise ZchunkError(_('The zchunk index is larger than the header'))
+        chunks.append(ZchunkChunk(checksum=checksum, offset=offset, length=length))
+        offset += length
+    return ZchunkHeader(size=size, chunk_checksum_type=chunk_checksum_type, chunks=chunks)
+
+
+def read_header(path):
+    """
+    Parse the header of a zchunk file on disk.
+
+    Args:
+        path (str): a path to the file
+
+    Returns:
+        ZchunkHeader: the header of the file
+
+    """
+    with open(path, 'rb') as zck_file:
+        data = zck_file.read(ZCK_LEAD_MAX_SIZE)
+        data += zck_file.read(max(header_size(data) - len(data), 0))
+    return parse_header(data)
+
+
+def plan_delta(old_header, new_header):
+    """
+    Decide which chunks of a new version of a zchunk file have to be downloaded.
+
+    Chunks which are in the old version are copied from it, unless they lie between missing
+    chunks which are close enough to be fetched together.
+
+    Args:
+        old_header (ZchunkHeader): the header of the old version
+        new_header (ZchunkHeader): the header of the new version
+
+    Returns:
+        tuple: a dict of the offsets of the chunks in the old version by their checksum, and a list
+            of (start, end) byte ranges of the new version to download, end inclusive
+
+    Raises:
+        ZchunkError: if the versions have no chunks in common
+
+    """
+    if old_header.chunk_checksum_type != new_header.chunk_checksum_type:
+        raise ZchunkError(_('The zchunk files have different chunk checksum types'))
+    old_chunks = {chunk.checksum: chunk.offset for chunk in old_header.chunks if chunk.length}
+
+    ranges = []
+    reused = 0
+    for chunk in new_header.chunks:
+        if not chunk.length:
+            continue
+        if chunk.checksum in old_chunks:
+            reused += 1
+            continue
+        end = chunk.offset + chunk.length - 1
+        if ranges and chunk.offset - ranges[-1][1] - 1 <= ZCK_RANGE_MERGE_GAP:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((chunk.offset, end))
+    if not reused:
+        raise ZchunkError(_('The zchunk files have no chunks in common'))
+    return old_chunks, ranges
+
+
+def _read(source, length):
+    """
+    Read a part of a file in pieces.
+
+    Raises:
+        ZchunkError: if the file ends before the part
+
+    """
+    while length:
+        data = source.read(min(length, COPY_CHUNK_SIZE))
+        if not data:
+            raise ZchunkError(_('A zchunk file is shorter than its header'))
+        yield data
+        length -= len(data)
+
+
+def assemble(header_path, old_path, old_chunks, new_header, ranges, range_paths):
+    """
+    Join the chunks of a new version of a zchunk file.
+
+    Args:
+        header_path (str): a path to the downloaded header of the new version
+        old_path (str): a path to the old version
+        old_chunks (dict): the offsets of the chunks in the old version by their checksum
+        new_header (ZchunkHeader): the header of the new version
+        ranges (list): the (start, end) byte ranges of the new version which were downloaded
+        range_paths (list): paths to the downloaded ranges, in the same order
+
+    Yields:
+        bytes: the next part of the new version
+
+    """
+    downloaded = list(zip(ranges, range_paths))
+    with open(old_path, 'rb') as old_file:
+        with open(header_path, 'rb') as header_file:
+            yield from _read(header_file, new_header.size)
+        for chunk in new_header.chunks:
+            if not chunk.length:
+                continue
+            while downloaded and downloaded[0][0][1] < chunk.offset:
+                downloaded.pop(0)
+            if downloaded and downloaded[0][0][0] <= chunk.offset:
+                (start, _end), range_path = downloaded[0]
+                with open(range_path, 'rb') as range_file:
+                    range_file.seek(chunk.offset - start)
+                    yield from _read(range_file, chunk.length)
+            else:
+                old_file.seek(old_chunks[chunk.checksum])
+                yield from _read(old_file, chunk.length)
+
+
+async def download_delta(downloader, size_header, old_path):
+    """
+    Download a new version of a zchunk file, taking the chunks it shares with an old version.
+
+    The header of the new version is fetched first, then only the chunks which are missing from
+    the old version are fetched with Range requests. The joined file is validated against the
+    expected digests and size of the downloader like a full download.
+
+    Args:
+        downloader (RpmHttpDownloader): a downloader of the new version
+        size_header (int): the size of the lead and the header of the new version, as in
+            repomd.xml
+        old_path (str): a path to the old version
+
+    Returns:
+        DownloadResult: the result of the download
+
+    Raises:
+        ZchunkError: if a delta download is not possible or not worth it
+        RangeNotSupported: if the server does not support ranges
+
+    """
+    if not isinstance(downloader, RpmHttpDownloader):
+        raise ZchunkError(_('Only HTTP downloads of zchunk files can be deltas'))
+    loop = asyncio.get_event_loop()
+    old_header = await loop.run_in_executor(None, read_header, old_path)
+
+    range_paths = []
+    try:
+        header_path = await downloader.download_range(0, size_header - 1)
+        range_paths.append(header_path)
+        with open(header_path, 'rb') as header_file:
+            new_header = parse_header(header_file.read())
+        old_chunks, ranges = plan_delta(old_header, new_header)
+        log.debug(_('Downloading {n} of {total} bytes of {url}').format(
+            n=sum(end - start + 1 for start, end in ranges),
+            total=sum(chunk.length for chunk in new_header.chunks), url=downloader.url))
+
+        downloads = [asyncio.ensure_future(downloader.download_range(start, end))
+                     for start, end in ranges]
+        try:
+            range_paths.extend(await asyncio.gather(*downloads))
+        except BaseException:
+            for download in downloads:
+                download.cancel()
+            results = await asyncio.gather(*downloads, return_exceptions=True)
+            range_paths.extend(result for result in results if isinstance(result, str))
+            raise
+
+        for data in assemble(header_path, old_path, old_chunks, new_header, ranges,
+                             range_paths[1:]):
+            await downloader.handle_data(data)
+        await downloader.finalize()
+        return DownloadResult(path=downloader.path, url=downloader.url,
+                              artifact_attributes=downloader.artifact_attributes, headers=None)
+    finally:
+        for range_path in range_paths:
+            if os.path.exists(range_path):
+                os.remove(range_path)
@@ -1,12 +1,14 @@
 # coding=utf-8
 """Tests that publish rpm plugin repositories."""
+import hashlib
 import unittest
 from random import choice
+from urllib.parse import urljoin
 from xml.etree import ElementTree
 
 from requests.exceptions import HTTPError
 
-from pulp_smash import api, config
+from pulp_smash import api, config, utils
 from pulp_smash.pulp3.constants import REPO_PATH
 from pulp_smash.pulp3.utils import (
     download_content_unit,
@@ -20,6 +22,7 @@ from pulp_smash.pulp3.utils import (
 
 from pulp_rpm.tests.functional.utils import (
     gen_rpm_remote,
+    get_rpm_package_paths,
 )
 from pulp_rpm.tests.functional.constants import (
     RPM_ALT_LAYOUT_FIXTURE_URL,
@@ -279,3 +282,66 @@ class ValidateNoChecksumTagTestCase(unittest.TestCase):
         ]
         xpath = '{{{}}}location'.format(RPM_NAMESPACES['metadata/repo'])
         return data_elems[0].find(xpath).get('href')
+
+
+class MirrorMetadataPublishTestCase(unittest.TestCase):
+    """Publish a repository synced with ``mirror_metadata``.
+
+    This Test does the following:
+
+    1. Sync a repository whose packages are in nested directories with
+       ``mirror_metadata=True``.
+    2. Publish and distribute the repo.
+    3. Check that ``repomd.xml`` is served as it is in the remote
+       repository.
+    4. Check that every package is served at its ``location_href``, the
+       path the mirrored repodata points to.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Create class-wide variables."""
+        cls.cfg = config.get_config()
+        cls.client = api.Client(cls.cfg, api.json_handler)
+
+    def test_all(self):
+        """Sync, publish and download a mirrored repository."""
+        # Step 1
+        repo = self.client.post(REPO_PATH, gen_repo())
+        self.addCleanup(self.client.delete, repo['_href'])
+
+        body = gen_rpm_remote(url=RPM_ALT_LAYOUT_FIXTURE_URL)
+        remote = self.client.post(RPM_REMOTE_PATH, body)
+        self.addCleanup(self.client.delete, remote['_href'])
+
+        sync(self.cfg, remote, repo, mirror_metadata=True)
+        repo = self.client.get(repo['_href'])
+
+        # Step 2
+        publication = publish(self.cfg, repo)
+        self.addCleanup(self.client.delete, publication['_href'])
+        body = gen_distribution()
+        body['publication'] = publication['_href']
+        distribution = self.client.using_handler(api.task_handler).post(
+            RPM_DISTRIBUTION_PATH, body
+        )
+        self.addCleanup(self.client.delete, distribution['_href'])
+
+        # Step 3
+        self.assertEqual(
+            download_content_unit(self.cfg, distribution, 'repodata/repomd.xml'),
+            utils.http_get(urljoin(RPM_ALT_LAYOUT_FIXTURE_URL, 'repodata/repomd.xml'))
+        )
+
+        # Step 4
+        paths = get_rpm_package_paths(repo)
+        self.assertTrue(any('/' in path for path in paths), paths)
+        for path in paths:
+            with self.subTest(path=path):
+                fixtures_hash = hashlib.sha256(
+                    utils.http_get(urljoin(RPM_ALT_LAYOUT_FIXTURE_URL, path))
+                ).hexdigest()
+                pulp_hash = hashlib.sha256(
+                    download_content_unit(self.cfg, distribution, path)
+                ).hexdigest()
+                self.assertEqual(fixtures_hash, pulp_hash)
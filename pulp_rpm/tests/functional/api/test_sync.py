@@ -59,9 +59,12 @@ class BasicSyncTestCase(unittest.TestCase):
         5. Assert that the correct number of units were added and are present
            in the repo.
         6. Sync the remote one more time.
-        7. Assert that repository version is different from the previous one.
-        8. Assert that the same number of are present and that no units were
-           added.
+        7. Assert that repository version is the same as the previous one,
+           since nothing has changed upstream.
+        8. Sync the remote one more time with ``optimize=False``.
+        9. Assert that repository version is different from the previous one.
+        10. Assert that the same number of are present and that no units were
+            added.
         """
         repo = self.client.post(REPO_PATH, gen_repo())
         self.addCleanup(self.client.delete, repo['_href'])
@@ -92,6 +95,13 @@ class BasicSyncTestCase(unittest.TestCase):
         sync(self.cfg, remote, repo)
         repo = self.client.get(repo['_href'])
 
+        # Check that the sync was skipped.
+        self.assertEqual(latest_version_href, repo['_latest_version_href'])
+
+        # Force a sync of the repository.
+        sync(self.cfg, remote, repo, optimize=False)
+        repo = self.client.get(repo['_href'])
+
         # Check that nothing has changed since the last sync.
         self.assertNotEqual(latest_version_href, repo['_latest_version_href'])
         self.assertDictEqual(
@@ -0,0 +1,29 @@
+from django.test import TestCase
+from pulpcore.plugin.models import Repository, RepositoryVersion
+
+from pulp_rpm.app.constants import RPM_PLUGIN_TYPES
+from pulp_rpm.app.models import RepoMetadataFile, UpdateRecord
+from pulp_rpm.app.tasks.copy import copy_content
+
+
+class TestCopyContent(TestCase):
+    """Test copying content between repositories."""
+
+    def test_mirrored_repodata_dropped(self):
+        """Test that mirrored repodata of the destination repository is dropped by a copy."""
+        source = Repository.objects.create(name='source')
+        destination = Repository.objects.create(name='destination')
+        update_record = UpdateRecord.objects.create(id='RHSA-1', digest='1')
+        repomd = RepoMetadataFile.objects.create(
+            data_type='repomd', checksum_type='sha256', checksum='abc',
+            relative_path='repodata/repomd.xml')
+        with RepositoryVersion.create(source) as source_version:
+            source_version.add_content(UpdateRecord.objects.filter(pk=update_record.pk))
+        with RepositoryVersion.create(destination) as version:
+            version.add_content(RepoMetadataFile.objects.filter(pk=repomd.pk))
+
+        copy_content(source_version.pk, destination.pk, [RPM_PLUGIN_TYPES.ADVISORY])
+
+        latest = RepositoryVersion.latest(destination)
+        self.assertEqual([content.pk for content in latest.content], [update_record.pk])
+        self.assertIsNone(RepoMetadataFile.repomd_in(latest))
@@ -0,0 +1,423 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from unittest import mock
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from django.test import TestCase
+from pulpcore.plugin.download import HttpDownloader
+from pulpcore.plugin.exceptions import DigestValidationError
+
+from pulp_rpm.app.downloaders import (
+    AdaptiveConcurrencyLimiter,
+    BandwidthLimiter,
+    INITIAL_DOWNLOAD_CONCURRENCY,
+    MirrorBalancer,
+    MirrorFailover,
+    MirrorShardingDownloader,
+    NotModified,
+    PARALLEL_RANGE_COUNT,
+    RpmDownloaderFactory,
+    RpmFileDownloader,
+    RpmHttpDownloader,
+)
+from pulp_rpm.app.models import RpmRemote
+
+
+class TestMirrorBalancer(TestCase):
+    """Test spreading of downloads over mirrors."""
+
+    BASE_URLS = ['https://a.example.com/os/', 'https://b.example.com/os/']
+
+    def test_relative_path(self):
+        """Test that URLs are matched to their mirror."""
+        balancer = MirrorBalancer(self.BASE_URLS)
+        self.assertEqual(balancer.relative_path('https://b.example.com/os/Packages/foo.rpm'),
+                         'Packages/foo.rpm')
+        self.assertIsNone(balancer.relative_path('https://c.example.com/os/Packages/foo.rpm'))
+
+    def test_every_mirror_is_probed(self):
+        """Test that downloads are spread over mirrors without observations."""
+        balancer = MirrorBalancer(self.BASE_URLS)
+        first = balancer.choose()
+        balancer.started(first)
+        second = balancer.choose()
+        self.assertEqual({first, second}, set(self.BASE_URLS))
+
+    def test_balance_by_throughput(self):
+        """Test that faster mirrors get more downloads in flight."""
+        fast, slow = self.BASE_URLS
+        balancer = MirrorBalancer(self.BASE_URLS)
+        balancer.finished(fast, size=4000, seconds=1)
+        balancer.finished(slow, size=1000, seconds=1)
+
+        chosen = []
+        for _ in range(5):
+            base_url = balancer.choose()
+            balancer.started(base_url)
+            chosen.append(base_url)
+        self.assertEqual(chosen.count(fast), 4)
+        self.assertEqual(chosen.count(slow), 1)
+
+    def test_failed_mirror(self):
+        """Test that failed mirrors are penalized and excluded mirrors are not chosen."""
+        fast, slow = self.BASE_URLS
+        balancer = MirrorBalancer(self.BASE_URLS)
+        balancer.finished(fast, size=2000, seconds=1)
+        balancer.finished(slow, size=1500, seconds=1)
+        balancer.failed(fast)
+        self.assertEqual(balancer.choose(), slow)
+        self.assertEqual(balancer.choose(exclude={slow}), fast)
+        self.assertIsNone(balancer.choose(exclude=set(self.BASE_URLS)))
+
+
+class TestMirrorFailover(TestCase):
+    """Test failing over to the next mirrors of a metalink or a mirrorlist."""
+
+    BASE_URLS = ['https://a.example.com/os/', 'https://b.example.com/os/',
+                 'https://c.example.com/os/']
+
+    def test_choose(self):
+        """Test that the first mirror is used until it fails, then the next one."""
+        first, second, third = self.BASE_URLS
+        failover = MirrorFailover(self.BASE_URLS)
+        failover.finished(third, size=4000, seconds=1)
+        self.assertEqual(failover.choose(), first)
+        self.assertEqual(failover.choose(exclude={first}), second)
+        failover.failed(first)
+        self.assertEqual(failover.choose(), second)
+        failover.failed(second)
+        failover.failed(third)
+        self.assertEqual(failover.choose(), first)
+        self.assertIsNone(failover.choose(exclude=set(self.BASE_URLS)))
+
+    def test_download(self):
+        """Test that a download which fails on a mirror is retried on the next one."""
+        first, second, third = self.BASE_URLS
+        urls = []
+
+        def build(url, **kwargs):
+            urls.append(url)
+
+            async def run(extra_data=None):
+                if url.startswith(first):
+                    raise aiohttp.ClientConnectionError()
+                return mock.Mock(path=__file__)
+
+            return mock.Mock(run=run)
+
+        remote = mock.Mock(**{'download_factory.build.side_effect': build})
+        failover = MirrorFailover(self.BASE_URLS)
+        downloader = MirrorShardingDownloader(remote, failover, first + 'Packages/foo.rpm')
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        loop.run_until_complete(downloader.run())
+        loop.run_until_complete(downloader.run())
+        self.assertEqual(urls, [first + 'Packages/foo.rpm', second + 'Packages/foo.rpm',
+                                second + 'Packages/foo.rpm'])
+
+
+class TestRpmHttpDownloader(TestCase):
+    """Test resuming of interrupted downloads and downloads in parallel ranges."""
+
+    CONTENT = bytes(range(256)) * 1024
+    ETAG = '"content"'
+
+    def setUp(self):
+        """Serve CONTENT, breaking off the first response without a Range header."""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+        self.requests = []
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        cwd = os.getcwd()
+        os.chdir(temp_dir.name)
+        self.addCleanup(os.chdir, cwd)
+
+        app = web.Application()
+        app.router.add_get('/file.rpm', self.handler)
+        self.server = TestServer(app, loop=self.loop)
+        self.loop.run_until_complete(self.server.start_server())
+        self.addCleanup(self.loop.run_until_complete, self.server.close())
+
+    async def handler(self, request):
+        """Serve ranges of CONTENT, or a part of it and drop the connection."""
+        range_header = request.headers.get('Range')
+        self.requests.append(range_header)
+        if request.headers.get('If-None-Match') == self.ETAG:
+            return web.Response(status=304)
+        if range_header is None:
+            response = web.StreamResponse(headers={'Content-Length': str(len(self.CONTENT))})
+            await response.prepare(request)
+            await response.write(self.CONTENT[:1000])
+            request.transport.close()
+            return response
+
+        start, _sep, end = range_header[len('bytes='):].partition('-')
+        start, end = int(start), int(end) if end else len(self.CONTENT) - 1
+        return web.Response(status=206, body=self.CONTENT[start:end + 1], headers={
+            'Content-Range': 'bytes {}-{}/{}'.format(start, end, len(self.CONTENT))
+        })
+
+    def download(self, **kwargs):
+        """Download the file and return the result."""
+        async def run():
+            async with aiohttp.ClientSession() as session:
+                downloader = RpmHttpDownloader(
+                    str(self.server.make_url('/file.rpm')), session=session,
+                    expected_digests={'sha256': hashlib.sha256(self.CONTENT).hexdigest()},
+                    expected_size=len(self.CONTENT), **kwargs
+                )
+                return await downloader.run()
+        return self.loop.run_until_complete(run())
+
+    def test_resume(self):
+        """Test that an interrupted download continues from the last received byte."""
+        result = self.download()
+        with open(result.path, 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), self.CONTENT)
+        self.assertEqual(self.requests[0], None)
+        self.assertTrue(self.requests[-1].startswith('bytes='))
+        self.assertNotEqual(self.requests[-1], 'bytes=0-')
+
+    @mock.patch('pulp_rpm.app.downloaders.PARALLEL_RANGE_MIN_SIZE', 1024)
+    def test_parallel_ranges(self):
+        """Test that large files are downloaded in parallel ranges."""
+        result = self.download()
+        with open(result.path, 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), self.CONTENT)
+        self.assertEqual(len(self.requests), PARALLEL_RANGE_COUNT)
+        self.assertEqual(os.listdir('.'), [os.path.basename(result.path)])
+
+    @mock.patch('pulp_rpm.app.downloaders.PARALLEL_RANGE_MIN_SIZE', 1024)
+    def test_ranges_within_limit(self):
+        """Test that ranges without a free slot are downloaded in the slot of the download."""
+        semaphore = asyncio.Semaphore(1)
+        result = self.download(semaphore=semaphore)
+        with open(result.path, 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), self.CONTENT)
+        self.assertEqual(len(self.requests), PARALLEL_RANGE_COUNT)
+        self.assertFalse(semaphore.locked())
+
+    def test_not_modified(self):
+        """Test that a conditional request for an unchanged file raises NotModified."""
+        with self.assertRaises(NotModified):
+            self.download(request_headers={'If-None-Match': self.ETAG})
+        self.assertEqual(len(self.requests), 1)
+
+    def test_headers_ready_callback(self):
+        """Test that the headers are passed on once although the download is resumed."""
+        headers = []
+
+        async def headers_ready(response_headers):
+            headers.append(response_headers)
+
+        self.download(headers_ready_callback=headers_ready)
+        self.assertGreater(len(self.requests), 1)
+        self.assertEqual(len(headers), 1)
+        self.assertEqual(headers[0]['Content-Length'], str(len(self.CONTENT)))
+
+    def test_close_session(self):
+        """Test that a session opened by the downloader is closed, also after errors."""
+        async def run():
+            downloader = RpmHttpDownloader(str(self.server.make_url('/file.rpm')),
+                                           request_headers={'If-None-Match': self.ETAG})
+            with self.assertRaises(NotModified):
+                await downloader.run()
+            return downloader.session
+
+        self.assertTrue(self.loop.run_until_complete(run()).closed)
+
+    def test_shared_session(self):
+        """Test that a session which the downloader was given is left open."""
+        async def run():
+            async with aiohttp.ClientSession() as session:
+                downloader = RpmHttpDownloader(str(self.server.make_url('/file.rpm')),
+                                               session=session,
+                                               request_headers={'If-None-Match': self.ETAG})
+                with self.assertRaises(NotModified):
+                    await downloader.run()
+                return session.closed
+
+        self.assertFalse(self.loop.run_until_complete(run()))
+
+
+class TestRpmFileDownloader(TestCase):
+    """Test imports of local files."""
+
+    CONTENT = b'rpm' * 1000
+
+    def setUp(self):
+        """Create a source file and work in a temporary directory on the same filesystem."""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.source = os.path.join(temp_dir.name, 'foo.rpm')
+        with open(self.source, 'wb') as source:
+            source.write(self.CONTENT)
+        os.mkdir(os.path.join(temp_dir.name, 'work'))
+        cwd = os.getcwd()
+        os.chdir(os.path.join(temp_dir.name, 'work'))
+        self.addCleanup(os.chdir, cwd)
+
+    def download(self, digest):
+        """Import the source file and return the result."""
+        downloader = RpmFileDownloader('file://' + self.source,
+                                       expected_digests={'sha256': digest},
+                                       expected_size=len(self.CONTENT))
+        return self.loop.run_until_complete(downloader.run())
+
+    def test_link(self):
+        """Test that the file is linked instead of copied, and validated."""
+        result = self.download(hashlib.sha256(self.CONTENT).hexdigest())
+        with open(result.path, 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), self.CONTENT)
+        self.assertEqual(result.artifact_attributes['size'], len(self.CONTENT))
+        self.assertNotEqual(result.path, self.source)
+
+    @mock.patch('pulp_rpm.app.downloaders.os.link', side_effect=OSError)
+    @mock.patch('pulp_rpm.app.downloaders.fcntl.ioctl', side_effect=OSError)
+    def test_copy(self, _ioctl, _link):
+        """Test that the file is copied if it cannot be linked."""
+        result = self.download(hashlib.sha256(self.CONTENT).hexdigest())
+        with open(result.path, 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), self.CONTENT)
+        self.assertEqual(os.stat(self.source).st_nlink, 1)
+
+    def test_digest_mismatch(self):
+        """Test that a linked file which does not match the expected digest is removed."""
+        with self.assertRaises(DigestValidationError):
+            self.download(hashlib.sha256(b'other').hexdigest())
+        self.assertEqual(os.listdir('.'), [])
+        self.assertEqual(os.stat(self.source).st_nlink, 1)
+
+
+class TestAdaptiveConcurrencyLimiter(TestCase):
+    """Test adaptive limits of concurrent downloads."""
+
+    def setUp(self):
+        """Run the limiter in a new event loop."""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+
+    def run_downloads(self, limiter, count):
+        """Run downloads through the limiter and return the highest concurrency reached."""
+        running = []
+
+        async def download():
+            async with limiter:
+                running.append(limiter.in_flight)
+                await asyncio.sleep(0)
+
+        self.loop.run_until_complete(asyncio.gather(*(download() for _ in range(count))))
+        return max(running)
+
+    def test_slow_start(self):
+        """Test that the limit grows with successful downloads up to the maximum."""
+        limiter = AdaptiveConcurrencyLimiter(10)
+        self.assertEqual(limiter.limit, INITIAL_DOWNLOAD_CONCURRENCY)
+        self.assertEqual(self.run_downloads(limiter, INITIAL_DOWNLOAD_CONCURRENCY * 2),
+                         INITIAL_DOWNLOAD_CONCURRENCY)
+        self.run_downloads(limiter, 20)
+        self.assertEqual(limiter.limit, 10)
+        self.assertLessEqual(self.run_downloads(limiter, 50), 10)
+
+    def test_throttled(self):
+        """Test that the limit is cut once per round of downloads when the server slows down."""
+        limiter = AdaptiveConcurrencyLimiter(100)
+        limiter.limit, limiter.in_flight = 40, 5
+        limiter.throttled()
+        limiter.throttled()
+        self.assertEqual(limiter.limit, 20)
+        self.assertTrue(limiter.congested)
+
+        limiter.in_flight = 0
+        self.run_downloads(limiter, 1)
+        self.assertEqual(limiter.limit, 20 + 1 / 20)
+
+    def test_rising_latency(self):
+        """Test that the limit is cut when the latency rises above the lowest latency."""
+        limiter = AdaptiveConcurrencyLimiter(100)
+        limiter.limit, limiter.in_flight = 40, 5
+        for _ in range(10):
+            limiter.observed_latency(0.1)
+        self.assertEqual(limiter.limit, 40)
+        for _ in range(10):
+            limiter.observed_latency(1)
+        self.assertEqual(limiter.limit, 20)
+
+
+class TestRpmDownloaderFactory(TestCase):
+    """Test that downloaders built by the factory share the limits of the remote."""
+
+    def setUp(self):
+        """Serve files slowly enough for downloads to overlap, counting concurrent requests."""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+        self.running = 0
+        self.max_running = 0
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        cwd = os.getcwd()
+        os.chdir(temp_dir.name)
+        self.addCleanup(os.chdir, cwd)
+
+        app = web.Application()
+        app.router.add_get('/{name}', self.handler)
+        self.server = TestServer(app, loop=self.loop)
+        self.loop.run_until_complete(self.server.start_server())
+        self.addCleanup(self.loop.run_until_complete, self.server.close())
+
+    async def handler(self, request):
+        """Serve a file after a short delay."""
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.05)
+        self.running -= 1
+        return web.Response(body=b'rpm')
+
+    def test_concurrency_limit(self):
+        """Test that HttpDownloaders of pulpcore wait for the adaptive limit of the remote."""
+        remote = RpmRemote.objects.create(name='remote', url=str(self.server.make_url('/')),
+                                          download_concurrency=2)
+        factory = RpmDownloaderFactory(remote)
+        downloaders = [factory.build(str(self.server.make_url('/{}.rpm'.format(i))))
+                       for i in range(10)]
+        for downloader in downloaders:
+            self.assertIs(type(downloader), HttpDownloader)
+            self.assertIs(downloader.semaphore, factory.concurrency_limiter)
+
+        results = self.loop.run_until_complete(
+            asyncio.gather(*(downloader.run() for downloader in downloaders))
+        )
+        self.assertEqual(len(results), 10)
+        self.assertEqual(self.max_running, 2)
+        self.assertEqual(factory.concurrency_limiter.in_flight, 0)
+
+
+class TestBandwidthLimiter(TestCase):
+    """Test limits of the download bandwidth."""
+
+    def test_consume(self):
+        """Test that downloads wait to pay off the bandwidth they exceeded."""
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        limiter = BandwidthLimiter(1000000)
+
+        start = time.monotonic()
+        loop.run_until_complete(limiter.consume(1000000))
+        self.assertLess(time.monotonic() - start, 0.05)
+        loop.run_until_complete(limiter.consume(100000))
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
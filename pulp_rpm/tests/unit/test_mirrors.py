@@ -0,0 +1,78 @@
+import hashlib
+import os
+import tempfile
+
+from django.test import TestCase
+
+from pulp_rpm.app.mirrors import parse_mirror_list, verify_repomd
+
+REPOMD = b'<repomd/>\n'
+OLD_REPOMD = b'<repomd>old</repomd>\n'
+
+METALINK = '''<?xml version="1.0" encoding="utf-8"?>
+<metalink version="3.0" xmlns="http://www.metalinker.org/"
+          xmlns:mm0="http://fedorahosted.org/mirrormanager" type="dynamic">
+ <files>
+  <file name="repomd.xml">
+   <size>{size}</size>
+   <verification>
+    <hash type="md5">0</hash>
+    <hash type="sha256">{sha256}</hash>
+   </verification>
+   <mm0:alternates>
+    <mm0:alternate>
+     <size>{old_size}</size>
+     <verification><hash type="sha256">{old_sha256}</hash></verification>
+    </mm0:alternate>
+   </mm0:alternates>
+   <resources maxconnections="1">
+    <url protocol="https" preference="90">https://b.example.com/os/repodata/repomd.xml</url>
+    <url protocol="rsync" preference="100">rsync://c.example.com/os/repodata/repomd.xml</url>
+    <url protocol="https" preference="100">https://a.example.com/os/repodata/repomd.xml</url>
+   </resources>
+  </file>
+ </files>
+</metalink>
+'''.format(size=len(REPOMD), sha256=hashlib.sha256(REPOMD).hexdigest(),
+           old_size=len(OLD_REPOMD), old_sha256=hashlib.sha256(OLD_REPOMD).hexdigest())
+
+MIRRORLIST = '''# mirrors of the repository
+https://a.example.com/os/
+http://b.example.com/os
+
+'''
+
+
+class TestMirrorList(TestCase):
+    """Test parsing of metalinks and mirrorlists and verification of repomd.xml."""
+
+    def write(self, content):
+        """Write content to a temporary file and return its path."""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_metalink(self):
+        """Test that HTTP mirrors are ordered by preference and repomd.xml is verified."""
+        mirror_list = parse_mirror_list(self.write(METALINK))
+        self.assertEqual(mirror_list.base_urls,
+                         ['https://a.example.com/os/', 'https://b.example.com/os/'])
+        self.assertTrue(verify_repomd(self.write(REPOMD), mirror_list.verifications))
+        self.assertTrue(verify_repomd(self.write(OLD_REPOMD), mirror_list.verifications))
+        self.assertFalse(verify_repomd(self.write(b'<repomd/>\r'), mirror_list.verifications))
+
+    def test_mirrorlist(self):
+        """Test that mirrorlist URLs are used as base URLs."""
+        mirror_list = parse_mirror_list(self.write(MIRRORLIST))
+        self.assertEqual(mirror_list.base_urls,
+                         ['https://a.example.com/os/', 'http://b.example.com/os/'])
+        self.assertTrue(verify_repomd(self.write(REPOMD), mirror_list.verifications))
+
+    def test_not_a_mirror_list(self):
+        """Test that other documents are not mistaken for mirror lists."""
+        self.assertIsNone(parse_mirror_list(self.write('<html><body>Not found</body></html>')))
+        self.assertIsNone(parse_mirror_list(self.write('Not found')))
@@ -1,4 +1,8 @@
 from django.test import TestCase
+from pulpcore.plugin.models import Repository, RepositoryVersion
+
+from pulp_rpm.app.downloaders import MirrorFailover, MirrorShardingDownloader
+from pulp_rpm.app.models import RepoMetadataFile, RpmRemote
 
 
 class TestNothing(TestCase):
@@ -7,3 +11,80 @@ class TestNothing(TestCase):
     def test_nothing_at_all(self):
         """Test that the tests are running and that's it."""
         self.assertTrue(True)
+
+
+class TestRpmRemotePackageFilter(TestCase):
+    """Test the package filter of RpmRemote."""
+
+    def test_no_rules(self):
+        """Test that all packages are synced by default."""
+        package_filter = RpmRemote().get_package_filter()
+        self.assertTrue(package_filter('foo', 'x86_64'))
+        self.assertTrue(package_filter('foo', 'src'))
+
+    def test_arches(self):
+        """Test filtering by arch."""
+        package_filter = RpmRemote(include_arches='["x86_64", "noarch"]',
+                                   exclude_source_rpms=True).get_package_filter()
+        self.assertTrue(package_filter('foo', 'x86_64'))
+        self.assertTrue(package_filter('foo', 'noarch'))
+        self.assertFalse(package_filter('foo', 'i686'))
+        package_filter = RpmRemote(exclude_source_rpms=True).get_package_filter()
+        self.assertTrue(package_filter('foo', 'i686'))
+        self.assertFalse(package_filter('foo', 'src'))
+        self.assertFalse(package_filter('foo', 'nosrc'))
+
+    def test_names(self):
+        """Test filtering by name patterns."""
+        package_filter = RpmRemote(include_names='["python3-*", "bash"]',
+                                   exclude_names='["*-debuginfo"]').get_package_filter()
+        self.assertTrue(package_filter('bash', 'x86_64'))
+        self.assertTrue(package_filter('python3-foo', 'x86_64'))
+        self.assertFalse(package_filter('python3-foo-debuginfo', 'x86_64'))
+        self.assertFalse(package_filter('zsh', 'x86_64'))
+
+    def test_filters_packages(self):
+        """Test that any rule means that only some packages are synced."""
+        self.assertFalse(RpmRemote().filters_packages())
+        self.assertTrue(RpmRemote(include_arches='["x86_64"]').filters_packages())
+        self.assertTrue(RpmRemote(exclude_names='["*-debuginfo"]').filters_packages())
+        self.assertTrue(RpmRemote(exclude_source_rpms=True).filters_packages())
+        self.assertTrue(RpmRemote(retain_package_versions=1).filters_packages())
+
+
+class TestRpmRemoteMirrors(TestCase):
+    """Test the downloaders of a remote with mirrors."""
+
+    def test_fail_over_to_mirrors(self):
+        """Test that downloads under mirrors of a metalink fail over to the next mirror."""
+        remote = RpmRemote(url='https://example.com/metalink', mirror_urls='[]')
+        remote.fail_over_to_mirrors(['https://a.example.com/os/'])
+        self.assertIsNone(remote.get_mirror_balancer())
+
+        remote.fail_over_to_mirrors(['https://a.example.com/os/', 'https://b.example.com/os/'])
+        downloader = remote.get_downloader(url='https://a.example.com/os/Packages/foo.rpm')
+        self.assertIsInstance(downloader, MirrorShardingDownloader)
+        self.assertIsInstance(downloader.balancer, MirrorFailover)
+        self.assertEqual(downloader.relative_path, 'Packages/foo.rpm')
+
+
+class TestRepoMetadataFile(TestCase):
+    """Test mirrored repodata files."""
+
+    def test_repomd_in(self):
+        """Test that only a version with a mirrored repomd.xml has mirrored repodata."""
+        repository = Repository.objects.create(name='repository')
+        primary = RepoMetadataFile.objects.create(
+            data_type='primary', checksum_type='sha256', checksum='abc',
+            relative_path='repodata/abc-primary.xml.gz')
+        repomd = RepoMetadataFile.objects.create(
+            data_type='repomd', checksum_type='sha256', checksum='def',
+            relative_path='repodata/repomd.xml')
+
+        with RepositoryVersion.create(repository) as version:
+            version.add_content(RepoMetadataFile.objects.filter(pk=primary.pk))
+        self.assertIsNone(RepoMetadataFile.repomd_in(version))
+
+        with RepositoryVersion.create(repository) as version:
+            version.add_content(RepoMetadataFile.objects.filter(pk=repomd.pk))
+        self.assertEqual(RepoMetadataFile.repomd_in(version), repomd)
@@ -0,0 +1,70 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase
+from pulpcore.plugin.models import Artifact, ContentArtifact, Repository, RepositoryVersion
+
+from pulp_rpm.app.models import Package, RepoMetadataFile
+from pulp_rpm.app.tasks.publishing import mirrored_repodata_matches
+from pulp_rpm.app.tasks.synchronizing import PrimaryEntry, RpmFirstStage
+
+
+def primary_entry(pkgid):
+    """Return a primary.xml entry of a package with the given pkgId."""
+    return PrimaryEntry(name='foo', epoch='0', version='1', release='1', arch='noarch',
+                        pkgId=pkgid, checksum_type='sha256', location_href='foo.rpm',
+                        size_package=1, time_build=1)
+
+
+class TestMirroredRepodataMatches(TestCase):
+    """Test that mirrored repodata is only published if it lists the packages of a version."""
+
+    def setUp(self):
+        """Save mirrored repodata and a package in a repository version."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, 'primary.xml.gz')
+        with open(path, 'wb') as primary_file:
+            primary_file.write(b'primary')
+        artifact = Artifact.init_and_validate(path)
+        artifact.save()
+
+        primary = RepoMetadataFile.objects.create(
+            data_type='primary', checksum_type='sha256', checksum='abc',
+            relative_path='repodata/abc-primary.xml.gz')
+        ContentArtifact.objects.create(artifact=artifact, content=primary,
+                                       relative_path=primary.relative_path)
+        repomd = RepoMetadataFile.objects.create(
+            data_type='repomd', checksum_type='sha256', checksum='def',
+            relative_path='repodata/repomd.xml')
+        self.package = Package.objects.create(name='foo', pkgId='aaa')
+
+        self.repository = Repository.objects.create(name='repository')
+        with RepositoryVersion.create(self.repository) as version:
+            version.add_content(RepoMetadataFile.objects.filter(pk__in=[primary.pk, repomd.pk]))
+            version.add_content(Package.objects.filter(pk=self.package.pk))
+        self.version = version
+
+    @mock.patch.object(RpmFirstStage, 'scan_primary')
+    def test_matches(self, scan_primary):
+        """Test that repodata listing exactly the packages of the version matches."""
+        scan_primary.return_value = [primary_entry('aaa')]
+        self.assertTrue(mirrored_repodata_matches(self.version))
+
+    @mock.patch.object(RpmFirstStage, 'scan_primary')
+    def test_package_removed(self, scan_primary):
+        """Test that repodata listing a package removed from the version does not match."""
+        scan_primary.return_value = [primary_entry('aaa'), primary_entry('bbb')]
+        self.assertFalse(mirrored_repodata_matches(self.version))
+
+        with RepositoryVersion.create(self.repository) as version:
+            version.remove_content(Package.objects.filter(pk=self.package.pk))
+        scan_primary.return_value = [primary_entry('aaa')]
+        self.assertFalse(mirrored_repodata_matches(version))
+
+    @mock.patch.object(RpmFirstStage, 'scan_primary')
+    def test_package_replaced(self, scan_primary):
+        """Test that repodata listing the same number of other packages does not match."""
+        scan_primary.return_value = [primary_entry('bbb')]
+        self.assertFalse(mirrored_repodata_matches(self.version))
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import time
+
+from django.test import TestCase
+
+from pulp_rpm.app.repodata_cache import RepodataCache
+
+
+class TestRepodataCache(TestCase):
+    """Test the checksum-keyed cache of repodata files."""
+
+    def setUp(self):
+        """Create a cache and a working directory."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache = RepodataCache(os.path.join(temp_dir.name, 'cache'), max_size=10)
+        self.working_dir = os.path.join(temp_dir.name, 'working')
+        os.makedirs(self.working_dir)
+
+    def download(self, content):
+        """Write content to a file in the working directory."""
+        fd, path = tempfile.mkstemp(dir=self.working_dir)
+        with os.fdopen(fd, 'wb') as downloaded:
+            downloaded.write(content)
+        return path
+
+    def test_get(self):
+        """Test that cached files are found by their checksum and size."""
+        self.assertIsNone(self.cache.get('sha256', 'aaa', destination_dir=self.working_dir))
+        self.cache.put('sha256', 'aaa', self.download(b'primary'))
+
+        path = self.cache.get('sha256', 'aaa', size=7, destination_dir=self.working_dir)
+        self.assertEqual(os.path.dirname(path), self.working_dir)
+        with open(path, 'rb') as cached:
+            self.assertEqual(cached.read(), b'primary')
+        self.assertIsNone(self.cache.get('sha256', 'aaa', size=8,
+                                         destination_dir=self.working_dir))
+        self.assertIsNone(self.cache.get('sha1', 'aaa', destination_dir=self.working_dir))
+
+    def test_evict_least_recently_used(self):
+        """Test that the least recently used files are evicted when the cache is full."""
+        self.cache.put('sha256', 'aaa', self.download(b'1234'))
+        self.cache.put('sha256', 'bbb', self.download(b'1234'))
+        old = time.time() - 60
+        os.utime(os.path.join(self.cache.path, 'sha256-aaa'), (old, old))
+        os.utime(os.path.join(self.cache.path, 'sha256-bbb'), (old - 60, old - 60))
+        self.assertIsNotNone(self.cache.get('sha256', 'bbb', destination_dir=self.working_dir))
+
+        self.cache.put('sha256', 'ccc', self.download(b'1234'))
+        self.assertIsNone(self.cache.get('sha256', 'aaa', destination_dir=self.working_dir))
+        self.assertIsNotNone(self.cache.get('sha256', 'bbb', destination_dir=self.working_dir))
+        self.assertIsNotNone(self.cache.get('sha256', 'ccc', destination_dir=self.working_dir))
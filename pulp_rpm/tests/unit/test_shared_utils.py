@@ -0,0 +1,96 @@
+from django.test import TestCase
+
+from pulp_rpm.app.shared_utils import compare_evr, rpmvercmp, update_record_digest
+
+
+class TestUpdateRecordDigest(TestCase):
+    """Test the canonical UpdateRecord digest."""
+
+    RECORD = {'id': 'RHSA-2019:1234', 'updated_date': '2019-07-01 00:00:00', 'pushcount': ''}
+    COLLECTIONS = [
+        ({'name': 'one', 'shortname': '1'}, [
+            {'name': 'foo', 'epoch': '0', 'reboot_suggested': False, 'sum_type': 5},
+            {'name': 'bar', 'epoch': '1', 'reboot_suggested': True, 'sum_type': ''},
+        ]),
+        ({'name': 'two', 'shortname': '2'}, []),
+    ]
+    REFERENCES = [
+        {'href': 'https://example.com/1', 'ref_id': '1', 'title': 'one', 'ref_type': 'bugzilla'},
+        {'href': 'https://example.com/2', 'ref_id': '2', 'title': 'two', 'ref_type': 'cve'},
+    ]
+
+    def test_order_independent(self):
+        """Test that the order of fields, collections, packages and references doesn't matter."""
+        reordered_collections = [
+            (collection, list(reversed(packages)))
+            for collection, packages in reversed(self.COLLECTIONS)
+        ]
+        self.assertEqual(
+            update_record_digest(self.RECORD, self.COLLECTIONS, self.REFERENCES),
+            update_record_digest(dict(reversed(list(self.RECORD.items()))),
+                                 reordered_collections,
+                                 list(reversed(self.REFERENCES)))
+        )
+
+    def test_stored_values(self):
+        """Test that parsed values and their stored string form have the same digest."""
+        stored_collections = [
+            (collection, [{key: str(value) for key, value in package.items()}
+                          for package in packages])
+            for collection, packages in self.COLLECTIONS
+        ]
+        self.assertEqual(
+            update_record_digest(self.RECORD, self.COLLECTIONS, self.REFERENCES),
+            update_record_digest(self.RECORD, stored_collections, self.REFERENCES)
+        )
+
+    def test_data_changes(self):
+        """Test that any change of the data changes the digest."""
+        digest = update_record_digest(self.RECORD, self.COLLECTIONS, self.REFERENCES)
+        changed_record = dict(self.RECORD, pushcount='2')
+        self.assertNotEqual(
+            digest, update_record_digest(changed_record, self.COLLECTIONS, self.REFERENCES)
+        )
+        self.assertNotEqual(
+            digest, update_record_digest(self.RECORD, self.COLLECTIONS[:1], self.REFERENCES)
+        )
+        self.assertNotEqual(
+            digest, update_record_digest(self.RECORD, self.COLLECTIONS, self.REFERENCES[:1])
+        )
+
+
+class TestRpmvercmp(TestCase):
+    """Test comparison of versions the way rpm does it."""
+
+    def assertOrdered(self, older, newer):
+        """Assert that the first version is older than the second one."""
+        self.assertEqual(rpmvercmp(older, newer), -1)
+        self.assertEqual(rpmvercmp(newer, older), 1)
+
+    def test_equal(self):
+        """Test versions which are equal."""
+        for first, second in (('1.0', '1.0'), ('001', '1'), ('1_0', '1.0'), ('1.0.', '1.0')):
+            self.assertEqual(rpmvercmp(first, second), 0)
+
+    def test_segments(self):
+        """Test comparison of numeric and alphabetic segments."""
+        self.assertOrdered('1.0', '2.0')
+        self.assertOrdered('9', '10')
+        self.assertOrdered('2.0', '2.0.1')
+        self.assertOrdered('1.0', '1.0a')
+        self.assertOrdered('1.a', '1.1')
+        self.assertOrdered('5.5p1', '5.5p10')
+
+    def test_tilde_and_caret(self):
+        """Test pre-release and post-release separators."""
+        self.assertOrdered('1.0~rc1', '1.0')
+        self.assertOrdered('1.0~rc1', '1.0~rc2')
+        self.assertOrdered('1.0', '1.0^git1')
+        self.assertOrdered('1.0^git1', '1.0.1')
+        self.assertOrdered('1.0~', '1.0^')
+
+    def test_compare_evr(self):
+        """Test that the epoch is compared before the version and the release."""
+        self.assertEqual(compare_evr(('', '2', '1'), ('1', '1', '1')), -1)
+        self.assertEqual(compare_evr(('0', '1', '2'), ('', '1', '10')), -1)
+        self.assertEqual(compare_evr(('0', '1', '1'), ('', '1', '1')), 0)
@@ -0,0 +1,793 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+from pulpcore.plugin.models import Artifact, Repository, RepositoryVersion
+from pulpcore.plugin.stages import DeclarativeContent
+
+from pulp_rpm.app.constants import DOWNLOAD_ORDERS
+from pulp_rpm.app.downloaders import RpmHttpDownloader
+from pulp_rpm.app.models import (
+    InFlightDownload,
+    Package,
+    RpmRemote,
+    UpdateCollection,
+    UpdateCollectionPackage,
+    UpdateRecord,
+    UpdateReference,
+)
+from pulp_rpm.app.tasks.synchronizing import (
+    DownloadClaims,
+    PrimaryEntry,
+    RpmContentSaver,
+    RpmFirstStage,
+    RpmRemoveDuplicates,
+    ThrottledProgressBar,
+    conditional_request_headers,
+    estimate_advisories,
+    estimate_packages,
+    iterate_in_executor,
+    start_checkpoint,
+)
+
+PRIMARY_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common"
+          xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="2">
+<package type="rpm">
+  <name>foo</name>
+  <arch>x86_64</arch>
+  <version epoch="1" ver="1.0" rel="2"/>
+  <checksum type="sha256" pkgid="YES">aaa</checksum>
+  <summary>foo</summary>
+  <description>foo</description>
+  <time file="1500" build="1000"/>
+  <size package="100" installed="200" archive="300"/>
+  <location href="Packages/foo-1.0-2.x86_64.rpm"/>
+  <format><rpm:sourcerpm>foo-1.0-2.src.rpm</rpm:sourcerpm></format>
+</package>
+<package type="rpm">
+  <name>bar</name>
+  <arch>noarch</arch>
+  <version epoch="0" ver="2" rel="1"/>
+  <checksum type="sha256" pkgid="YES">bbb</checksum>
+  <summary>bar</summary>
+  <description>bar</description>
+  <time file="1500" build="1000"/>
+  <size package="10" installed="20" archive="30"/>
+  <location href="Packages/bar-2-1.noarch.rpm"/>
+  <format><rpm:sourcerpm>bar-2-1.src.rpm</rpm:sourcerpm></format>
+</package>
+</metadata>
+'''
+
+FILELISTS_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<filelists xmlns="http://linux.duke.edu/metadata/filelists" packages="2">
+<package pkgid="aaa" name="foo" arch="x86_64">
+  <version epoch="1" ver="1.0" rel="2"/>
+  <file>/usr/bin/foo</file>
+</package>
+<package pkgid="bbb" name="bar" arch="noarch">
+  <version epoch="0" ver="2" rel="1"/>
+  <file>/usr/bin/bar</file>
+</package>
+</filelists>
+'''
+
+OTHER_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<otherdata xmlns="http://linux.duke.edu/metadata/other" packages="2">
+<package pkgid="aaa" name="foo" arch="x86_64">
+  <version epoch="1" ver="1.0" rel="2"/>
+  <changelog author="Foo &lt;foo@example.com&gt; - 1.0-2" date="1000">- Fix foo</changelog>
+</package>
+<package pkgid="bbb" name="bar" arch="noarch">
+  <version epoch="0" ver="2" rel="1"/>
+  <changelog author="Bar &lt;bar@example.com&gt; - 2-1" date="1000">- Fix bar</changelog>
+</package>
+</otherdata>
+'''
+
+
+def write_package_repodata(test_case):
+    """
+    Write primary.xml, filelists.xml and other.xml into a temporary directory.
+
+    Args:
+        test_case (TestCase): the test which removes the directory on cleanup
+
+    Returns:
+        list: paths to primary.xml, filelists.xml and other.xml
+
+    """
+    directory = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, directory)
+    paths = []
+    for filename, data in (('primary.xml', PRIMARY_XML), ('filelists.xml', FILELISTS_XML),
+                           ('other.xml', OTHER_XML)):
+        path = os.path.join(directory, filename)
+        with open(path, 'w') as repodata_file:
+            repodata_file.write(data)
+        paths.append(path)
+    return paths
+
+
+class TestRpmContentSaver(TestCase):
+    """Test saving of UpdateRecord relations."""
+
+    def make_batch(self, count):
+        """
+        Create a batch of saved UpdateRecords with unsaved relations.
+
+        Args:
+            count (int): number of UpdateRecords in the batch
+
+        Returns:
+            list: list of DeclarativeContent for the UpdateRecords
+
+        """
+        batch = []
+        for i in range(count):
+            update_record = UpdateRecord.objects.create(id='RHSA-{}'.format(i), digest=str(i))
+            update_collection = UpdateCollection(name='collection-{}'.format(i))
+            update_collection_package = UpdateCollectionPackage(name='package-{}'.format(i))
+            update_reference = UpdateReference(ref_id=str(i))
+            dc = DeclarativeContent(content=update_record)
+            dc.extra_data = {
+                'collections': {update_collection: [update_collection_package]},
+                'references': [update_reference],
+            }
+            batch.append(dc)
+        return batch
+
+    def post_save(self, batch):
+        """Run RpmContentSaver._post_save() for a batch."""
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(RpmContentSaver()._post_save(batch + [None]))
+
+    def test_query_count_independent_of_batch_size(self):
+        """Test that relations are checked and saved with a fixed number of queries."""
+        for count in (1, 10):
+            UpdateRecord.objects.all().delete()
+            batch = self.make_batch(count)
+            # relation check and one bulk_create per relation type
+            with self.assertNumQueries(4):
+                self.post_save(batch)
+            self.assertEqual(UpdateCollection.objects.count(), count)
+            self.assertEqual(UpdateCollectionPackage.objects.count(), count)
+            self.assertEqual(UpdateReference.objects.count(), count)
+
+    def test_existing_relations_are_not_duplicated(self):
+        """Test that UpdateRecords which already have relations are skipped."""
+        batch = self.make_batch(3)
+        self.post_save(batch)
+
+        with self.assertNumQueries(1):
+            self.post_save(batch)
+        self.assertEqual(UpdateCollection.objects.count(), 3)
+        self.assertEqual(UpdateReference.objects.count(), 3)
+
+
+class TestNewestEntries(TestCase):
+    """Test selection of the newest versions of packages."""
+
+    def entry(self, name, evr, arch='x86_64'):
+        """Create a PrimaryEntry for a package."""
+        epoch, version, release = evr
+        return PrimaryEntry(name=name, epoch=epoch, version=version, release=release, arch=arch,
+                            pkgId='-'.join((name, epoch, version, release, arch)),
+                            checksum_type='sha256', location_href='', size_package=0,
+                            time_build=0)
+
+    def test_newest_entries(self):
+        """Test that the newest versions of each name and arch are kept in the original order."""
+        entries = [
+            self.entry('foo', ('', '1.10', '1')),
+            self.entry('foo', ('', '1.9', '1')),
+            self.entry('foo', ('1', '0.1', '1')),
+            self.entry('foo', ('', '1.10', '2')),
+            self.entry('foo', ('', '1.9', '1'), arch='i686'),
+            self.entry('bar', ('', '1', '1')),
+        ]
+        self.assertEqual(RpmFirstStage.newest_entries(entries, 2),
+                         [entries[2], entries[3], entries[4], entries[5]])
+        self.assertEqual(RpmFirstStage.newest_entries(entries, 1),
+                         [entries[2], entries[4], entries[5]])
+
+
+class TestIterateInExecutor(TestCase):
+    """Test consumption of blocking iterables in worker threads."""
+
+    def setUp(self):
+        """Consume the iterables in a new event loop."""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+
+    def test_items(self):
+        """Test that all items are yielded in order, although the queue is smaller."""
+        async def consume():
+            return [item async for item in iterate_in_executor(range, 1000)]
+
+        self.assertEqual(self.loop.run_until_complete(consume()), list(range(1000)))
+
+    def test_exception(self):
+        """Test that an exception of the iterable is raised after the items before it."""
+        items = []
+
+        def iterable():
+            yield 1
+            raise ValueError('invalid repodata')
+
+        async def consume():
+            async for item in iterate_in_executor(iterable):
+                items.append(item)
+
+        with self.assertRaisesRegex(ValueError, 'invalid repodata'):
+            self.loop.run_until_complete(consume())
+        self.assertEqual(items, [1])
+
+    def test_cancel(self):
+        """Test that the worker thread stops when the consumer is cancelled."""
+        produced = []
+        threads = []
+
+        def iterable():
+            threads.append(threading.current_thread())
+            for item in itertools.count():
+                produced.append(item)
+                yield item
+
+        async def consume():
+            items = iterate_in_executor(iterable)
+            try:
+                async for item in items:
+                    if item == 2:
+                        await asyncio.sleep(10)
+            finally:
+                await items.aclose()
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(asyncio.wait_for(consume(), 0.5))
+        threads[0].join(1)
+        self.assertFalse(threads[0].is_alive())
+        produced_count = len(produced)
+        time.sleep(0.2)
+        self.assertEqual(len(produced), produced_count)
+
+
+class TestScanPrimary(TestCase):
+    """Test scanning of primary.xml for the data identifying each package."""
+
+    def test_scan_primary(self):
+        """Test that the identifying data of each package is collected."""
+        primary_xml_path = write_package_repodata(self)[0]
+        self.assertEqual(RpmFirstStage.scan_primary(primary_xml_path), [
+            PrimaryEntry(name='foo', epoch='1', version='1.0', release='2', arch='x86_64',
+                         pkgId='aaa', checksum_type='sha256',
+                         location_href='Packages/foo-1.0-2.x86_64.rpm', size_package=100,
+                         time_build=1000),
+            PrimaryEntry(name='bar', epoch='0', version='2', release='1', arch='noarch',
+                         pkgId='bbb', checksum_type='sha256',
+                         location_href='Packages/bar-2-1.noarch.rpm', size_package=10,
+                         time_build=1000),
+        ])
+
+    def test_no_epoch(self):
+        """Test that a package without an epoch gets the epoch 0, like in createrepo_c."""
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        primary_xml = PRIMARY_XML.replace('epoch="1" ', 'epoch="" ').replace('epoch="0" ', '')
+        with os.fdopen(fd, 'w') as primary_file:
+            primary_file.write(primary_xml)
+        self.assertEqual([entry.epoch for entry in RpmFirstStage.scan_primary(path)], ['0', '0'])
+
+
+class TestParsePackages(TestCase):
+    """Test parsing of packages from primary.xml, filelists.xml and other.xml."""
+
+    def parse(self, pkgids):
+        """Parse the packages of some pkgIds and return them by pkgId."""
+        paths = write_package_repodata(self)
+        return {pkg.pkgId: pkg for pkg in RpmFirstStage.parse_packages(*paths, pkgids)}
+
+    def test_parse_packages(self):
+        """Test that packages are parsed from all three files."""
+        packages = self.parse({'aaa', 'bbb'})
+        self.assertEqual(set(packages), {'aaa', 'bbb'})
+        self.assertEqual(packages['aaa'].name, 'foo')
+        self.assertEqual(packages['aaa'].files, [(None, '/usr/bin/', 'foo')])
+        self.assertEqual(packages['bbb'].changelogs,
+                         [('Bar <bar@example.com> - 2-1', 1000, '- Fix bar')])
+
+    def test_selected_packages(self):
+        """Test that only the packages of the given pkgIds are parsed, with their own metadata."""
+        packages = self.parse({'bbb'})
+        self.assertEqual(set(packages), {'bbb'})
+        self.assertEqual(packages['bbb'].files, [(None, '/usr/bin/', 'bar')])
+        self.assertEqual(self.parse(set()), {})
+
+    def test_parser_warnings(self):
+        """Test that warnings of the parser are logged and the repodata is still parsed."""
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as updateinfo_file:
+            updateinfo_file.write(
+                '<?xml version="1.0" encoding="UTF-8"?>\n<updates>'
+                '<update from="a" status="final" type="bugfix" version="1">'
+                '<id>RHBA-1</id><unknown/></update></updates>'
+            )
+        with self.assertLogs('pulp_rpm.app.tasks.synchronizing', 'WARNING') as logs:
+            updates = RpmFirstStage.parse_updateinfo(path)
+        self.assertEqual([update.id for update in updates], ['RHBA-1'])
+        self.assertIn('unknown', logs.output[0])
+
+
+class TestProcessPackages(TestCase):
+    """Test creation of content for the packages of downloaded repodata."""
+
+    def process(self, remote, checkpoint=None):
+        """Process the packages with a first stage and return the content put into the stream."""
+        paths = write_package_repodata(self)
+        first_stage = RpmFirstStage(remote, None, True, checkpoint=checkpoint)
+        declarative_contents = []
+
+        async def put(declarative_content):
+            declarative_contents.append(declarative_content)
+
+        first_stage.put = put
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(first_stage.process_packages(*paths, mock.Mock()))
+        return {dc.content.pkgId: dc.content for dc in declarative_contents}
+
+    def test_filtered_packages(self):
+        """Test that packages which the remote filters out are not parsed."""
+        remote = RpmRemote.objects.create(name='remote', url='https://example.com/os/',
+                                          exclude_names=json.dumps(['foo']))
+        with mock.patch.object(Package, 'createrepo_to_dict',
+                               wraps=Package.createrepo_to_dict) as createrepo_to_dict:
+            packages = self.process(remote)
+        self.assertEqual(set(packages), {'bbb'})
+        self.assertEqual([call[0][0].pkgId for call in createrepo_to_dict.call_args_list],
+                         ['bbb'])
+
+    def test_existing_packages(self):
+        """Test that packages which are already in the database are passed on as saved."""
+        existing = Package.objects.create(name='foo', pkgId='aaa', checksum_type='sha256',
+                                          location_href='Packages/foo-1.0-2.x86_64.rpm',
+                                          size_package=100)
+        remote = RpmRemote.objects.create(name='remote', url='https://example.com/os/')
+        with mock.patch.object(Package, 'createrepo_to_dict',
+                               wraps=Package.createrepo_to_dict) as createrepo_to_dict:
+            packages = self.process(remote)
+        self.assertEqual(set(packages), {'aaa', 'bbb'})
+        self.assertEqual([call[0][0].pkgId for call in createrepo_to_dict.call_args_list],
+                         ['bbb'])
+        self.assertEqual(packages['aaa'].pk, existing.pk)
+        self.assertFalse(packages['aaa']._state.adding)
+        self.assertEqual(Package.objects.count(), 1)
+
+    def test_resume(self):
+        """Test that packages saved before an interruption are neither parsed nor looked up."""
+        remote = RpmRemote.objects.create(name='remote', url='https://example.com/os/')
+        repository = Repository.objects.create(name='repository')
+        saved = Package.objects.create(name='foo', pkgId='aaa')
+        start_checkpoint(remote, repository, {'primary': 'abc'}).add_packages([saved])
+
+        checkpoint = start_checkpoint(remote, repository, {'primary': 'abc'})
+        with mock.patch.object(Package, 'createrepo_to_dict',
+                               wraps=Package.createrepo_to_dict) as createrepo_to_dict, \
+                mock.patch.object(RpmFirstStage, 'find_existing_packages',
+                                  wraps=RpmFirstStage.find_existing_packages) as find_existing:
+            packages = self.process(remote, checkpoint)
+
+        self.assertEqual(set(packages), {'aaa', 'bbb'})
+        self.assertEqual(packages['aaa'].pk, saved.pk)
+        self.assertFalse(packages['aaa']._state.adding)
+        find_existing.assert_called_once_with(['bbb'])
+        self.assertEqual([call[0][0].pkgId for call in createrepo_to_dict.call_args_list],
+                         ['bbb'])
+
+
+class TestThrottledProgressBar(TestCase):
+    """Test that progress is counted accurately but saved at most once per interval."""
+
+    @mock.patch('pulp_rpm.app.tasks.synchronizing.time.monotonic')
+    def test_increment(self, monotonic):
+        """Test that only increments after the interval has passed save the ProgressBar."""
+        progress_bar = mock.Mock(done=0)
+        monotonic.return_value = 100
+        progress = ThrottledProgressBar(progress_bar, interval=1)
+
+        for _ in range(1000):
+            progress.increment()
+        self.assertEqual(progress_bar.done, 1000)
+        progress_bar.save.assert_not_called()
+
+        monotonic.return_value = 101
+        progress.increment()
+        progress.increment()
+        self.assertEqual(progress_bar.done, 1002)
+        self.assertEqual(progress_bar.save.call_count, 1)
+
+
+class TestDownloadClaims(TestCase):
+    """Test claims of concurrent syncs on downloads."""
+
+    def test_claims(self):
+        """Test that a download is claimed by one sync at a time."""
+        first, second = DownloadClaims(), DownloadClaims()
+        self.assertEqual(first.claim(['sha256:aaa', 'sha256:bbb']), {'sha256:aaa', 'sha256:bbb'})
+        self.assertEqual(second.claim(['sha256:bbb', 'sha256:ccc']), {'sha256:ccc'})
+
+        first.release(['sha256:bbb'])
+        self.assertEqual(second.claim(['sha256:bbb', 'sha256:ccc']), {'sha256:bbb'})
+        self.assertEqual(second.owned(['sha256:aaa', 'sha256:bbb', 'sha256:ccc']),
+                         {'sha256:bbb', 'sha256:ccc'})
+
+        first.release_all()
+        second.release_all()
+        self.assertFalse(InFlightDownload.objects.exists())
+
+    def test_copies(self):
+        """Test that the claims of a sync are not changed through the returned keys."""
+        claims = DownloadClaims()
+        claims.claim(['sha256:aaa']).add('sha256:bbb')
+        claims.owned(['sha256:aaa']).clear()
+        self.assertEqual(claims.owned(['sha256:aaa', 'sha256:bbb']), {'sha256:aaa'})
+
+    def test_concurrent_claims(self):
+        """Test that claims and releases from several threads keep the claims consistent."""
+        claims = DownloadClaims()
+        keys = ['sha256:{}'.format(i) for i in range(100)]
+        claimed_keys = []
+
+        def claim_and_release(key):
+            claimed_keys.extend(claims.claim([key]))
+            claims.heartbeat()
+            claims.release([key])
+
+        def claimed(digest__in=(), **kwargs):
+            return mock.Mock(values_list=mock.Mock(return_value=list(digest__in)))
+
+        with mock.patch.object(InFlightDownload, 'objects') as objects:
+            objects.filter.side_effect = claimed
+            threads = [threading.Thread(target=claim_and_release, args=(key,)) for key in keys]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertCountEqual(claimed_keys, keys)
+        self.assertEqual(claims.owned(keys), set())
+
+    def test_abandoned_claims(self):
+        """Test that claims without a recent heartbeat are taken over."""
+        first, second = DownloadClaims(), DownloadClaims()
+        first.claim(['sha256:aaa'])
+        InFlightDownload.objects.update(_last_updated=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(second.claim(['sha256:aaa']), {'sha256:aaa'})
+
+    def test_heartbeat(self):
+        """Test that a heartbeat keeps the claims of a sync alive."""
+        first, second = DownloadClaims(), DownloadClaims()
+        first.claim(['sha256:aaa'])
+        InFlightDownload.objects.update(_last_updated=timezone.now() - timedelta(minutes=5))
+        first.heartbeat()
+        self.assertEqual(second.claim(['sha256:aaa']), set())
+        self.assertFalse(second.released({'sha256:aaa'}))
+
+    def test_released(self):
+        """Test that released and abandoned claims of other syncs are noticed."""
+        first, second = DownloadClaims(), DownloadClaims()
+        first.claim(['sha256:aaa', 'sha256:bbb'])
+        self.assertFalse(second.released({'sha256:aaa', 'sha256:bbb'}))
+
+        first.release(['sha256:bbb'])
+        self.assertTrue(second.released({'sha256:aaa', 'sha256:bbb'}))
+        self.assertFalse(second.released({'sha256:aaa'}))
+
+        InFlightDownload.objects.update(_last_updated=timezone.now() - timedelta(minutes=5))
+        self.assertTrue(second.released({'sha256:aaa'}))
+
+
+class TestConditionalRequestHeaders(TestCase):
+    """Test conditional requests for repomd.xml."""
+
+    def test_conditional_request_headers(self):
+        """Test that only the known validators are sent."""
+        self.assertEqual(
+            conditional_request_headers({'etag': '"abc"',
+                                         'last_modified': 'Wed, 21 Oct 2026 07:28:00 GMT'}),
+            {'If-None-Match': '"abc"', 'If-Modified-Since': 'Wed, 21 Oct 2026 07:28:00 GMT'})
+        self.assertEqual(conditional_request_headers({'etag': '"abc"', 'last_modified': ''}),
+                         {'If-None-Match': '"abc"'})
+        self.assertEqual(conditional_request_headers({'etag': '', 'last_modified': ''}), {})
+
+
+class TestDownloadPriority(TestCase):
+    """Test the order in which new packages are downloaded."""
+
+    def setUp(self):
+        """Create entries of new packages of different age and size."""
+        self.entries = [
+            PrimaryEntry(name='old', epoch='0', version='1', release='1', arch='noarch',
+                         pkgId='a', checksum_type='sha256', location_href='',
+                         size_package=10, time_build=100),
+            PrimaryEntry(name='big', epoch='', version='1', release='1', arch='noarch',
+                         pkgId='b', checksum_type='sha256', location_href='',
+                         size_package=1000, time_build=300),
+            PrimaryEntry(name='fixed', epoch='', version='2', release='1', arch='x86_64',
+                         pkgId='c', checksum_type='sha256', location_href='',
+                         size_package=100, time_build=200),
+        ]
+
+    def first_stage(self, download_order, advisory_packages=()):
+        """Create a first stage for a remote with a download order."""
+        first_stage = RpmFirstStage(mock.Mock(download_order=download_order), None, False)
+        first_stage.advisory_packages = set(advisory_packages)
+        return first_stage
+
+    def sort(self, download_order, advisory_packages=()):
+        """Sort the entries by a download order and return their names."""
+        first_stage = self.first_stage(download_order, advisory_packages)
+        return [e.name for e in sorted(self.entries, key=first_stage.download_priority)]
+
+    def test_download_priority(self):
+        """Test that each download order sorts packages stably by its priority."""
+        self.assertEqual(self.sort(DOWNLOAD_ORDERS.REPODATA), ['old', 'big', 'fixed'])
+        self.assertEqual(self.sort(DOWNLOAD_ORDERS.NEWEST_FIRST), ['big', 'fixed', 'old'])
+        self.assertEqual(self.sort(DOWNLOAD_ORDERS.SMALLEST_FIRST), ['old', 'fixed', 'big'])
+        advisory_packages = [RpmFirstStage.package_key('fixed', '0', '2', '1', 'x86_64')]
+        self.assertEqual(self.sort(DOWNLOAD_ORDERS.ADVISORIES_FIRST, advisory_packages),
+                         ['fixed', 'old', 'big'])
+
+    @mock.patch('pulp_rpm.app.tasks.synchronizing.DOWNLOAD_ORDER_ROUNDS', 2)
+    def test_download_rounds(self):
+        """Test that packages are split into rounds by their priority, keeping only pkgIds."""
+        first_stage = self.first_stage(DOWNLOAD_ORDERS.REPODATA)
+        self.assertEqual(first_stage.download_rounds(self.entries), [{'a', 'b', 'c'}])
+        self.assertEqual(first_stage.download_rounds([]), [])
+
+        first_stage = self.first_stage(DOWNLOAD_ORDERS.NEWEST_FIRST)
+        self.assertEqual(first_stage.download_rounds(self.entries), [{'b', 'c'}, {'a'}])
+
+
+class TestZchunkDelta(TestCase):
+    """Test delta downloads of zchunk repodata."""
+
+    @mock.patch('pulp_rpm.app.tasks.synchronizing.os.remove')
+    @mock.patch('pulp_rpm.app.tasks.synchronizing.download_delta')
+    def test_mirror_urls(self, download_delta, _remove):
+        """Test that a delta comes from the first base URL although the remote has mirrors."""
+        downloaders = []
+
+        async def fake_download_delta(downloader, size_header, old_path):
+            downloaders.append(downloader)
+            return 'result'
+
+        download_delta.side_effect = fake_download_delta
+        remote = RpmRemote.objects.create(
+            name='remote', url='https://example.com/os/',
+            mirror_urls=json.dumps(['https://mirror.example.com/os/'])
+        )
+        first_stage = RpmFirstStage(remote, None, False, base_urls=[remote.url],
+                                    previous_checksums={'primary_zck': 'abc'})
+        first_stage.repodata_cache = mock.Mock(**{'get.return_value': 'primary.xml.zck'})
+        record = mock.Mock(type='primary_zck', location_href='repodata/primary.xml.zck',
+                           checksum='def', size_header=100)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        asyncio.set_event_loop(loop)
+        result = loop.run_until_complete(first_stage.download_zchunk_delta(record, 'sha256'))
+
+        self.assertEqual(result, 'result')
+        self.assertIsInstance(downloaders[0], RpmHttpDownloader)
+        self.assertEqual(downloaders[0].url, 'https://example.com/os/repodata/primary.xml.zck')
+
+
+class TestRepodataCache(TestCase):
+    """Test that downloaded repodata is cached."""
+
+    def download(self, cache_downloads):
+        """Download primary.xml with a first stage and return the repodata cache."""
+        async def run():
+            return mock.Mock(path='primary.xml.gz')
+
+        remote = mock.Mock(**{'get_downloader.return_value.run': run})
+        first_stage = RpmFirstStage(remote, None, False, base_urls=['https://example.com/'],
+                                    cache_downloads=cache_downloads)
+        first_stage.repodata_cache = mock.Mock(**{'get.return_value': None})
+        record = mock.Mock(type='primary', location_href='repodata/primary.xml.gz',
+                           checksum_type='sha256', checksum='abc', size=100)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        asyncio.set_event_loop(loop)
+        path = loop.run_until_complete(first_stage.download_repodata(record))
+        self.assertEqual(path, 'primary.xml.gz')
+        remote.get_downloader.assert_called_once_with(
+            url='https://example.com/repodata/primary.xml.gz', expected_digests={'sha256': 'abc'})
+        return first_stage.repodata_cache
+
+    def test_cache_downloads(self):
+        """Test that downloads are cached unless that is disabled, e.g. for dry runs."""
+        self.assertTrue(self.download(cache_downloads=True).put.called)
+        self.assertFalse(self.download(cache_downloads=False).put.called)
+
+
+class TestPutRepodataFiles(TestCase):
+    """Test that mirrored repodata files are kept as content with saved artifacts."""
+
+    def setUp(self):
+        """Work in a temporary directory."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        cwd = os.getcwd()
+        os.chdir(temp_dir.name)
+        self.addCleanup(os.chdir, cwd)
+
+    def write(self, data):
+        """Write data to a file in the working directory and return its path."""
+        fd, path = tempfile.mkstemp(dir='.')
+        with os.fdopen(fd, 'wb') as repodata_file:
+            repodata_file.write(data)
+        return path
+
+    def test_save_repodata_artifact(self):
+        """Test that an artifact is saved once and found when it is saved already."""
+        digests = {'sha256': hashlib.sha256(b'primary').hexdigest()}
+        artifact = RpmFirstStage.save_repodata_artifact(self.write(b'primary'), digests)
+        self.assertFalse(artifact._state.adding)
+        again = RpmFirstStage.save_repodata_artifact(self.write(b'primary'), digests)
+        self.assertEqual(again.pk, artifact.pk)
+        self.assertEqual(Artifact.objects.count(), 1)
+
+    @mock.patch.object(RpmFirstStage, 'save_repodata_artifact')
+    def test_put_repodata_files(self, save_repodata_artifact):
+        """Test that the content of repomd.xml and each repodata file has a saved artifact."""
+        save_repodata_artifact.side_effect = lambda path, digests: mock.Mock(path=path)
+        record = mock.Mock(type='primary', location_href='repodata/abc-primary.xml.gz',
+                           checksum_type='sha256', checksum='abc')
+        first_stage = RpmFirstStage(mock.Mock(), mock.Mock(records=[record]), False,
+                                    base_urls=['https://example.com/os/'],
+                                    repomd_xml=b'<repomd/>')
+        first_stage.repodata_paths = {'primary': 'primary.xml.gz'}
+        declarative_contents = []
+
+        async def put(declarative_content):
+            declarative_contents.append(declarative_content)
+
+        first_stage.put = put
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(first_stage.put_repodata_files())
+
+        by_type = {dc.content.data_type: dc for dc in declarative_contents}
+        self.assertEqual(set(by_type), {'repomd', 'primary'})
+        self.assertEqual(by_type['primary'].d_artifacts[0].artifact.path, 'primary.xml.gz')
+        self.assertEqual(save_repodata_artifact.call_args_list[1][0],
+                         ('primary.xml.gz', {'sha256': 'abc'}))
+
+
+class TestCheckpoint(TestCase):
+    """Test checkpoints of interrupted syncs."""
+
+    def test_resume(self):
+        """Test that a checkpoint is only resumed for the same repository metadata."""
+        remote = RpmRemote.objects.create(name='remote', url='https://example.com/os/')
+        repository = Repository.objects.create(name='repository')
+        package = Package.objects.create(name='foo', pkgId='aaa')
+
+        checkpoint = start_checkpoint(remote, repository, {'primary': 'abc'})
+        checkpoint.add_packages([package])
+        checkpoint.add_packages([package])
+
+        resumed = start_checkpoint(remote, repository, {'primary': 'abc'})
+        self.assertEqual(resumed.pk, checkpoint.pk)
+        self.assertEqual(resumed.saved_packages(), {'aaa': package.pk})
+
+        restarted = start_checkpoint(remote, repository, {'primary': 'def'})
+        self.assertNotEqual(restarted.pk, checkpoint.pk)
+        self.assertEqual(restarted.saved_packages(), {})
+
+    def test_remote_modified(self):
+        """Test that a checkpoint is not resumed after the remote was modified."""
+        remote = RpmRemote.objects.create(name='remote', url='https://example.com/os/')
+        repository = Repository.objects.create(name='repository')
+        checkpoint = start_checkpoint(remote, repository, {'primary': 'abc'})
+
+        remote.exclude_source_rpms = True
+        remote.save()
+        restarted = start_checkpoint(remote, repository, {'primary': 'abc'})
+        self.assertNotEqual(restarted.pk, checkpoint.pk)
+        self.assertEqual(start_checkpoint(remote, repository, {'primary': 'abc'}).pk,
+                         restarted.pk)
+
+
+class TestSyncEstimate(TestCase):
+    """Test the estimate of what a sync would change and download."""
+
+    def setUp(self):
+        """Create a repository version with a package and an advisory."""
+        repository = Repository.objects.create(name='repository')
+        Package.objects.create(name='foo', pkgId='aaa')
+        Package.objects.create(name='bar', pkgId='bbb')
+        UpdateRecord.objects.create(id='RHSA-1', digest='1')
+        with RepositoryVersion.create(repository) as self.version:
+            self.version.add_content(Package.objects.filter(pkgId='aaa'))
+            self.version.add_content(UpdateRecord.objects.all())
+
+    def entry(self, name, pkgId, size):
+        """Create a PrimaryEntry for a package."""
+        return PrimaryEntry(name=name, epoch='', version='1', release='1', arch='noarch',
+                            pkgId=pkgId, checksum_type='sha256', location_href='',
+                            size_package=size, time_build=0)
+
+    def test_packages(self):
+        """Test that packages are compared by pkgId and all packages without artifacts count."""
+        entries = [self.entry('bar', 'bbb', 10), self.entry('baz', 'ccc', 100)]
+        self.assertEqual(estimate_packages(entries, self.version, False),
+                         {'packages_added': 2, 'packages_removed': 1, 'download_size': 110})
+        self.assertEqual(estimate_packages(entries, self.version, True)['download_size'], 0)
+        self.assertEqual(estimate_packages(entries, None, False)['packages_removed'], 0)
+
+    def test_advisories(self):
+        """Test that advisories which are not in updateinfo.xml would be removed."""
+        self.assertEqual(estimate_advisories([], self.version),
+                         {'advisories_added': 0, 'advisories_removed': 1})
+
+
+class TestRpmRemoveDuplicates(TestCase):
+    """Test removal of packages with the same NEVRA as synced ones."""
+
+    def test_nevra_index(self):
+        """Test that packages of the new version are indexed by NEVRA, the epoch defaulting to 0."""
+        repository = Repository.objects.create(name='repository')
+        foo = Package.objects.create(name='foo', epoch='', version='1', release='1',
+                                     arch='noarch', pkgId='aaa')
+        rebuilt_foo = Package.objects.create(name='foo', epoch='0', version='1', release='1',
+                                             arch='noarch', pkgId='bbb')
+        Package.objects.create(name='bar', epoch='0', version='1', release='1', arch='noarch',
+                               pkgId='ccc')
+        with RepositoryVersion.create(repository) as version:
+            version.add_content(Package.objects.filter(pkgId__in=['aaa', 'bbb']))
+
+        index = RpmRemoveDuplicates(version).nevra_index()
+        self.assertEqual(set(index), {('foo', '0', '1', '1', 'noarch')})
+        self.assertCountEqual(index[('foo', '0', '1', '1', 'noarch')], [foo.pk, rebuilt_foo.pk])
+
+    @mock.patch.object(RpmRemoveDuplicates, 'nevra_index')
+    def test_nevra_index_in_executor(self, nevra_index):
+        """Test that the packages are indexed outside of the event loop thread."""
+        index_threads = []
+        nevra_index.side_effect = lambda: index_threads.append(threading.get_ident()) or {}
+        stage = RpmRemoveDuplicates(mock.Mock())
+        declarative_contents = []
+
+        async def items():
+            yield DeclarativeContent(content=Package(name='foo', pkgId='aaa'))
+
+        async def put(declarative_content):
+            declarative_contents.append(declarative_content)
+
+        stage.items, stage.put = items, put
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(stage.run())
+
+        self.assertEqual(len(index_threads), 1)
+        self.assertNotEqual(index_threads[0], threading.get_ident())
+        self.assertEqual(len(declarative_contents), 1)
@@ -0,0 +1,43 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase
+from pulpcore.plugin.models import Artifact, Repository, RepositoryVersion
+
+from pulp_rpm.app.models import Package, RepoMetadataFile
+from pulp_rpm.app.tasks.upload import one_shot_upload
+
+
+class TestOneShotUpload(TestCase):
+    """Test the one shot upload of a package."""
+
+    def setUp(self):
+        """Save the artifact of the uploaded package."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, 'foo-1-1.noarch.rpm')
+        with open(path, 'wb') as package_file:
+            package_file.write(b'foo-1-1.noarch.rpm')
+        self.artifact = Artifact.init_and_validate(path)
+        self.artifact.save()
+
+    @mock.patch('pulp_rpm.app.tasks.upload._prepare_package')
+    def test_mirrored_repodata_dropped(self, prepare_package):
+        """Test that mirrored repodata of the repository is dropped by an upload."""
+        prepare_package.return_value = dict(
+            name='foo', epoch='0', version='1', release='1', arch='noarch', pkgId='abc',
+            checksum_type='sha256', location_href='foo-1-1.noarch.rpm')
+        repository = Repository.objects.create(name='repository')
+        repomd = RepoMetadataFile.objects.create(
+            data_type='repomd', checksum_type='sha256', checksum='abc',
+            relative_path='repodata/repomd.xml')
+        with RepositoryVersion.create(repository) as version:
+            version.add_content(RepoMetadataFile.objects.filter(pk=repomd.pk))
+
+        one_shot_upload(self.artifact.pk, 'foo-1-1.noarch.rpm', repository.pk)
+
+        latest = RepositoryVersion.latest(repository)
+        package = Package.objects.get(pkgId='abc')
+        self.assertEqual([content.pk for content in latest.content], [package.pk])
+        self.assertIsNone(RepoMetadataFile.repomd_in(latest))
@@ -0,0 +1,95 @@
+import os
+import tempfile
+
+from django.test import TestCase
+
+from pulp_rpm.app.zchunk import (
+    ZCK_MAGIC,
+    ZCK_RANGE_MERGE_GAP,
+    ZchunkError,
+    assemble,
+    parse_header,
+    plan_delta,
+    read_header,
+)
+
+
+def compressed_int(value):
+    """Encode an integer like in a zchunk header."""
+    data = bytearray()
+    while value > 0x7f:
+        data.append(value & 0x7f)
+        value >>= 7
+    data.append(value | 0x80)
+    return bytes(data)
+
+
+def zchunk_file(chunks):
+    """
+    Build a zchunk file with sha1 checksums and no dictionary.
+
+    Args:
+        chunks (list): tuples of the checksum, a single byte, and the data of each chunk
+
+    """
+    index = compressed_int(0) + compressed_int(len(chunks) + 1)
+    index += b'\0' * 20 + compressed_int(0) + compressed_int(0)
+    for checksum, data in chunks:
+        index += checksum * 20 + compressed_int(len(data)) + compressed_int(len(data))
+    header = b'd' * 20 + compressed_int(0) + compressed_int(2)
+    header += compressed_int(len(index)) + index + compressed_int(0)
+    lead = ZCK_MAGIC + compressed_int(0) + compressed_int(len(header)) + b'h' * 20
+    return lead + header + b''.join(data for _checksum, data in chunks)
+
+
+class TestZchunk(TestCase):
+    """Test delta downloads of zchunk files."""
+
+    def setUp(self):
+        """Create an old and a new version of a zchunk file."""
+        self.old = zchunk_file([(b'a', b'A' * 10), (b'b', b'B' * 200000), (b'c', b'C' * 30)])
+        self.new = zchunk_file([(b'a', b'A' * 10), (b'x', b'X' * 5), (b'b', b'B' * 200000),
+                                (b'y', b'Y' * 7), (b'c', b'C' * 30), (b'z', b'Z' * 3)])
+
+    def write(self, data):
+        """Write data into a temporary file and return its path."""
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_parse_header(self):
+        """Test that the chunks of a zchunk file are found in its header."""
+        header = read_header(self.write(self.old))
+        self.assertEqual([chunk.length for chunk in header.chunks], [0, 10, 200000, 30])
+        self.assertEqual(header.chunks[1].checksum, b'a' * 20)
+        self.assertEqual(self.old[header.chunks[2].offset:][:2], b'BB')
+        self.assertEqual(header.size + 200040, len(self.old))
+
+        with self.assertRaises(ZchunkError):
+            parse_header(self.old[:header.size - 1])
+        with self.assertRaises(ZchunkError):
+            parse_header(b'<?xml version="1.0"?>')
+
+    def test_delta(self):
+        """Test that only new chunks are downloaded and joined with the old ones."""
+        old_header = parse_header(self.old)
+        new_header = parse_header(self.new)
+        old_chunks, ranges = plan_delta(old_header, new_header)
+
+        x, b, y, c, z = new_header.chunks[2:]
+        self.assertLess(ZCK_RANGE_MERGE_GAP, b.length)
+        self.assertEqual(ranges, [(x.offset, x.offset + x.length - 1),
+                                  (y.offset, z.offset + z.length - 1)])
+
+        range_paths = [self.write(self.new[start:end + 1]) for start, end in ranges]
+        joined = b''.join(assemble(self.write(self.new[:new_header.size]), self.write(self.old),
+                                   old_chunks, new_header, ranges, range_paths))
+        self.assertEqual(joined, self.new)
+
+    def test_nothing_in_common(self):
+        """Test that files without common chunks are downloaded in full."""
+        other = zchunk_file([(b'q', b'Q' * 10)])
+        with self.assertRaises(ZchunkError):
+            plan_delta(parse_header(self.old), parse_header(other))